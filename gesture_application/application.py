@@ -1,20 +1,38 @@
 '''
 This module acts as a PyQt widget manager.
+
+TensorFlow and Keras (imported by model.py) are only needed once training starts,
+so model.py is imported in a background thread after the window is painted for the first time.
 '''
+import gc
+import os
 import sys
+import threading
+import time
 
 import config
+import tracing
 from augmentation import Augmenter
+from cache import DiskCache, fingerprint
+from dataset_cache import dataset_key, open_dataset_cache
+from embedding_index import EmbeddingIndex
+from incremental import IncrementalRecognizer
+from inference_worker import InferenceWorker
 from input_widget import InputWidget
+from numpy_inference import NumpyPredictor
 from prediction_widget import PredictionWidget
 from progress_widget import ProgressWidget
 from PyQt5 import QtWidgets
-from PyQt5.QtCore import QThread
+from PyQt5.QtCore import QThread, QTimer, pyqtSignal
+from template_matcher import TemplateMatcher
 
-from model import Model
+# import times of the modules above are listed by python3 -X importtime
+STARTUP_TIME = time.perf_counter()
 
 
 class ApplicationWindow(QtWidgets.QWidget):
+    # emitted by the warm-up thread, the slot runs on the Qt main thread
+    model_warmed_up = pyqtSignal()
 
     def __init__(self) -> None:
         '''
@@ -38,34 +56,164 @@ class ApplicationWindow(QtWidgets.QWidget):
         layout.addWidget(self.stack)
         self.setLayout(layout)
 
+        self.incremental = None
+        self.inference_worker = None
+        self.augmenter = None
+        self.predictor = None
+        self.first_paint_done = False
+        self.model_module = None
+        self.model_ready = False
+        self.model_callbacks = []
+        self.model_warmed_up.connect(self.handle_model_warmed_up)
+        print(f'Startup: window setup took {time.perf_counter() - STARTUP_TIME:.2f}s')
+
+        self.model_cache = DiskCache(
+            config.MODEL_CACHE_DIR, config.MODEL_CACHE_MAX_BYTES)
+        self.dataset_cache = open_dataset_cache()
+
+        # live breakdown of recorded spans while the training set is generated and the model trains
+        self.trace_timer = QTimer()
+        self.trace_timer.setInterval(500)
+        self.trace_timer.timeout.connect(self.show_trace_breakdown)
+
         self.input_view.start_button.clicked.connect(self.start_training)
-        self.prediction_view.canvas_wrapper.mouseReleaseEvent = self.handle_stop_drawing
+        self.progress_view.cancel_button.clicked.connect(self.cancel_training)
+        self.prediction_view.canvas.stroke_finished.connect(self.handle_stop_drawing)
+
+    def paintEvent(self, event):
+        '''
+        Reports time to first paint and starts model warm-up afterwards, so it does not delay the window.
+        '''
+        super().paintEvent(event)
+        if not self.first_paint_done:
+            self.first_paint_done = True
+            print(f'Startup: time to first paint {time.perf_counter() - STARTUP_TIME:.2f}s')
+            threading.Thread(target=self.warm_up_model, daemon=True).start()
+
+    def warm_up_model(self):
+        '''
+        Imports TensorFlow and Keras and runs a tiny model once while templates are recorded.
+        '''
+        start = time.perf_counter()
+        try:
+            import model
+            imported = time.perf_counter()
+            model.warm_up()
+            self.model_module = model
+            print(f'Startup: model import took {imported - start:.2f}s, '
+                  f'warm-up {time.perf_counter() - imported:.2f}s')
+        finally:
+            self.model_warmed_up.emit()
+
+    def handle_model_warmed_up(self):
+        '''
+        Runs the callbacks that waited for the model module.
+        '''
+        self.model_ready = True
+        callbacks, self.model_callbacks = self.model_callbacks, []
+        if callbacks:
+            print(f'Waited {time.perf_counter() - self.model_wait_start:.2f}s for model warm-up')
+        for callback in callbacks:
+            self.call_with_model_module(callback)
+
+    def when_model_ready(self, callback):
+        '''
+        Calls callback with the model module, after the background warm-up if it is still running.
+
+        The Qt main thread keeps handling events meanwhile, cancel_training drops the callback.
+        '''
+        if self.model_ready:
+            self.call_with_model_module(callback)
+            return
+        if not self.model_callbacks:
+            self.model_wait_start = time.perf_counter()
+        self.model_callbacks.append(callback)
+        self.stack.setCurrentWidget(self.progress_view)
+        self.progress_view.progress_label.setText('Loading TensorFlow...')
+        self.progress_view.cancel_button.setEnabled(True)
+
+    def call_with_model_module(self, callback):
+        if self.model_module is None:
+            print('Model warm-up failed')
+            self.stack.setCurrentWidget(self.input_view)
+            return
+        callback(self.model_module)
 
     def start_training(self):
         '''
         Sets current widget to progress_view if enough gestures were recorded and starts model training.
+
+        Template matching needs no training and shows prediction_view right away.
         '''
         if len(self.input_view.gestures) > 1:
+            engine = self.input_view.engine_combo_box.currentText()
+            if engine == config.RecognitionEngines.TEMPLATE.value:
+                # nothing to train, the recorded gestures are the templates
+                self.predictor = TemplateMatcher(self.input_view.gestures)
+                self.change_view_to_prediction()
+                return
+
+            self.cache_key = fingerprint(
+                self.input_view.gestures, self.input_view.combo_box.currentText())
+            cached_model = self.model_cache.get(self.cache_key)
+            if cached_model is None and config.EMBEDDING_INDEX:
+                # the network of the last training also embeds gestures it was not trained on
+                cached_model = self.model_cache.latest()
+            if cached_model is not None:
+                print("Loading trained model from cache")
+                self.model_directory = cached_model
+                weights_path = os.path.join(cached_model, 'weights.npz')
+                if os.path.exists(weights_path) and \
+                        (config.PREDICTION_BACKEND != 'tflite' or config.EMBEDDING_INDEX):
+                    # the NumPy forward pass matches Keras, no need to wait for TensorFlow
+                    self.predictor = NumpyPredictor.load(weights_path)
+                    self.change_view_to_prediction()
+                else:
+                    self.when_model_ready(lambda model: self.show_cached_model(model, cached_model))
+                return
+
             print("Training started")
             self.stack.setCurrentWidget(self.progress_view)
-            self.get_training_dataset()
+            if config.TRACING_ENABLED:
+                self.trace_timer.start()
+            if config.STREAMING_AUGMENTATION:
+                self.train_model(training_set=None)
+            else:
+                self.get_training_dataset()
+
+    def show_cached_model(self, model, directory):
+        self.predictor = model.Model.load(directory)
+        self.change_view_to_prediction()
 
     def get_training_dataset(self):
         '''
         Launches gesture augmentation in new PyQt QThread and adds Callback for progress.
 
         After https://realpython.com/python-pyqt-qthread/#using-qthread-vs-pythons-threading
+        Augmentation is skipped if the dataset cache has the training set already.
         '''
         gestures = self.input_view.gestures
+        augmentation_chain = self.input_view.combo_box.currentText()
+        if self.dataset_cache is not None:
+            dataset = self.dataset_cache.get(
+                dataset_key(gestures, augmentation_chain, config.AUGMENTATION_SEED))
+            if dataset is not None:
+                print("Loading augmented dataset from cache")
+                self.train_model(dataset)
+                return
+
         self.progress_view.init_progress_bar(
             upper_bound=len(gestures)*config.NUMBER_OF_SAMPLES)
         self.dataset_thread = QThread()
-        self.augmenter = Augmenter(gestures=gestures,
-                                   augmentation_chain=self.input_view.combo_box.currentText())
+        self.augmenter = Augmenter(gestures=gestures, augmentation_chain=augmentation_chain,
+                                   seed=config.AUGMENTATION_SEED, dataset_cache=self.dataset_cache)
         self.augmenter.moveToThread(self.dataset_thread)
         self.dataset_thread.started.connect(self.augmenter.run)
         self.augmenter.finished.connect(self.dataset_thread.quit)
         self.augmenter.finished.connect(self.augmenter.deleteLater)
+        self.augmenter.cancelled.connect(self.dataset_thread.quit)
+        self.augmenter.cancelled.connect(self.augmenter.deleteLater)
+        self.augmenter.cancelled.connect(self.handle_cancelled)
         self.dataset_thread.finished.connect(
             self.dataset_thread.deleteLater)
         self.augmenter.progress.connect(self.report_augmentation_progress)
@@ -73,11 +221,11 @@ class ApplicationWindow(QtWidgets.QWidget):
 
         self.augmenter.finished.connect(self.train_model)
 
-    def report_augmentation_progress(self, n):
+    def report_augmentation_progress(self, n, samples_per_second, seconds_left):
         '''
         Callback method for gesture augmentation progress.
         '''
-        self.progress_view.update_augmentation_progress(n)
+        self.progress_view.update_augmentation_progress(n, samples_per_second, seconds_left)
 
     def train_model(self, training_set):
         '''
@@ -85,35 +233,193 @@ class ApplicationWindow(QtWidgets.QWidget):
 
         After https://realpython.com/python-pyqt-qthread/#using-qthread-vs-pythons-threading
         '''
+        self.augmenter = None
+        self.when_model_ready(lambda model: self.start_model_training(model.Model, training_set))
+
+    def start_model_training(self, Model, training_set):
         self.progress_view.init_progress_bar(upper_bound=config.MAX_EPOCHS)
         self.training_thread = QThread()
-        self.predictor = Model(training_set=training_set)
+        self.predictor = Model(training_set=training_set,
+                               gestures=self.input_view.gestures,
+                               augmentation_chain=self.input_view.combo_box.currentText())
         self.predictor.moveToThread(self.training_thread)
         self.training_thread.started.connect(self.predictor.run)
         self.predictor.finished.connect(self.training_thread.quit)
         self.predictor.finished.connect(self.predictor.deleteLater)
+        self.predictor.cancelled.connect(self.training_thread.quit)
+        self.predictor.cancelled.connect(self.predictor.deleteLater)
+        self.predictor.cancelled.connect(self.handle_cancelled)
         self.training_thread.finished.connect(self.training_thread.deleteLater)
         self.predictor.progress.connect(self.report_training_progress)
         self.training_thread.start()
 
-        self.training_thread.finished.connect(self.change_view_to_prediction)
+        self.predictor.finished.connect(self.store_model)
+        self.predictor.finished.connect(self.change_view_to_prediction)
+
+    def cancel_training(self):
+        '''
+        Asks running augmentation or training to stop, handle_cancelled runs once it has stopped.
+        '''
+        self.progress_view.cancel_button.setEnabled(False)
+        self.progress_view.progress_label.setText('Cancelling...')
+        if self.augmenter is not None:
+            self.augmenter.cancel()
+        elif self.model_callbacks:
+            # still waiting for the model module, nothing runs yet
+            self.model_callbacks = []
+            self.handle_cancelled()
+        elif self.predictor is not None:
+            self.predictor.cancel()
+
+    def handle_cancelled(self):
+        '''
+        Returns to input_view after augmentation or training stopped and frees their memory.
+        '''
+        print('Training cancelled')
+        self.trace_timer.stop()
+        self.augmenter = None
+        self.predictor = None
+        if self.model_module is not None:
+            self.model_module.release_memory()
+        else:
+            gc.collect()
+        self.stack.setCurrentWidget(self.input_view)
+
+    def store_model(self):
+        '''
+        Adds trained model to the model cache.
+        '''
+        self.model_directory = self.model_cache.put(self.cache_key, self.predictor.save)
 
     def change_view_to_prediction(self):
         '''
         Sets current widget to prediction_view after model training is finished.
         '''
         self.stack.setCurrentWidget(self.prediction_view)
+        if config.EMBEDDING_INDEX and not isinstance(self.predictor, TemplateMatcher):
+            self.start_embedding_index()
+        if config.TRACING_ENABLED:
+            self.trace_timer.stop()
+            tracing.export()
+        if config.INCREMENTAL_RECOGNITION:
+            self.start_incremental_recognition()
+        elif config.INFERENCE_WORKER:
+            self.start_inference_worker()
+
+    def start_embedding_index(self):
+        '''
+        Replaces the softmax classifier by nearest neighbours of the embedded recorded gestures.
+        '''
+        if not isinstance(self.predictor, NumpyPredictor):
+            self.predictor = NumpyPredictor.load(os.path.join(self.model_directory, 'weights.npz'))
+        self.predictor = EmbeddingIndex(self.predictor)
+        seconds = self.predictor.add_gestures(
+            self.input_view.gestures, self.input_view.combo_box.currentText())
+        print(f'Embedded {len(self.input_view.gestures)} gestures in {seconds * 1000:.0f} ms')
+
+    def start_inference_worker(self):
+        '''
+        Launches prediction in PyQt QThread, results arrive via signal.
+        '''
+        self.inference_thread = QThread()
+        self.inference_worker = InferenceWorker(predictor=self.predictor)
+        self.inference_worker.moveToThread(self.inference_thread)
+        self.inference_thread.started.connect(self.inference_worker.run)
+        self.inference_worker.finished.connect(self.inference_thread.quit)
+        self.inference_worker.result.connect(self.show_prediction)
+        self.inference_worker.error.connect(self.show_prediction_error)
+        self.inference_thread.start()
+
+    def show_prediction(self, confidence, prediction_label):
+        '''
+        Callback method for predictions of the inference worker.
+        '''
+        stats = self.inference_worker.statistics()
+        print(f"Prediction latency {stats['mean_latency_ms']:.1f} ms mean, "
+              f"{stats['p95_latency_ms']:.1f} ms p95, queue depth {stats['queue_depth']}, "
+              f"{stats['dropped']} dropped")
+        self.prediction_view.show_prediction(
+            confidence=(confidence*100), gesture=prediction_label)
+
+    def show_prediction_error(self, error):
+        '''
+        Callback method for strokes the inference worker could not predict.
+        '''
+        print(f'Prediction failed: {error}')
+        self.prediction_view.prediction_label.setText('Prediction failed, draw again')
+
+    def closeEvent(self, event):
+        '''
+        Stops inference worker and writes trace of the session before the window closes.
+        '''
+        if self.inference_worker is not None:
+            self.inference_worker.stop()
+            self.inference_thread.quit()
+            self.inference_thread.wait()
+        tracing.export()
+        super().closeEvent(event)
+
+    def start_incremental_recognition(self):
+        '''
+        Updates prediction with every drawn point instead of after mouse release.
+        '''
+        if isinstance(self.predictor, NumpyPredictor):
+            numpy_predictor = self.predictor
+        else:
+            numpy_predictor = getattr(self.predictor, 'numpy_predictor', None)
+        if numpy_predictor is None:
+            print('Incremental recognition needs the RNN with PREDICTION_BACKEND = "numpy"')
+            return
+        try:
+            self.incremental = IncrementalRecognizer(numpy_predictor)
+        except ValueError as error:
+            # raised in a slot, the exception would abort the application
+            print(error)
+            return
+        self.prediction_view.canvas.point_drawn.connect(self.handle_point_drawn)
+
+    def handle_point_drawn(self, x, y):
+        '''
+        Advances incremental recognition by one point and shows the current candidates.
+        '''
+        candidates = self.incremental.push(x, y)
+        self.prediction_view.show_live_prediction(
+            candidates, self.incremental.committed, self.incremental.latencies[-1] * 1000)
+
+    def show_trace_breakdown(self):
+        '''
+        Shows time spent per recorded span in progress_view.
+        '''
+        self.progress_view.update_breakdown(tracing.tracer.totals())
 
-    def report_training_progress(self, step: int):
+    def report_training_progress(self, step: int, epochs_per_second, seconds_left):
         '''
         Callback method for model training progress.
         '''
-        self.progress_view.update_training_progress(step)
+        self.progress_view.update_training_progress(step, epochs_per_second, seconds_left)
 
-    def handle_stop_drawing(self, event):
-        drawn_gesture = self.prediction_view.line
-        confidence, prediction_label = self.predictor.predict_gesture(
-            drawn_gesture)
+    def handle_stop_drawing(self):
+        if self.incremental is not None:
+            if self.incremental.n_points == 0:
+                return
+            # prediction is already up to date, no need to process the stroke again
+            confidence, prediction_label = self.incremental.result()
+            # the whole stroke wins over the label committed while drawing
+            if self.incremental.committed not in (None, prediction_label):
+                print(f'Early commit {self.incremental.committed} changed to {prediction_label}')
+            mean_ms, max_ms = self.incremental.latency_ms()
+            print(f'{self.incremental.n_points} points, {mean_ms:.3f} ms mean, '
+                  f'{max_ms:.3f} ms max per point')
+            self.incremental.reset()
+        elif self.inference_worker is not None:
+            if len(self.prediction_view.line):
+                self.inference_worker.submit(self.prediction_view.line)
+            self.prediction_view.clear_canvas()
+            return
+        else:
+            drawn_gesture = self.prediction_view.line
+            confidence, prediction_label = self.predictor.predict_gesture(
+                drawn_gesture)
         self.prediction_view.clear_canvas()
         self.prediction_view.show_prediction(
             confidence=(confidence*100), gesture=prediction_label)
@@ -0,0 +1,255 @@
+'''
+This module augments all samples of a gesture at once with vectorized NumPy operations.
+
+Instead of transforming one point at a time, every transformation works on a batch of shape
+(samples, points, 2) with one random parameter set per sample.
+Sequences of different length (after skipping frames or resampling) are stored left-aligned
+and zero-padded, their real lengths are tracked in a separate array.
+
+Gestures are split into chunks of config.AUGMENTATION_CHUNK_SIZE samples. Every chunk draws from
+its own np.random.Generator seeded by (seed, gesture, chunk), so the result for a given seed does
+not depend on how many worker processes augment the chunks.
+'''
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import config
+import numpy as np
+from progress_channel import raise_if_cancelled
+from scipy.signal import resample
+from scipy.spatial.transform import Rotation as R
+from tracing import span, tracer
+
+
+class BatchAugmenter:
+
+    def __init__(self, augmentation_chain, rng=None) -> None:
+        self.augmentation_chain = augmentation_chain
+        self.rng = rng if rng is not None else np.random.default_rng()
+
+    def augment(self, sequence, n_samples):
+        '''
+        Creates n_samples augmented variants of sequence depending on selected augmentation pipeline.
+
+        Returns batch of shape (n_samples, max_length, 2) and the length of every sample.
+        '''
+        sequence = np.asarray(sequence, dtype=float)
+        batch = np.repeat(sequence[np.newaxis], n_samples, axis=0)
+        lengths = np.full(n_samples, len(sequence))
+
+        if self.augmentation_chain == config.AugmentationPipelines.AVC.value:
+            batch, lengths = self.avc_transformation(batch, lengths)
+        elif self.augmentation_chain == config.AugmentationPipelines.SIMPLE.value:
+            batch = self.simple_transformation(batch, lengths)
+        elif self.augmentation_chain == config.AugmentationPipelines.GAUSSIAN.value:
+            with span('noise', 'augmentation'):
+                batch = self.add_gaussian_noise(batch)
+        return self.clear_padding(batch, lengths), lengths
+
+    def avc_transformation(self, batch, lengths):
+        '''
+        Augments batch after AVC pipeline as described in https://www.eecs.ucf.edu/~jjl/pubs/Mykola-CHI23.pdf
+        '''
+        with span('noise', 'augmentation'):
+            batch = self.add_gaussian_noise(batch)
+        with span('skip', 'augmentation'):
+            batch, lengths = self.skip_frames(batch, lengths)
+        with span('resample', 'augmentation'):
+            batch, lengths = self.spatial_resampling(batch, lengths)
+        with span('perspective', 'augmentation'):
+            batch = self.perspective_change(batch, lengths)
+        with span('rotate', 'augmentation'):
+            batch = self.rotate(batch, lengths)
+        with span('scale', 'augmentation'):
+            batch = self.scaling(batch, lengths)
+        return batch, lengths
+
+    def simple_transformation(self, batch, lengths):
+        '''
+        Augments batch after Simple Chain pipeline as described in https://www.eecs.ucf.edu/~jjl/pubs/Mykola-CHI23.pdf
+        '''
+        with span('rotate', 'augmentation'):
+            batch = self.rotate(batch, lengths)
+        with span('scale', 'augmentation'):
+            batch = self.scaling(batch, lengths)
+        with span('noise', 'augmentation'):
+            batch = self.add_gaussian_noise(batch)
+        return batch
+
+    def add_gaussian_noise(self, batch):
+        '''
+        Adds noise to every point of every sample
+        '''
+        return batch + self.rng.normal(0, config.GAUSSIAN_NOISE_SIGMA, batch.shape)
+
+    def scaling(self, batch, lengths):
+        '''
+        Scales every sample in x and y direction by its own random amount
+        '''
+        centroids = self.centroids(batch, lengths)
+        factors = self.rng.uniform(
+            config.SCALING_LOWER_BOUND, config.SCALING_UPPER_BOUND, (len(batch), 1, 2))
+        return (batch - centroids) * factors + centroids
+
+    def spatial_resampling(self, batch, lengths):
+        '''
+        Samples a random number of points along the trajectory of every sample
+        '''
+        new_lengths = self.rng.integers(
+            config.SPATIAL_RESAMPLING_LOWER_BOUND,
+            np.maximum(lengths * 2, config.SPATIAL_RESAMPLING_LOWER_BOUND + 1))
+        resampled = np.zeros((len(batch), new_lengths.max(), 2))
+        # scipy resamples along one axis, lengths differ per sample so this loops over samples only
+        for i, (length, new_length) in enumerate(zip(lengths, new_lengths)):
+            resampled[i, :new_length] = resample(batch[i, :length], new_length)
+        return resampled, new_lengths
+
+    def perspective_change(self, batch, lengths):
+        '''
+        Rotates every trajectory around x and y axes
+        '''
+        centroids = self.centroids(batch, lengths)
+        angles = self.rng.integers(
+            config.PERSPECTIVE_CHANGE_MIN_ANGLE, config.PERSPECTIVE_CHANGE_MAX_ANGLE, (len(batch), 2))
+        mats = R.from_euler('yx', angles, degrees=True).as_matrix()
+        # points are lifted to (x, y, 1), so the third column acts as translation
+        points = batch - centroids
+        persp = np.einsum('nij,npj->npi', mats[:, :2, :2], points) + mats[:, np.newaxis, :2, 2]
+        return persp + centroids
+
+    def skip_frames(self, batch, lengths):
+        '''
+        Removes random points from every trajectory and moves the remaining points to the front
+        '''
+        valid = self.valid_mask(batch, lengths)
+        keep = valid & (self.rng.uniform(0, 1.0, valid.shape) >= config.SKIP_FRAME_CHANCE)
+        # never drop a trajectory completely
+        keep[keep.sum(axis=1) == 0, 0] = True
+        order = np.argsort(~keep, axis=1, kind='stable')
+        skipped = np.take_along_axis(batch, order[:, :, np.newaxis], axis=1)
+        return skipped, keep.sum(axis=1)
+
+    def rotate(self, batch, lengths):
+        '''
+        Rotates every trajectory around its centroid
+        '''
+        centroids = self.centroids(batch, lengths)
+        angles = np.radians(self.rng.integers(
+            config.ROTATION_MIN_ANGLE, config.ROTATION_MAX_ANGLE, len(batch)))
+        cos, sin = np.cos(angles), np.sin(angles)
+        mats = np.stack([np.stack([cos, -sin], axis=1),
+                         np.stack([sin, cos], axis=1)], axis=1)
+        rotated = np.einsum('nij,npj->npi', mats, batch - centroids)
+        return rotated + centroids
+
+    def valid_mask(self, batch, lengths):
+        '''
+        Returns boolean mask of shape (samples, points) that is False for padded points
+        '''
+        return np.arange(batch.shape[1]) < lengths[:, np.newaxis]
+
+    def centroids(self, batch, lengths):
+        '''
+        Returns centroid of the valid points of every sample with shape (samples, 1, 2)
+        '''
+        mask = self.valid_mask(batch, lengths)[:, :, np.newaxis]
+        return (batch * mask).sum(axis=1, keepdims=True) / lengths[:, np.newaxis, np.newaxis]
+
+    def clear_padding(self, batch, lengths):
+        '''
+        Sets padded points to zero
+        '''
+        batch[~self.valid_mask(batch, lengths)] = 0
+        return batch
+
+
+def plan_chunks(gestures, n_samples, chunk_size):
+    '''
+    Splits samples of every gesture into (gesture_index, start, stop) ranges.
+    '''
+    return [(gesture_index, start, min(start + chunk_size, n_samples))
+            for gesture_index in range(len(gestures))
+            for start in range(0, n_samples, chunk_size)]
+
+
+def init_worker(settings):
+    '''
+    Applies config of the parent process, spawned workers import config from scratch.
+    '''
+    for key, value in settings.items():
+        setattr(config, key, value)
+
+
+def augment_chunk(task):
+    '''
+    Augments one sample range of one gesture with a Generator derived from seed, gesture and chunk.
+
+    Top-level function so it can be sent to worker processes.
+    '''
+    sequence, augmentation_chain, entropy, gesture_index, start, stop, chunk_size = task
+    seed_sequence = np.random.SeedSequence(
+        entropy, spawn_key=(gesture_index, start // chunk_size))
+    engine = BatchAugmenter(augmentation_chain, np.random.default_rng(seed_sequence))
+    with span('chunk', 'augmentation', samples=stop - start):
+        return engine.augment(sequence, stop - start)
+
+
+def augment_chunk_traced(task):
+    '''
+    Augments chunk in a worker process and returns the spans recorded there with the result.
+    '''
+    return augment_chunk(task), tracer.drain()
+
+
+def augment_gestures(gestures, augmentation_chain, n_samples=None, seed=None, workers=None,
+                     progress=None, cancel=None):
+    '''
+    Creates training set of [label, sequence] pairs for all gestures.
+
+    With more than one worker, chunks are distributed across a process pool.
+    progress is called with the number of generated samples after every chunk.
+    Setting the threading.Event cancel raises progress_channel.Cancelled after the current chunk.
+    '''
+    n_samples = n_samples or config.NUMBER_OF_SAMPLES
+    workers = workers or config.AUGMENTATION_WORKERS
+    chunk_size = config.AUGMENTATION_CHUNK_SIZE
+    # without a seed, draw fresh entropy once so that all chunks of this run still differ
+    entropy = seed if seed is not None else np.random.SeedSequence().entropy
+
+    chunks = plan_chunks(gestures, n_samples, chunk_size)
+    tasks = [(gestures[gesture_index][1], augmentation_chain, entropy,
+              gesture_index, start, stop, chunk_size)
+             for gesture_index, start, stop in chunks]
+
+    # spans of worker processes are sent back with every chunk
+    traced_workers = workers > 1 and config.TRACING_ENABLED
+    if workers > 1:
+        # spawn instead of fork, forking a process that runs Qt and BLAS threads is unsafe
+        settings = {key: getattr(config, key) for key in dir(config) if key.isupper()}
+        executor = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+            initializer=init_worker, initargs=(settings,))
+        results = executor.map(augment_chunk_traced if traced_workers else augment_chunk, tasks)
+    else:
+        executor = None
+        results = map(augment_chunk, tasks)
+
+    training_set = []
+    counter = 0
+    try:
+        for (gesture_index, start, stop), result in zip(chunks, results):
+            raise_if_cancelled(cancel)
+            if traced_workers:
+                result, events = result
+                tracer.extend(events)
+            batch, lengths = result
+            label = gestures[gesture_index][0]
+            for i, length in enumerate(lengths):
+                training_set.append([label, batch[i, :length]])
+            counter += stop - start
+            if progress is not None:
+                progress(counter)
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+    return training_set
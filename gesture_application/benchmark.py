@@ -0,0 +1,338 @@
+'''
+Benchmark of the hot paths: augmentation chains, dataset assembly, training epochs, prediction
+and drawing on the canvas.
+
+    python3 gesture_application/benchmark.py --output benchmark.json
+    python3 gesture_application/benchmark.py --compare benchmark.json
+
+The gestures are synthetic circles, zig-zags and spirals, generated from a fixed seed for every
+combination of --lengths (points per gesture) and --vocabularies (number of different gestures).
+The canvas receives a synthetic stroke at --canvas-rate points per second, like a pen tablet.
+With --compare, every metric that got worse than the baseline by more than --tolerance
+is reported as regression and the exit code is 1.
+'''
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+
+import config
+import numpy as np
+from augmentation_engine import augment_gestures
+from cli import apply_overrides
+from dataset_cache import DatasetCache
+
+SHAPES = ('circle', 'zigzag', 'spiral')
+
+
+def circle(n_points, variant):
+    '''
+    Circle, variants differ in start angle and direction.
+    '''
+    start = variant * 0.7
+    direction = 1 if variant % 2 == 0 else -1
+    angles = start + direction * np.linspace(0, 2 * np.pi, n_points)
+    return np.stack([100 * np.cos(angles), 100 * np.sin(angles)], axis=1)
+
+
+def zigzag(n_points, variant):
+    '''
+    Zig-zag line, variants differ in the number of teeth.
+    '''
+    teeth = 2 + variant
+    x = np.linspace(0, 200, n_points)
+    phase = x / 200 * teeth
+    y = 60 * np.abs(2 * (phase - np.floor(phase + 0.5)))
+    return np.stack([x, y], axis=1)
+
+
+def spiral(n_points, variant):
+    '''
+    Spiral from the center outwards, variants differ in the number of turns.
+    '''
+    angles = np.linspace(0, 2 * np.pi * (1.5 + 0.5 * variant), n_points)
+    radius = np.linspace(5, 100, n_points)
+    return np.stack([radius * np.cos(angles), radius * np.sin(angles)], axis=1)
+
+
+GENERATORS = {'circle': circle, 'zigzag': zigzag, 'spiral': spiral}
+
+
+def synthetic_gestures(vocabulary, length, seed=0):
+    '''
+    Returns list of [label, points] with vocabulary different gestures of length points each.
+
+    Shapes are cycled and get a new variant every cycle, small jitter makes them look drawn.
+    '''
+    rng = np.random.default_rng(seed)
+    gestures = []
+    for i in range(vocabulary):
+        shape, variant = SHAPES[i % len(SHAPES)], i // len(SHAPES)
+        points = GENERATORS[shape](length, variant) + rng.normal(0, 0.5, (length, 2))
+        gestures.append([f'{shape}-{variant}', points + 200])
+    return gestures
+
+
+def peak_rss_mb():
+    '''
+    Returns peak resident set size of this process so far in MB.
+    '''
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes on Linux
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+
+def best_time(function, repeats):
+    '''
+    Returns result of the last call and the shortest wall time of repeats calls of function.
+    '''
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    return result, min(timings)
+
+
+def benchmark_vocabulary(gestures, args, results, prefix):
+    '''
+    Runs all benchmarks for one synthetic vocabulary and adds metrics to results.
+    '''
+    n_samples = args.samples
+    training_set = None
+    for chain in config.AugmentationPipelines:
+        training_set_chain, seconds = best_time(
+            lambda: augment_gestures(gestures, chain.value, n_samples=n_samples,
+                                     seed=config.AUGMENTATION_SEED), args.repeats)
+        results[f'{prefix}/augmentation/{chain.name.lower()}/samples_per_second'] = \
+            len(training_set_chain) / seconds
+        if chain == config.AugmentationPipelines.AVC:
+            training_set = training_set_chain
+    results[f'{prefix}/augmentation/peak_rss_mb'] = peak_rss_mb()
+
+    # a repeated training loads the cached dataset instead of augmenting again
+    with tempfile.TemporaryDirectory() as directory:
+        dataset_cache = DatasetCache(directory, max_bytes=2**40)
+        _, seconds = best_time(lambda: dataset_cache.put('benchmark', training_set), 1)
+        results[f'{prefix}/dataset_cache/write_samples_per_second'] = len(training_set) / seconds
+        _, seconds = best_time(lambda: dataset_cache.get('benchmark'), args.repeats)
+        results[f'{prefix}/dataset_cache/load_ms'] = seconds * 1000
+
+    if args.skip_training:
+        return
+
+    from recognizer import Recognizer
+
+    recognizer = Recognizer(training_set=training_set,
+                            augmentation_chain=config.AugmentationPipelines.AVC.value)
+    _, seconds = best_time(recognizer.load_data, args.repeats)
+    results[f'{prefix}/load_data/samples_per_second'] = len(training_set) / seconds
+    results[f'{prefix}/load_data/peak_mb'] = recognizer.dataset_peak_bytes / 2**20
+
+    recognizer.train()
+    epochs = len(recognizer.history['loss'])
+    epoch_seconds = recognizer.training_seconds / epochs
+    results[f'{prefix}/training/epoch_seconds'] = epoch_seconds
+    results[f'{prefix}/training/samples_per_second'] = \
+        len(training_set) * (1 - config.VALIDATION_SPLIT) / epoch_seconds
+    results[f'{prefix}/training/peak_rss_mb'] = peak_rss_mb()
+
+    latencies = []
+    for i in range(args.predictions):
+        gesture = training_set[i % len(training_set)][1]
+        start = time.perf_counter()
+        recognizer.predict_gesture(gesture)
+        latencies.append((time.perf_counter() - start) * 1000)
+    # the first predictions include one-time setup
+    latencies = latencies[min(10, len(latencies) // 10):]
+    for percentile in (50, 95, 99):
+        results[f'{prefix}/predict/latency_ms_p{percentile}'] = \
+            float(np.percentile(latencies, percentile))
+
+    if recognizer.numpy_predictor is not None:
+        benchmark_embedding_index(recognizer.numpy_predictor, gestures, training_set, args,
+                                  results, prefix)
+
+
+def benchmark_embedding_index(predictor, gestures, training_set, args, results, prefix):
+    '''
+    Measures registration of gestures in an EmbeddingIndex and lookups in indexes of growing size.
+
+    Larger indexes are filled with random embeddings, lookup cost only depends on their number.
+    '''
+    from embedding_index import EmbeddingIndex, normalize_rows
+
+    index = EmbeddingIndex(predictor)
+    seconds = index.add_gestures(gestures, config.AugmentationPipelines.AVC.value)
+    results[f'{prefix}/embedding_index/register_ms_per_gesture'] = seconds * 1000 / len(gestures)
+
+    rng = np.random.default_rng(args.seed)
+    dimensions = index.embeddings.shape[1]
+    for n_classes in args.index_classes:
+        n_embeddings = n_classes * config.EMBEDDING_SAMPLES
+        index.embeddings = normalize_rows(
+            rng.normal(size=(n_embeddings, dimensions)).astype('float32'))
+        index.labels = np.repeat(np.arange(n_classes).astype(str), config.EMBEDDING_SAMPLES)
+        index.latencies = []
+        for i in range(args.predictions):
+            index.lookup(training_set[i % len(training_set)][1])
+        latencies = np.array(index.latencies[min(10, len(index.latencies) // 10):]) * 1000
+        for percentile in (50, 95, 99):
+            results[f'{prefix}/embedding_index/classes{n_classes}/lookup_ms_p{percentile}'] = \
+                float(np.percentile(latencies, percentile))
+
+
+def benchmark_canvas(args, results):
+    '''
+    Sends args.canvas_rate mouse move events per second to a StrokeCanvas, measures frame times.
+    '''
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from canvas_widget import StrokeCanvas
+    from PyQt5 import QtGui, QtWidgets
+    from PyQt5.QtCore import QEvent, QPointF, Qt
+
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+    canvas = StrokeCanvas()
+    canvas.show()
+    n_points = int(args.canvas_rate * args.canvas_seconds)
+    points = spiral(n_points, 2) * 3.5 + 400
+
+    start = time.perf_counter()
+    sent = 0
+    while sent < n_points:
+        due = min(n_points, int((time.perf_counter() - start) * args.canvas_rate) + 1)
+        for x, y in points[sent:due]:
+            event = QtGui.QMouseEvent(QEvent.MouseMove, QPointF(x, y), Qt.NoButton,
+                                      Qt.LeftButton, Qt.NoModifier)
+            QtWidgets.QApplication.sendEvent(canvas, event)
+        sent = due
+        app.processEvents()
+    canvas.flush()
+    canvas.stroke.end_stroke()
+    app.processEvents()
+
+    frame_times = np.array(canvas.frame_times) * 1000
+    for percentile in (50, 95, 99):
+        results[f'canvas/rate{args.canvas_rate}/frame_ms_p{percentile}'] = \
+            float(np.percentile(frame_times, percentile))
+    results[f'canvas/rate{args.canvas_rate}/kept_points'] = len(canvas.stroke)
+    canvas.close()
+
+
+def run(args):
+    '''
+    Returns benchmark report with environment and metrics.
+    '''
+    config.MAX_EPOCHS = args.epochs
+    results = {}
+    if not args.skip_canvas:
+        print(f'Benchmarking canvas at {args.canvas_rate} points/s')
+        benchmark_canvas(args, results)
+    for length in args.lengths:
+        for vocabulary in args.vocabularies:
+            print(f'Benchmarking {vocabulary} gestures of {length} points')
+            gestures = synthetic_gestures(vocabulary, length, seed=args.seed)
+            benchmark_vocabulary(gestures, args, results, f'length{length}_vocabulary{vocabulary}')
+
+    versions = {'python': platform.python_version(), 'numpy': np.__version__}
+    if 'tensorflow' in sys.modules:
+        versions['tensorflow'] = sys.modules['tensorflow'].__version__
+    return {
+        'environment': {'platform': platform.platform(), 'processor': platform.processor(),
+                        'versions': versions},
+        'parameters': {key: value for key, value in vars(args).items()
+                       if key not in ('output', 'compare')},
+        'config': {key: getattr(config, key) for key in dir(config)
+                   if key.isupper() and isinstance(getattr(config, key), (int, float, str, bool))},
+        'results': results,
+    }
+
+
+def higher_is_better(metric):
+    return metric.endswith('samples_per_second')
+
+
+def compare(results, baseline, tolerance):
+    '''
+    Returns list of (metric, baseline value, value, relative change) that got worse than tolerance.
+    '''
+    regressions = []
+    for metric, value in results.items():
+        if metric not in baseline or not baseline[metric]:
+            continue
+        change = (value - baseline[metric]) / baseline[metric]
+        worse = -change if higher_is_better(metric) else change
+        if worse > tolerance:
+            regressions.append((metric, baseline[metric], value, change))
+    return regressions
+
+
+def print_results(results, baseline=None):
+    print(f'{"metric":<64}{"value":>12}{"baseline":>12}{"change":>9}')
+    for metric, value in results.items():
+        line = f'{metric:<64}{value:>12.3f}'
+        if baseline and metric in baseline:
+            change = (value - baseline[metric]) / baseline[metric] if baseline[metric] else 0
+            line += f'{baseline[metric]:>12.3f}{100 * change:>8.1f}%'
+        print(line)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--lengths', type=int, nargs='+', default=[32, 128],
+                        help='points per synthetic gesture')
+    parser.add_argument('--vocabularies', type=int, nargs='+', default=[3, 12],
+                        help='numbers of different synthetic gestures')
+    parser.add_argument('--samples', type=int, default=100, help='augmented samples per gesture')
+    parser.add_argument('--epochs', type=int, default=2)
+    parser.add_argument('--predictions', type=int, default=300)
+    parser.add_argument('--index-classes', type=int, nargs='+', default=[100, 1000, 5000],
+                        help='numbers of classes for embedding index lookups')
+    parser.add_argument('--repeats', type=int, default=3,
+                        help='repetitions of augmentation and dataset assembly, the best is kept')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--skip-training', action='store_true',
+                        help='only benchmark augmentation, without importing TensorFlow')
+    parser.add_argument('--canvas-rate', type=int, default=1000,
+                        help='mouse move events per second sent to the canvas')
+    parser.add_argument('--canvas-seconds', type=float, default=2.0)
+    parser.add_argument('--skip-canvas', action='store_true', help='do not benchmark the canvas')
+    parser.add_argument('--set', action='append', default=[], metavar='KEY=VALUE',
+                        help='override a constant of config.py')
+    parser.add_argument('--output', help='write report to this JSON file')
+    parser.add_argument('--compare', metavar='BASELINE', help='JSON report to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='relative change that counts as regression')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    apply_overrides(args.set)
+    report = run(args)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+    print_results(report['results'], baseline)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if baseline is not None:
+        regressions = compare(report['results'], baseline, args.tolerance)
+        for metric, before, after, change in regressions:
+            print(f'REGRESSION {metric}: {before:.3f} -> {after:.3f} ({100 * change:+.1f}%)')
+        if regressions:
+            return 1
+        print('No regressions')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
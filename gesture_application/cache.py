@@ -0,0 +1,107 @@
+'''
+This module stores training results on disk, keyed by a hash of everything that influences them.
+
+Every entry is a directory named after its key. Reading an entry updates its modification time,
+so that the least recently used entries are evicted first when the cache exceeds its size limit.
+'''
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+
+import config
+import numpy as np
+
+# config constants that change the trained model
+TRAINING_CONFIG = (
+    'GAUSSIAN_NOISE_SIGMA', 'SCALING_LOWER_BOUND', 'SCALING_UPPER_BOUND',
+    'SPATIAL_RESAMPLING_LOWER_BOUND', 'PERSPECTIVE_CHANGE_MIN_ANGLE',
+    'PERSPECTIVE_CHANGE_MAX_ANGLE', 'ROTATION_MIN_ANGLE', 'ROTATION_MAX_ANGLE',
+    'SKIP_FRAME_CHANCE', 'NUMBER_OF_SAMPLES', 'AUGMENTATION_SEED', 'AUGMENTATION_CHUNK_SIZE',
+    'MAX_EPOCHS', 'BATCH_SIZE', 'VALIDATION_SPLIT', 'FIXED_LENGTH_FEATURES', 'SEQUENCE_LENGTH',
+    'STREAMING_AUGMENTATION', 'BUCKETED_BATCHING', 'NUMBER_OF_BUCKETS',
+    'MODEL_ARCHITECTURE', 'MODEL_SELECTION', 'CANDIDATE_ARCHITECTURES', 'LATENCY_BUDGET_MS',
+    'TFLITE_QUANTIZATION', 'TFLITE_CALIBRATION_SAMPLES',
+)
+
+
+def fingerprint(gestures, augmentation_chain, config_keys=TRAINING_CONFIG):
+    '''
+    Returns hex digest of gesture templates, augmentation chain and config values.
+    '''
+    digest = hashlib.sha256()
+    for label, points in gestures:
+        digest.update(label.encode())
+        digest.update(np.ascontiguousarray(points, dtype='float64').tobytes())
+    digest.update(augmentation_chain.encode())
+    for key in config_keys:
+        digest.update(f'{key}={getattr(config, key)!r}'.encode())
+    return digest.hexdigest()
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, files in os.walk(path) for name in files)
+
+
+class DiskCache:
+
+    def __init__(self, directory, max_bytes) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def get(self, key):
+        '''
+        Returns entry directory for key or None, marks entry as recently used.
+        '''
+        path = os.path.join(self.directory, key)
+        if not os.path.isdir(path):
+            return None
+        now = time.time()
+        os.utime(path, (now, now))
+        return path
+
+    def put(self, key, write):
+        '''
+        Calls write(directory) on a temporary directory and moves it into the cache as entry for key.
+        '''
+        temp_path = tempfile.mkdtemp(dir=self.directory, prefix='.tmp-')
+        try:
+            write(temp_path)
+            path = os.path.join(self.directory, key)
+            shutil.rmtree(path, ignore_errors=True)
+            os.replace(temp_path, path)
+        finally:
+            shutil.rmtree(temp_path, ignore_errors=True)
+        self.evict()
+        return path
+
+    def entries(self):
+        '''
+        Returns paths of all complete entries.
+        '''
+        return [os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                if os.path.isdir(os.path.join(self.directory, name)) and not name.startswith('.tmp-')]
+
+    def latest(self):
+        '''
+        Returns most recently used entry directory or None, marks it as recently used.
+        '''
+        entries = self.entries()
+        if not entries:
+            return None
+        return self.get(os.path.basename(max(entries, key=os.path.getmtime)))
+
+    def evict(self):
+        '''
+        Removes least recently used entries until the cache fits into max_bytes.
+        '''
+        entries = [(os.path.getmtime(path), directory_size(path), path) for path in self.entries()]
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
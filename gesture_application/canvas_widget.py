@@ -0,0 +1,134 @@
+'''
+This module contains the drawing canvas shared by the input and prediction views.
+
+Mouse move events only collect their points. Once per frame (config.CANVAS_FRAME_RATE), the
+collected points are appended to the stroke as one QPainterPath, drawn onto the persistent pixmap
+with a single QPainter and only the bounding rect of the new segments is repainted. The time from
+drawing a frame until it is painted is kept in frame_times, so it can be checked against the
+16 ms budget of 60 Hz displays also with pen tablets that report 1000 points per second.
+The drawn points are kept decimated with their timestamps in a StrokeBuffer (stroke_buffer.py),
+only kept points are emitted with point_drawn. Simplifying the finished stroke may remove some of
+them afterwards.
+'''
+import time
+from collections import deque
+
+import config
+import numpy as np
+from PyQt5 import QtGui, QtWidgets
+from PyQt5.QtCore import Qt, QTimer, pyqtSignal
+from stroke_buffer import StrokeBuffer
+from tracing import tracer
+
+
+class StrokeCanvas(QtWidgets.QWidget):
+    point_drawn = pyqtSignal(int, int)
+    stroke_finished = pyqtSignal()
+
+    def __init__(self, width=800, height=800, pen_width=4) -> None:
+        super().__init__()
+        self.setFixedSize(width, height)
+        # the pixmap covers the whole widget and only changes where the stroke grows
+        self.setAttribute(Qt.WA_OpaquePaintEvent)
+        self.setAttribute(Qt.WA_StaticContents)
+
+        self.pixmap = QtGui.QPixmap(width, height)
+        self.pixmap.fill(Qt.white)
+        self.pen = QtGui.QPen(Qt.black, pen_width, Qt.SolidLine, Qt.RoundCap, Qt.RoundJoin)
+
+        self.stroke = StrokeBuffer()
+        self.pending = []
+        self.last_point = None
+        self.frame_start = None
+        self.frame_times = deque(maxlen=config.CANVAS_FRAME_HISTORY)
+
+        self.frame_timer = QTimer(self)
+        self.frame_timer.setInterval(1000 // config.CANVAS_FRAME_RATE)
+        self.frame_timer.timeout.connect(self.flush)
+
+    def add_point(self, x, y):
+        '''
+        Collects point for the next frame.
+        '''
+        self.pending.append((x, y, time.perf_counter()))
+        if not self.frame_timer.isActive():
+            self.frame_timer.start()
+
+    def mousePressEvent(self, event):
+        self.add_point(event.x(), event.y())
+
+    def mouseMoveEvent(self, event):
+        self.add_point(event.x(), event.y())
+
+    def mouseReleaseEvent(self, event):
+        '''
+        Draws the remaining points and ends the stroke, the next one starts unconnected.
+        '''
+        self.flush()
+        self.stroke.end_stroke()
+        self.last_point = None
+        self.stroke_finished.emit()
+
+    def flush(self):
+        '''
+        Draws the points collected since the last frame and repaints the area they cover.
+        '''
+        if not self.pending:
+            self.frame_timer.stop()
+            return
+        start = time.perf_counter()
+        points, self.pending = self.pending, []
+
+        segments = QtGui.QPainterPath()
+        segments.moveTo(*(self.last_point or points[0][:2]))
+        for x, y, timestamp in points:
+            segments.lineTo(x, y)
+            if self.stroke.append(x, y, timestamp):
+                self.point_drawn.emit(x, y)
+        self.last_point = points[-1][:2]
+
+        painter = QtGui.QPainter(self.pixmap)
+        painter.setPen(self.pen)
+        painter.drawPath(segments)
+        painter.end()
+
+        margin = self.pen.widthF()
+        dirty = segments.boundingRect().adjusted(-margin, -margin, margin, margin)
+        if self.frame_start is None:
+            self.frame_start = start
+        self.update(dirty.toAlignedRect())
+
+    def paintEvent(self, event):
+        painter = QtGui.QPainter(self)
+        painter.drawPixmap(event.rect(), self.pixmap, event.rect())
+        painter.end()
+        if self.frame_start is not None:
+            end = time.perf_counter()
+            self.frame_times.append(end - self.frame_start)
+            if config.TRACING_ENABLED:
+                tracer.record('frame', 'canvas', self.frame_start, end)
+            self.frame_start = None
+
+    def clear(self):
+        '''
+        Resets canvas and starts a new StrokeBuffer, views of the old one stay valid.
+        '''
+        self.frame_timer.stop()
+        self.pixmap.fill(Qt.white)
+        self.stroke = StrokeBuffer()
+        self.pending = []
+        self.last_point = None
+        self.frame_start = None
+        self.update()
+
+    def frame_statistics(self):
+        '''
+        Returns number of frames and frame times in milliseconds.
+        '''
+        frame_times = np.array(self.frame_times or [0.0]) * 1000
+        return {
+            'frames': len(self.frame_times),
+            'p50_frame_ms': float(np.percentile(frame_times, 50)),
+            'p95_frame_ms': float(np.percentile(frame_times, 95)),
+            'max_frame_ms': float(frame_times.max()),
+        }
@@ -0,0 +1,294 @@
+'''
+Command line interface to train and evaluate models without a display.
+
+    python3 gesture_application/cli.py train GESTURES --output DIR [--chain avc] [--set KEY=VALUE]
+    python3 gesture_application/cli.py evaluate DIR GESTURES [--chain avc] [--samples 50]
+    python3 gesture_application/cli.py export-tflite DIR GESTURES [--quantization dynamic]
+    python3 gesture_application/cli.py sweep GESTURES [--chains avc none] [--samples 10 100]
+
+GESTURES is a template store directory, a directory of XML gesture files or one XML file.
+--set overrides constants of config.py, --threads caps BLAS and TensorFlow threads,
+so that several vocabularies can be trained in parallel on one machine.
+With --set TRACING_ENABLED=True, a trace of the run is written to config.TRACE_FILE.
+Augmented training sets are cached in config.DATASET_CACHE_DIR, --set DATASET_CACHE_MAX_BYTES=0
+augments every time.
+'''
+import argparse
+import ast
+import json
+import os
+import sys
+import time
+
+import config
+import numpy as np
+import tracing
+from augmentation_engine import augment_gestures
+from dataset_cache import dataset_key, open_dataset_cache
+from gesture_files import read_gestures
+from model_selection import limit_threads
+
+CHAINS = {chain.name.lower(): chain.value for chain in config.AugmentationPipelines}
+
+
+def apply_overrides(overrides):
+    '''
+    Sets config constants from KEY=VALUE strings, values are parsed as Python literals.
+    '''
+    for override in overrides:
+        key, _, value = override.partition('=')
+        if not key.isupper() or not hasattr(config, key):
+            raise SystemExit(f'Unknown config constant {key}')
+        try:
+            value = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            pass
+        setattr(config, key, value)
+
+
+def load_gestures(paths):
+    gestures = [gesture for path in paths for gesture in read_gestures(path)]
+    if len({label for label, _ in gestures}) < 2:
+        raise SystemExit('At least two different gestures are needed')
+    return gestures
+
+
+def train(args):
+    '''
+    Augments gestures, trains a model and saves it to args.output.
+    '''
+    from recognizer import Recognizer
+
+    gestures = load_gestures(args.gestures)
+    chain = CHAINS[args.chain]
+    report = {'gestures': len(gestures), 'augmentation_chain': chain}
+
+    dataset_cache = open_dataset_cache()
+    training_set = None
+    if dataset_cache is not None:
+        training_set = dataset_cache.get(dataset_key(gestures, chain, config.AUGMENTATION_SEED))
+        if training_set is not None:
+            report.update(samples=len(training_set), dataset_cache_hit=True)
+            print(f'Loaded {len(training_set)} augmented samples from {training_set.directory}')
+
+    if config.STREAMING_AUGMENTATION:
+        recognizer = Recognizer(gestures=gestures, augmentation_chain=chain)
+    else:
+        if training_set is None:
+            start = time.perf_counter()
+            # the seed is read after --set, the cached dataset is keyed by the same one
+            training_set = augment_gestures(gestures, chain, seed=config.AUGMENTATION_SEED)
+            seconds = time.perf_counter() - start
+            report.update(samples=len(training_set), augmentation_seconds=seconds,
+                          augmentation_samples_per_second=len(training_set) / seconds)
+            print(f'Augmented {len(training_set)} samples in {seconds:.2f}s '
+                  f'({len(training_set) / seconds:.0f} samples/s)')
+            if dataset_cache is not None:
+                training_set = dataset_cache.put(
+                    dataset_key(gestures, chain, config.AUGMENTATION_SEED), training_set)
+        recognizer = Recognizer(training_set=training_set, augmentation_chain=chain)
+
+    recognizer.train()
+    os.makedirs(args.output, exist_ok=True)
+    recognizer.save(args.output)
+
+    epochs = len(recognizer.history['loss'])
+    report.update(training_seconds=recognizer.training_seconds, epochs=epochs,
+                  val_accuracy=recognizer.history.get('val_accuracy', [None])[-1])
+    if 'samples' in report:
+        report['training_samples_per_second'] = \
+            report['samples'] * (1 - config.VALIDATION_SPLIT) * epochs / recognizer.training_seconds
+    print(f'Trained {epochs} epochs in {recognizer.training_seconds:.2f}s, '
+          f'saved to {args.output}')
+    return report
+
+
+def test_seed(seed):
+    '''
+    Returns seed, or one that differs from the training seed if seed is None.
+
+    Without a training seed, test samples are not seeded either.
+    '''
+    if seed is not None or config.AUGMENTATION_SEED is None:
+        return seed
+    return config.AUGMENTATION_SEED + 1
+
+
+def augment_test_set(gestures, chain, n_samples, seed):
+    if chain == config.AugmentationPipelines.NONE.value:
+        return gestures
+    return augment_gestures(gestures, chain, n_samples=n_samples, seed=seed)
+
+
+def evaluate(args):
+    '''
+    Predicts augmented variants of gestures with a saved model and measures accuracy and speed.
+    '''
+    from recognizer import Recognizer
+
+    recognizer = Recognizer.load(args.model)
+    gestures = load_gestures(args.gestures)
+    chain = CHAINS[args.chain]
+    test_set = augment_test_set(gestures, chain, args.samples, test_seed(args.seed))
+    labels = np.array([str(label) for label, _ in test_set])
+    sequences = [sequence for _, sequence in test_set]
+
+    start = time.perf_counter()
+    probabilities = recognizer.predict_batch(sequences)
+    batch_seconds = time.perf_counter() - start
+    predicted = np.asarray(recognizer.encoder.classes_)[np.argmax(probabilities, axis=1)]
+    accuracy = float(np.mean(predicted.astype(str) == labels))
+
+    latencies = []
+    for sequence in sequences[:args.latency_samples]:
+        start = time.perf_counter()
+        recognizer.predict_gesture(sequence)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    report = {
+        'samples': len(test_set),
+        'augmentation_chain': chain,
+        'accuracy': accuracy,
+        'batch_samples_per_second': len(test_set) / batch_seconds,
+        'latency_ms_p50': float(np.percentile(latencies, 50)),
+        'latency_ms_p95': float(np.percentile(latencies, 95)),
+        'backend': config.PREDICTION_BACKEND,
+    }
+    print(f'Accuracy {accuracy:.3f} on {len(test_set)} samples')
+    print(f'Batch throughput {report["batch_samples_per_second"]:.0f} samples/s, '
+          f'single gesture latency p50 {report["latency_ms_p50"]:.2f}ms '
+          f'p95 {report["latency_ms_p95"]:.2f}ms')
+    return report
+
+
+def export_tflite(args):
+    '''
+    Converts a saved model to TFLite next to it and compares it with the Keras model.
+
+    Calibration samples are augmented with the training seed, test samples with args.seed.
+    '''
+    from features import to_batch
+    from keras.models import load_model
+    from tflite_backend import export, print_report
+
+    keras_model = load_model(os.path.join(args.model, 'model.keras'))
+    classes = np.load(os.path.join(args.model, 'classes.npy'))
+    class_indices = {str(label): i for i, label in enumerate(classes)}
+    gestures = load_gestures(args.gestures)
+    unknown = {str(label) for label, _ in gestures} - set(class_indices)
+    if unknown:
+        raise SystemExit(f'The model was not trained on {", ".join(sorted(unknown))}')
+    chain = CHAINS[args.chain]
+
+    calibration_set = augment_test_set(gestures, chain, args.samples, config.AUGMENTATION_SEED)
+    test_set = augment_test_set(gestures, chain, args.samples, test_seed(args.seed))
+    test_data = (to_batch([sequence for _, sequence in test_set]),
+                 np.array([class_indices[str(label)] for label, _ in test_set]))
+    predictor, report = export(
+        keras_model, classes, args.quantization,
+        calibration=to_batch([sequence for _, sequence in calibration_set]), test_data=test_data)
+    path = os.path.join(args.model, 'model.tflite')
+    predictor.save(path)
+    print_report(report)
+    print(f'Saved to {path}')
+    return report
+
+
+def sweep(args):
+    '''
+    Trains every combination of chains, samples and seeds and prints a summary table.
+    '''
+    from sweep import print_summary, run_sweep, summarize
+
+    gestures = load_gestures(args.gestures)
+    try:
+        experiment, results = run_sweep(
+            gestures, [CHAINS[chain] for chain in args.chains], args.samples, args.seeds,
+            database=args.database, templates=args.templates, workers=args.workers,
+            threads=args.job_threads, test_chain=CHAINS[args.test_chain],
+            test_samples=args.test_samples)
+    except KeyboardInterrupt:
+        raise SystemExit(f'Interrupted, finished jobs are stored in '
+                         f'{args.database or config.SWEEP_DATABASE}, '
+                         f'the same command resumes the sweep')
+    rows = summarize(results)
+    print_summary(rows)
+    return {'experiment': experiment, 'summary': rows, 'results': results}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--set', action='append', default=[], metavar='KEY=VALUE',
+                        help='override a constant of config.py')
+    parser.add_argument('--threads', type=int, help='maximum number of BLAS and TensorFlow threads')
+    parser.add_argument('--json', help='write report to this file')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    train_parser = commands.add_parser('train', help='train and save a model')
+    train_parser.add_argument('gestures', nargs='+')
+    train_parser.add_argument('--output', required=True, help='directory for the trained model')
+    train_parser.add_argument('--chain', choices=CHAINS, default='avc')
+    train_parser.set_defaults(run=train)
+
+    evaluate_parser = commands.add_parser('evaluate', help='measure accuracy and speed of a model')
+    evaluate_parser.add_argument('model', help='directory written by train')
+    evaluate_parser.add_argument('gestures', nargs='+')
+    evaluate_parser.add_argument('--chain', choices=CHAINS, default='avc')
+    evaluate_parser.add_argument('--samples', type=int, default=50,
+                                 help='augmented samples per gesture')
+    # a different seed than training, so that the variants have not been seen
+    evaluate_parser.add_argument('--seed', type=int, help='AUGMENTATION_SEED + 1 by default')
+    evaluate_parser.add_argument('--latency-samples', type=int, default=200)
+    evaluate_parser.set_defaults(run=evaluate)
+
+    tflite_parser = commands.add_parser('export-tflite',
+                                        help='convert a model to TFLite and compare it with Keras')
+    tflite_parser.add_argument('model', help='directory written by train')
+    tflite_parser.add_argument('gestures', nargs='+', help='gestures the model was trained on')
+    # defaults of config.py are read after --set, by the functions the arguments are passed to
+    tflite_parser.add_argument('--quantization', choices=('none', 'dynamic', 'int8'),
+                               help='TFLITE_QUANTIZATION by default')
+    tflite_parser.add_argument('--chain', choices=CHAINS, default='avc')
+    tflite_parser.add_argument('--samples', type=int, default=20,
+                               help='augmented samples per gesture for calibration and testing')
+    tflite_parser.add_argument('--seed', type=int, help='AUGMENTATION_SEED + 1 by default')
+    tflite_parser.set_defaults(run=export_tflite)
+
+    sweep_parser = commands.add_parser(
+        'sweep', help='compare augmentation chains over numbers of samples and seeds')
+    sweep_parser.add_argument('gestures', nargs='+')
+    sweep_parser.add_argument('--chains', choices=CHAINS, nargs='+', default=list(CHAINS))
+    sweep_parser.add_argument('--samples', type=int, nargs='+', default=[10, 50, 100, 300],
+                              help='augmented samples per template')
+    sweep_parser.add_argument('--seeds', type=int, nargs='+', default=[0, 1, 2])
+    sweep_parser.add_argument('--templates', type=int,
+                              help='training templates per gesture, the others are the test set '
+                                   '(SWEEP_TEMPLATES by default)')
+    sweep_parser.add_argument('--test-chain', choices=CHAINS, default='avc',
+                              help='augments the test set if no samples are left for it')
+    sweep_parser.add_argument('--test-samples', type=int, help='SWEEP_TEST_SAMPLES by default')
+    sweep_parser.add_argument('--workers', type=int, help='SWEEP_WORKERS by default')
+    sweep_parser.add_argument('--job-threads', type=int,
+                              help='BLAS and TensorFlow threads of every job (SWEEP_THREADS)')
+    sweep_parser.add_argument('--database',
+                              help='SQLite file of finished jobs, a sweep resumes from it '
+                                   '(SWEEP_DATABASE by default)')
+    sweep_parser.set_defaults(run=sweep)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    apply_overrides(args.set)
+    if args.threads:
+        limit_threads(args.threads)
+    report = args.run(args)
+    tracing.export()
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -15,10 +15,103 @@ ROTATION_MIN_ANGLE = -20
 ROTATION_MAX_ANGLE = 20
 SKIP_FRAME_CHANCE = 0.3
 NUMBER_OF_SAMPLES = 300
+# same seed produces the same training set regardless of the number of workers, None for random
+AUGMENTATION_SEED = 42
+AUGMENTATION_WORKERS = 1
+AUGMENTATION_CHUNK_SIZE = 50
 MAX_EPOCHS = 30
+# resample and normalize every sequence to a fixed number of points for training and prediction
+FIXED_LENGTH_FEATURES = True
+SEQUENCE_LENGTH = 64
+# sequences resampled at once while a dataset is assembled, bounds the temporary arrays
+FEATURE_CHUNK_SIZE = 1024
+BATCH_SIZE = 512
+VALIDATION_SPLIT = 0.2
+# augment batches on the fly while training instead of building the whole training set first
+STREAMING_AUGMENTATION = False
+STREAM_QUEUE_SIZE = 8
+STREAM_VALIDATION_SAMPLES = 50
+# batch sequences of similar length instead of padding all of them to the longest one, only used
+# without FIXED_LENGTH_FEATURES
+BUCKETED_BATCHING = False
+NUMBER_OF_BUCKETS = 8
+# one of recognizer.ARCHITECTURES
+MODEL_ARCHITECTURE = "lstm96"
+# train all candidate architectures in parallel and keep the most accurate one within the latency budget
+MODEL_SELECTION = False
+CANDIDATE_ARCHITECTURES = ("lstm96", "lstm64", "lstm96_dropout", "gru96", "gru96_batchnorm")
+MODEL_SELECTION_WORKERS = 4
+MODEL_SELECTION_THREADS = 2
+LATENCY_BUDGET_MS = 5.0
+LATENCY_REPEATS = 50
+MODEL_SELECTION_RESULTS = "model_selection.json"
+# cli.py sweep: jobs in parallel, threads per job, training templates per gesture and augmented
+# test variants per gesture if no samples are left for testing
+SWEEP_WORKERS = 4
+SWEEP_THREADS = 1
+SWEEP_TEMPLATES = 1
+SWEEP_TEST_SAMPLES = 20
+# finished jobs, an interrupted sweep resumes from here
+SWEEP_DATABASE = "sweep.sqlite"
+# one of RecognitionEngines, template matching needs no augmentation and training
+RECOGNITION_ENGINE = "RNN"
+TEMPLATE_MATCHING_POINTS = 32
+# templates whose distances to the drawn gesture give the lower bounds for early abandoning
+TEMPLATE_MATCHING_PIVOTS = 8
+# classify by nearest neighbours of RNN embeddings, gestures recorded after the last training
+# are added without training again
+EMBEDDING_INDEX = False
+EMBEDDING_SAMPLES = 20
+EMBEDDING_NEIGHBOURS = 5
+# "keras", "numpy" (exported weights, forward pass without TensorFlow) or "tflite"
+PREDICTION_BACKEND = "keras"
+# "none", "dynamic" (int8 weights) or "int8" (int8 weights and activations), needs
+# FIXED_LENGTH_FEATURES
+TFLITE_QUANTIZATION = "dynamic"
+# training samples that calibrate the activation ranges of "int8"
+TFLITE_CALIBRATION_SAMPLES = 200
+TFLITE_THREADS = 1
+# predict on a worker thread so that drawing never waits for the model
+INFERENCE_WORKER = True
+# inference_server.py listens here, strokes arriving within the window are predicted in one batch
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8765
+SERVER_BATCH_WINDOW_MS = 2.0
+SERVER_MAX_BATCH_SIZE = 64
+# show live prediction while drawing (needs PREDICTION_BACKEND "numpy" and FIXED_LENGTH_FEATURES False)
+INCREMENTAL_RECOGNITION = False
+INCREMENTAL_TOP_K = 3
+EARLY_COMMIT_CONFIDENCE = 0.9
+EARLY_COMMIT_MIN_POINTS = 10
+# trained models are reused when gestures, augmentation chain and training config are unchanged
+MODEL_CACHE_DIR = ".cache/models"
+MODEL_CACHE_MAX_BYTES = 200 * 1024 * 1024
+# augmented datasets are reused memory-mapped when gestures, chain, seed and augmentation config
+# are unchanged, 0 disables it
+DATASET_CACHE_DIR = ".cache/datasets"
+DATASET_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+# progress of augmentation and training is shown at most this many times per second
+PROGRESS_REFRESH_HZ = 10
+# record timing spans of augmentation, dataset assembly, training and prediction
+TRACING_ENABLED = False
+# Chrome trace JSON written after training and on exit, open with https://ui.perfetto.dev
+TRACE_FILE = "trace.json"
+# only the latest spans are kept, so that long sessions do not grow without bound
+TRACE_MAX_EVENTS = 100000
+
+# recorded gesture templates are kept between sessions
+TEMPLATE_DIR = "gesture_templates"
 
 WINDOW_WIDTH = 850
 WINDOW_HEIGHT = 1000
+# drawn points are collected and painted at most this many times per second
+CANVAS_FRAME_RATE = 60
+# frame times kept for StrokeCanvas.frame_statistics
+CANVAS_FRAME_HISTORY = 1000
+# drawn points closer than this many pixels to the last kept point are dropped, 0 keeps all
+STROKE_MIN_DISTANCE = 3.0
+# Douglas-Peucker tolerance in pixels for a finished stroke, 0 disables it
+STROKE_SIMPLIFY_TOLERANCE = 1.0
 
 
 class AugmentationPipelines(Enum):
@@ -26,3 +119,8 @@ class AugmentationPipelines(Enum):
     SIMPLE = "Simple Chain"
     GAUSSIAN = "Gaussian"
     NONE = "None"
+
+
+class RecognitionEngines(Enum):
+    RNN = "RNN"
+    TEMPLATE = "Template Matching"
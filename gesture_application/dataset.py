@@ -0,0 +1,191 @@
+'''
+This module feeds augmented gestures to RNN training without materializing the whole training set.
+'''
+import queue
+import threading
+
+import config
+import numpy as np
+from augmentation_engine import BatchAugmenter, augment_gestures
+from features import to_batch
+
+
+def stratified_split(y, validation_split=None, seed=None):
+    '''
+    Returns order of the samples with encoded labels y and the number of training samples.
+
+    The order puts the shuffled training samples before the validation samples, every class is
+    split by validation_split (config.VALIDATION_SPLIT). A batch assembled in this order splits into
+    two views.
+    '''
+    if validation_split is None:
+        validation_split = config.VALIDATION_SPLIT
+    rng = np.random.default_rng(seed)
+    # grouped by class, shuffled inside every class
+    order = rng.permutation(len(y))
+    order = order[np.argsort(y[order], kind='stable')]
+    counts = np.bincount(y)
+    position_in_class = np.arange(len(y)) - np.repeat(np.cumsum(counts) - counts, counts)
+    validation = position_in_class < np.repeat(np.round(counts * validation_split), counts)
+    train = rng.permutation(order[~validation])
+    return np.concatenate([train, order[validation]]), len(train)
+
+
+class AugmentationStream:
+    '''
+    Producer/consumer pipeline: a background thread augments fresh batches while the model trains.
+
+    Peak memory is bounded by config.STREAM_QUEUE_SIZE batches instead of the whole training set.
+    '''
+
+    def __init__(self, gestures, augmentation_chain, encoder, seed, batch_size=None) -> None:
+        self.gestures = gestures
+        self.augmentation_chain = augmentation_chain
+        self.encoder = encoder
+        self.batch_size = batch_size or config.BATCH_SIZE
+        self.seed = seed
+
+        # same number of samples per epoch as the materialized training split
+        n_samples = len(gestures) * config.NUMBER_OF_SAMPLES
+        self.steps_per_epoch = max(1, int(np.ceil(
+            n_samples * (1 - config.VALIDATION_SPLIT) / self.batch_size)))
+
+        self.batches = queue.Queue(maxsize=config.STREAM_QUEUE_SIZE)
+        self.stopped = threading.Event()
+        self.producer = threading.Thread(target=self.produce, daemon=True)
+
+    def validation_data(self):
+        '''
+        Creates small fixed validation set, so that val_loss stays comparable between epochs.
+        '''
+        validation_set = augment_gestures(
+            self.gestures, self.augmentation_chain,
+            n_samples=config.STREAM_VALIDATION_SAMPLES, seed=self.seed)
+        X = to_batch([sample[1] for sample in validation_set])
+        y = self.encode([sample[0] for sample in validation_set])
+        return X, y
+
+    def encode(self, labels):
+        '''
+        Encodes list of labels as int32 class indices.
+        '''
+        return self.encoder.transform(labels).astype('int32')
+
+    def start(self):
+        self.producer.start()
+
+    def stop(self):
+        '''
+        Stops producer thread and drops queued batches.
+        '''
+        self.stopped.set()
+        while not self.batches.empty():
+            self.batches.get_nowait()
+
+    def produce(self):
+        '''
+        Augments random batches of gestures until stopped, blocks while the queue is full.
+        '''
+        seed_sequence = np.random.SeedSequence(self.seed).spawn(1)[0]
+        rng = np.random.default_rng(seed_sequence)
+        engine = BatchAugmenter(self.augmentation_chain, rng)
+        while not self.stopped.is_set():
+            counts = np.bincount(rng.integers(0, len(self.gestures), self.batch_size),
+                                 minlength=len(self.gestures))
+            sequences, labels = [], []
+            for gesture, count in zip(self.gestures, counts):
+                if count == 0:
+                    continue
+                batch, lengths = engine.augment(gesture[1], count)
+                sequences += [batch[i, :length] for i, length in enumerate(lengths)]
+                labels += [gesture[0]] * count
+            item = (to_batch(sequences), self.encode(labels))
+            while not self.stopped.is_set():
+                try:
+                    self.batches.put(item, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+
+    def __iter__(self):
+        while not self.stopped.is_set():
+            yield self.batches.get()
+
+
+class BucketedBatches:
+    '''
+    Groups sequences of similar length into batches, so that every batch is only padded to its own longest sequence.
+
+    Sequences are sorted into config.NUMBER_OF_BUCKETS length buckets. Every epoch shuffles samples
+    inside each bucket and the order of the batches.
+    '''
+
+    def __init__(self, sequences, y, batch_size=None, shuffle=True, seed=None) -> None:
+        self.sequences = sequences
+        self.y = y
+        self.batch_size = batch_size or config.BATCH_SIZE
+        self.shuffle = shuffle
+        self.rng = np.random.default_rng(seed)
+
+        self.lengths = np.array([len(sequence) for sequence in sequences])
+        order = np.argsort(self.lengths, kind='stable')
+        self.buckets = np.array_split(order, min(config.NUMBER_OF_BUCKETS, len(order)))
+        self.batches = self.plan_epoch()
+
+    def __len__(self):
+        return len(self.batches)
+
+    def plan_epoch(self):
+        '''
+        Returns list of index arrays, one per batch.
+        '''
+        batches = []
+        for bucket in self.buckets:
+            if self.shuffle:
+                bucket = self.rng.permutation(bucket)
+            batches += [bucket[i:i + self.batch_size]
+                        for i in range(0, len(bucket), self.batch_size)]
+        if self.shuffle:
+            batches = [batches[i] for i in self.rng.permutation(len(batches))]
+        return batches
+
+    def padding_stats(self):
+        '''
+        Returns number of padded time steps with bucketing and with padding to the longest sequence.
+        '''
+        bucketed = sum(len(batch) * self.lengths[batch].max() for batch in self.batches)
+        pad_to_longest = len(self.lengths) * self.lengths.max()
+        real = self.lengths.sum()
+        return bucketed - real, pad_to_longest - real
+
+    def __iter__(self):
+        while True:
+            for batch in self.batches:
+                yield to_batch([self.sequences[i] for i in batch]), self.y[batch]
+            if self.shuffle:
+                self.batches = self.plan_epoch()
+
+
+class MappedBatches:
+    '''
+    Reads shuffled batches from X and y, which may be memory-mapped, one batch at a time.
+
+    The indices of every batch are sorted, so that its samples are read front to back.
+    '''
+
+    def __init__(self, X, y, batch_size=None, shuffle=True, seed=None) -> None:
+        self.X = X
+        self.y = y
+        self.batch_size = batch_size or config.BATCH_SIZE
+        self.shuffle = shuffle
+        self.rng = np.random.default_rng(seed)
+
+    def __len__(self):
+        return int(np.ceil(len(self.y) / self.batch_size))
+
+    def __iter__(self):
+        while True:
+            order = self.rng.permutation(len(self.y)) if self.shuffle else np.arange(len(self.y))
+            for start in range(0, len(order), self.batch_size):
+                batch = np.sort(order[start:start + self.batch_size])
+                yield self.X[batch], self.y[batch]
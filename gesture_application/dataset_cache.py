@@ -0,0 +1,138 @@
+'''
+This module keeps augmented datasets on disk as memory-mapped arrays, so that training again on the
+same gestures skips augmentation.
+
+An entry is keyed by a hash of the gesture templates, the augmentation chain, the seed and the
+config constants the dataset depends on (DATASET_CONFIG). It holds the model input X in the order
+of dataset.stratified_split, training samples first, the int32 labels y and the label classes.
+X is written chunk by chunk and opened with np.load(mmap_mode='r'), training reads its batches
+from the mapped pages (dataset.MappedBatches), so the whole dataset never has to fit into RAM.
+Entries are evicted least recently used first once they exceed config.DATASET_CACHE_MAX_BYTES.
+'''
+import json
+import os
+
+import config
+import numpy as np
+from cache import DiskCache, fingerprint
+from dataset import stratified_split
+from features import bucketed_batching, padding_value, to_batch
+from tracing import span
+
+# config constants that change the augmented dataset
+DATASET_CONFIG = (
+    'GAUSSIAN_NOISE_SIGMA', 'SCALING_LOWER_BOUND', 'SCALING_UPPER_BOUND',
+    'SPATIAL_RESAMPLING_LOWER_BOUND', 'PERSPECTIVE_CHANGE_MIN_ANGLE',
+    'PERSPECTIVE_CHANGE_MAX_ANGLE', 'ROTATION_MIN_ANGLE', 'ROTATION_MAX_ANGLE',
+    'SKIP_FRAME_CHANCE', 'NUMBER_OF_SAMPLES', 'AUGMENTATION_CHUNK_SIZE', 'VALIDATION_SPLIT',
+    'FIXED_LENGTH_FEATURES', 'SEQUENCE_LENGTH',
+)
+
+
+def dataset_key(gestures, augmentation_chain, seed):
+    '''
+    Returns hex digest of gesture templates, augmentation chain, seed and dataset config values.
+
+    seed has to be the one the dataset is augmented with, there is no default that could differ.
+    '''
+    return fingerprint(gestures, f'{augmentation_chain} seed={seed!r}', DATASET_CONFIG)
+
+
+def open_dataset_cache():
+    '''
+    Returns DatasetCache, or None if datasets are not cached with the current config.
+
+    Without a seed every augmentation differs, bucketed and streamed training need no model input.
+    '''
+    if (config.DATASET_CACHE_MAX_BYTES <= 0 or config.AUGMENTATION_SEED is None
+            or bucketed_batching() or config.STREAMING_AUGMENTATION):
+        return None
+    return DatasetCache()
+
+
+def write_dataset(training_set, directory):
+    '''
+    Encodes list of [label, sequence] samples and writes them into directory.
+    '''
+    # imported here, scikit-learn would slow down the start of the application
+    from sklearn.preprocessing import LabelEncoder
+
+    labels = [sample[0] for sample in training_set]
+    encoder = LabelEncoder()
+    y = encoder.fit_transform(labels).astype('int32')
+    order, n_train = stratified_split(y, config.VALIDATION_SPLIT, seed=42)
+    sequences = [training_set[i][1] for i in order]
+
+    if config.FIXED_LENGTH_FEATURES:
+        length = config.SEQUENCE_LENGTH
+    else:
+        length = max(len(sequence) for sequence in sequences)
+    X = np.lib.format.open_memmap(os.path.join(directory, 'X.npy'), mode='w+',
+                                  dtype='float32', shape=(len(sequences), length, 2))
+    for start in range(0, len(sequences), config.FEATURE_CHUNK_SIZE):
+        chunk = to_batch(sequences[start:start + config.FEATURE_CHUNK_SIZE])
+        # variable length chunks are pre-padded to their own longest sequence only
+        X[start:start + len(chunk), :length - chunk.shape[1]] = padding_value()
+        X[start:start + len(chunk), length - chunk.shape[1]:] = chunk
+    X.flush()
+    del X
+
+    np.save(os.path.join(directory, 'y.npy'), y[order])
+    np.save(os.path.join(directory, 'classes.npy'), encoder.classes_)
+    with open(os.path.join(directory, 'metadata.json'), 'w') as f:
+        json.dump({'samples': len(sequences), 'training_samples': int(n_train)}, f)
+
+
+class MappedDataset:
+    '''
+    Dataset entry with X memory-mapped read-only.
+    '''
+
+    def __init__(self, directory) -> None:
+        self.directory = directory
+        self.X = np.load(os.path.join(directory, 'X.npy'), mmap_mode='r')
+        self.y = np.load(os.path.join(directory, 'y.npy'))
+        self.classes = np.load(os.path.join(directory, 'classes.npy'))
+        with open(os.path.join(directory, 'metadata.json')) as f:
+            self.n_train = json.load(f)['training_samples']
+
+    def __len__(self):
+        return len(self.y)
+
+    def split(self):
+        '''
+        Returns X_train, X_test, y_train, y_test, the X splits are views of the mapped array.
+        '''
+        return (self.X[:self.n_train], self.X[self.n_train:],
+                self.y[:self.n_train], self.y[self.n_train:])
+
+
+class DatasetCache:
+
+    def __init__(self, directory=None, max_bytes=None) -> None:
+        # read when the cache is opened, so that overrides of config.py apply
+        self.cache = DiskCache(
+            directory if directory is not None else config.DATASET_CACHE_DIR,
+            max_bytes if max_bytes is not None else config.DATASET_CACHE_MAX_BYTES)
+
+    def get(self, key):
+        '''
+        Returns MappedDataset for key or None, marks entry as recently used.
+        '''
+        directory = self.cache.get(key)
+        if directory is None:
+            return None
+        return MappedDataset(directory)
+
+    def put(self, key, training_set):
+        '''
+        Writes list of [label, sequence] samples as entry for key and returns it as MappedDataset.
+
+        A dataset larger than the whole cache is evicted right away, training_set is returned then.
+        '''
+        with span('dataset_cache', 'dataset', samples=len(training_set)):
+            directory = self.cache.put(key, lambda path: write_dataset(training_set, path))
+        if not os.path.isdir(directory):
+            print('Dataset exceeds DATASET_CACHE_MAX_BYTES, it is not cached')
+            return training_set
+        return MappedDataset(directory)
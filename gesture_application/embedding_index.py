@@ -0,0 +1,106 @@
+'''
+This module classifies gestures by nearest neighbours in the embedding space of a trained RNN.
+
+The embedding of a gesture is the output of the layer before the softmax layer (NumpyPredictor.embed),
+e.g. the Dense(32) layer of lstm96. Augmented variants of every registered gesture are embedded
+once and kept as L2-normalized rows of one array, a lookup is one matrix product with all of them.
+New gestures are registered by embedding their variants, without any training, so the network only
+needs to be trained once on a representative vocabulary.
+'''
+import time
+
+import config
+import numpy as np
+from augmentation_engine import augment_gestures
+from features import to_batch
+from tracing import span
+
+
+def normalize_rows(x):
+    norms = np.linalg.norm(x, axis=-1, keepdims=True)
+    return np.divide(x, norms, out=np.zeros_like(x), where=norms > 0)
+
+
+class EmbeddingIndex:
+
+    def __init__(self, predictor, neighbours=None) -> None:
+        self.predictor = predictor
+        self.neighbours = neighbours or config.EMBEDDING_NEIGHBOURS
+        self.embeddings = np.empty((0, 0), dtype='float32')
+        self.labels = np.empty(0, dtype=object)
+        self.latencies = []
+
+    @property
+    def classes(self):
+        return sorted(set(self.labels))
+
+    def embed(self, sequences):
+        return normalize_rows(self.predictor.embed(to_batch(sequences)).astype('float32'))
+
+    def add(self, label, sequences):
+        '''
+        Adds embeddings of sequences under label.
+        '''
+        embeddings = self.embed(sequences)
+        if len(self.embeddings) == 0:
+            self.embeddings = embeddings
+        else:
+            self.embeddings = np.concatenate([self.embeddings, embeddings])
+        self.labels = np.concatenate([self.labels, np.full(len(sequences), label, dtype=object)])
+
+    def add_gestures(self, gestures, augmentation_chain, n_samples=None, seed=None):
+        '''
+        Registers list of [label, points] gestures with n_samples (config.EMBEDDING_SAMPLES)
+        augmented variants each, seed defaults to config.AUGMENTATION_SEED.
+
+        Returns the time it took in seconds.
+        '''
+        n_samples = n_samples or config.EMBEDDING_SAMPLES
+        if seed is None:
+            seed = config.AUGMENTATION_SEED
+        start = time.perf_counter()
+        variants = augment_gestures(gestures, augmentation_chain, n_samples=n_samples, seed=seed,
+                                    workers=1)
+        for label in dict.fromkeys(label for label, _ in gestures):
+            self.add(label, [sequence for variant_label, sequence in variants
+                             if variant_label == label])
+        return time.perf_counter() - start
+
+    def remove(self, label):
+        keep = self.labels != label
+        self.embeddings = self.embeddings[keep]
+        self.labels = self.labels[keep]
+
+    def lookup(self, gesture, k=None):
+        '''
+        Returns the k nearest registered variants as list of (label, cosine similarity).
+
+        The list is empty as long as no gesture is registered.
+        '''
+        k = min(k or self.neighbours, len(self.labels))
+        if k == 0:
+            return []
+        start = time.perf_counter()
+        with span('embedding_lookup', 'prediction'):
+            similarities = self.embeddings @ self.embed([gesture])[0]
+            nearest = np.argpartition(-similarities, k - 1)[:k]
+            nearest = nearest[np.argsort(-similarities[nearest])]
+        self.latencies.append(time.perf_counter() - start)
+        return [(self.labels[i], float(similarities[i])) for i in nearest]
+
+    def predict_gesture(self, gesture):
+        '''
+        Predicts input gesture and returns label and confidence.
+
+        The label is the most frequent one among the nearest neighbours, confidence is its share.
+        Without registered gestures, there is no prediction: the label is None.
+        '''
+        neighbours = self.lookup(gesture)
+        if not neighbours:
+            return 0.0, None
+        votes = {}
+        for label, similarity in neighbours:
+            count, total = votes.get(label, (0, 0.0))
+            votes[label] = (count + 1, total + similarity)
+        label = max(votes, key=votes.get)
+        return votes[label][0] / len(neighbours), label
@@ -0,0 +1,133 @@
+'''
+This module turns point sequences into model input, the same way for training and prediction.
+
+With config.FIXED_LENGTH_FEATURES, every sequence is resampled to config.SEQUENCE_LENGTH points
+equally spaced along its trajectory, moved to its centroid and scaled to unit size.
+This gives every batch the same static shape, independent of drawing speed, position and size.
+Defaults are read from config when a function is called, so that overrides of cli.py --set apply.
+'''
+import config
+import numpy as np
+
+# padding of bucketed batches, far outside the canvas so that the Masking layer skips no drawn point
+PADDING_VALUE = -1e9
+
+
+def bucketed_batching():
+    '''
+    Returns whether training batches sequences of similar length, which only differ without
+    config.FIXED_LENGTH_FEATURES.
+    '''
+    return config.BUCKETED_BATCHING and not config.FIXED_LENGTH_FEATURES
+
+
+def padding_value():
+    '''
+    Returns value that pads sequences, PADDING_VALUE for models that mask it and zero otherwise.
+    '''
+    return PADDING_VALUE if bucketed_batching() else 0.0
+
+
+def stack_sequences(sequences):
+    '''
+    Stores list of sequences left-aligned in one zero-padded array and returns it with their lengths.
+    '''
+    lengths = np.array([len(sequence) for sequence in sequences])
+    batch = np.zeros((len(sequences), lengths.max(), 2))
+    for i, sequence in enumerate(sequences):
+        batch[i, :lengths[i]] = sequence
+    return batch, lengths
+
+
+def pad_batch(sequences):
+    '''
+    Pre-pads list of sequences with padding_value() to the length of the longest one.
+    '''
+    max_length = max(len(sequence) for sequence in sequences)
+    X = np.full((len(sequences), max_length, 2), padding_value(), dtype='float32')
+    for i, sequence in enumerate(sequences):
+        X[i, max_length - len(sequence):] = sequence
+    return X
+
+
+def resample_sequence(sequence, n_points=None):
+    '''
+    Resamples one sequence to n_points (config.SEQUENCE_LENGTH) equally spaced along its arc length.
+    '''
+    n_points = n_points or config.SEQUENCE_LENGTH
+    sequence = np.asarray(sequence, dtype=float)
+    distances = np.concatenate(
+        [[0], np.cumsum(np.linalg.norm(np.diff(sequence, axis=0), axis=1))])
+    targets = np.linspace(0, distances[-1], n_points)
+    return np.stack([np.interp(targets, distances, sequence[:, 0]),
+                     np.interp(targets, distances, sequence[:, 1])], axis=1)
+
+
+def resample_batch(batch, lengths, n_points=None):
+    '''
+    Resamples every left-aligned sequence of batch to n_points equally spaced along its arc length.
+    '''
+    n_points = n_points or config.SEQUENCE_LENGTH
+    n_sequences, max_length = batch.shape[:2]
+    rows = np.arange(n_sequences)[:, np.newaxis]
+
+    segments = np.linalg.norm(np.diff(batch, axis=1), axis=2)
+    # segments reaching into the padding do not count
+    segments[np.arange(max_length - 1) >= (lengths - 1)[:, np.newaxis]] = 0
+    distances = np.concatenate(
+        [np.zeros((n_sequences, 1)), np.cumsum(segments, axis=1)], axis=1)
+    targets = np.linspace(0, 1, n_points) * distances[:, -1:]
+
+    # one searchsorted for all rows by shifting every row into its own value range
+    offsets = rows * (distances[:, -1].max() + 1)
+    index = np.searchsorted((distances + offsets).ravel(),
+                            (targets + offsets).ravel(), side='right').reshape(targets.shape)
+    index = np.clip(index - 1 - rows * max_length, 0, np.maximum(lengths - 2, 0)[:, np.newaxis])
+    following = np.minimum(index + 1, (lengths - 1)[:, np.newaxis])
+
+    segment = segments[rows, np.minimum(index, max_length - 2)] if max_length > 1 else \
+        np.zeros_like(targets)
+    fraction = np.divide(targets - distances[rows, index], segment,
+                         out=np.zeros_like(targets), where=segment > 0)
+    start, end = batch[rows, index], batch[rows, following]
+    return start + np.clip(fraction, 0, 1)[:, :, np.newaxis] * (end - start)
+
+
+def normalize_batch(batch):
+    '''
+    Moves every sequence to its centroid and scales it uniformly so that its larger side is 1.
+    '''
+    batch = batch - batch.mean(axis=1, keepdims=True)
+    size = np.ptp(batch, axis=1).max(axis=1)[:, np.newaxis, np.newaxis]
+    return np.divide(batch, size, out=np.zeros_like(batch), where=size > 0)
+
+
+def resample_and_normalize(sequences, n_points=None):
+    '''
+    Returns float32 array of shape (len(sequences), n_points, 2), n_points defaults to
+    config.SEQUENCE_LENGTH.
+    '''
+    n_points = n_points or config.SEQUENCE_LENGTH
+    if len(sequences) == 1:
+        # single drawn gesture for prediction, np.interp is faster than the batched path
+        resampled = resample_sequence(sequences[0], n_points)[np.newaxis]
+    else:
+        resampled = resample_batch(*stack_sequences(sequences), n_points)
+    return normalize_batch(resampled).astype('float32')
+
+
+def to_batch(sequences, chunk_size=None):
+    '''
+    Turns list of sequences into one float32 model input batch.
+
+    Large batches are written chunk by chunk (config.FEATURE_CHUNK_SIZE) into one preallocated array.
+    '''
+    chunk_size = chunk_size or config.FEATURE_CHUNK_SIZE
+    if not config.FIXED_LENGTH_FEATURES:
+        return pad_batch(sequences)
+    if len(sequences) <= chunk_size:
+        return resample_and_normalize(sequences)
+    X = np.empty((len(sequences), config.SEQUENCE_LENGTH, 2), dtype='float32')
+    for start in range(0, len(sequences), chunk_size):
+        X[start:start + chunk_size] = resample_and_normalize(sequences[start:start + chunk_size])
+    return X
@@ -0,0 +1,43 @@
+'''
+This module reads gesture templates from disk for headless training and evaluation.
+
+Supported are template store directories (template_store.py) and XML files in the format
+of the $1 gesture dataset (see documentation/dataset), labelled by their file name without
+the trailing sample number, e.g. caret01.xml is a caret.
+'''
+import os
+import re
+import xml.etree.ElementTree as ET
+
+import numpy as np
+from template_store import TemplateStore
+
+
+def read_xml_gesture(path):
+    '''
+    Returns [label, points] of one XML gesture file.
+    '''
+    root = ET.parse(path).getroot()
+    points = np.array([[element.get('X'), element.get('Y')] for element in root.findall('Point')],
+                      dtype=float)
+    label = re.sub(r'\d+$', '', os.path.splitext(os.path.basename(path))[0])
+    return [label, points]
+
+
+def read_gestures(path):
+    '''
+    Returns list of [label, points] from a template store, a directory of XML files or one XML file.
+    '''
+    if os.path.isfile(path):
+        return [read_xml_gesture(path)]
+    if os.path.isfile(os.path.join(path, 'index.i64')):
+        return [[label, points] for _, label, points in TemplateStore(path).load()]
+
+    gestures = []
+    for root, _, files in sorted(os.walk(path)):
+        if 'ipynb_checkpoint' in root:
+            continue
+        for name in sorted(files):
+            if name.endswith('.xml'):
+                gestures.append(read_xml_gesture(os.path.join(root, name)))
+    return gestures
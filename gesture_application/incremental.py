@@ -0,0 +1,83 @@
+'''
+This module recognizes a gesture while it is drawn.
+
+Every drawn point advances the recurrent state of the NumPy model by one step, so the cost per point
+stays constant instead of re-running the RNN over the whole stroke.
+Needs a model trained on raw points (config.FIXED_LENGTH_FEATURES = False), because resampling and
+normalization require the complete stroke.
+'''
+import time
+
+import config
+import numpy as np
+from tracing import tracer
+
+
+class IncrementalRecognizer:
+    '''
+    Predicts after every point of a stroke.
+
+    The label is committed early once its probability reaches commit_confidence, it is meant for
+    showing a decision while drawing. result() predicts from all points of the stroke and wins on
+    release, even if it differs from the committed label.
+    '''
+
+    def __init__(self, predictor, top_k=None, commit_confidence=None, min_points=None) -> None:
+        if config.FIXED_LENGTH_FEATURES:
+            raise ValueError('Incremental recognition needs a model trained on raw points, '
+                             'set FIXED_LENGTH_FEATURES = False')
+        self.predictor = predictor
+        self.top_k = top_k or config.INCREMENTAL_TOP_K
+        self.commit_confidence = commit_confidence or config.EARLY_COMMIT_CONFIDENCE
+        self.min_points = min_points or config.EARLY_COMMIT_MIN_POINTS
+        self.reset()
+
+    def reset(self):
+        '''
+        Starts a new stroke.
+        '''
+        self.state = self.predictor.initial_state()
+        self.probabilities = None
+        self.n_points = 0
+        self.committed = None
+        self.latencies = []
+
+    def push(self, x, y):
+        '''
+        Adds drawn point and returns the top-k (label, probability) pairs.
+        '''
+        start = time.perf_counter()
+        self.probabilities, self.state = self.predictor.step((x, y), self.state)
+        self.n_points += 1
+        if self.committed is None and self.n_points >= self.min_points:
+            confidence, label = self.result()
+            if confidence >= self.commit_confidence:
+                self.committed = label
+        candidates = self.candidates()
+        end = time.perf_counter()
+        self.latencies.append(end - start)
+        if config.TRACING_ENABLED:
+            tracer.record('incremental_step', 'prediction', start, end)
+        return candidates
+
+    def candidates(self):
+        '''
+        Returns the top-k (label, probability) pairs for the points so far.
+        '''
+        indices = np.argsort(self.probabilities)[::-1][:self.top_k]
+        return [(self.predictor.classes[i], self.probabilities[i]) for i in indices]
+
+    def result(self):
+        '''
+        Returns confidence and label of all points so far like Model.predict_gesture.
+        '''
+        index = np.argmax(self.probabilities)
+        return self.probabilities[index], self.predictor.classes[index]
+
+    def latency_ms(self):
+        '''
+        Returns mean and maximum processing time per point in milliseconds.
+        '''
+        if not self.latencies:
+            return 0.0, 0.0
+        return float(np.mean(self.latencies) * 1000), float(np.max(self.latencies) * 1000)
@@ -0,0 +1,263 @@
+'''
+This module serves predictions of one trained model to local clients over HTTP.
+
+    python3 gesture_application/inference_server.py MODEL [--port 8765] [--window-ms 2]
+
+    POST /predict  {"points": [[x, y], ...]}  ->  {"label", "confidence", "batch_size"}
+    GET  /stats    batch sizes and forward pass times
+
+MODEL is a directory written by cli.py train or an entry of config.MODEL_CACHE_DIR, it is loaded
+once for all clients. Every request thread hands its stroke to one MicroBatcher thread and waits.
+The batcher takes the first waiting stroke, collects the strokes that arrive within
+config.SERVER_BATCH_WINDOW_MS (at most config.SERVER_MAX_BATCH_SIZE) and predicts all of them in
+a single forward pass, so concurrent clients share the cost of one call into the model. The window
+only opens while strokes arrive concurrently, a single client does not wait for it.
+load_generator.py measures throughput and latency for a growing number of clients.
+'''
+import argparse
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import config
+import numpy as np
+from features import to_batch
+from numpy_inference import NumpyPredictor
+
+
+def load_predictor(directory):
+    '''
+    Returns function from list of strokes to class probabilities and the classes of the model.
+
+    The NumPy backend is loaded without TensorFlow.
+    '''
+    if config.PREDICTION_BACKEND == 'numpy':
+        predictor = NumpyPredictor.load(os.path.join(directory, 'weights.npz'))
+        return lambda strokes: predictor.forward(to_batch(strokes)), predictor.classes
+    from recognizer import Recognizer
+    recognizer = Recognizer.load(directory)
+    return recognizer.predict_batch, recognizer.encoder.classes_
+
+
+class PendingPrediction:
+
+    def __init__(self, stroke) -> None:
+        self.stroke = stroke
+        self.submitted_at = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.batch_size = 0
+
+
+class MicroBatcher:
+    '''
+    Predicts strokes submitted from many threads in batches on one thread.
+    '''
+
+    def __init__(self, predict_batch, classes, window_ms=None, max_batch_size=None) -> None:
+        self.predict_batch = predict_batch
+        self.classes = np.asarray(classes)
+        if window_ms is None:
+            window_ms = config.SERVER_BATCH_WINDOW_MS
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size or config.SERVER_MAX_BATCH_SIZE
+        self.requests = queue.Queue()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.lock = threading.Lock()
+        self.batches = 0
+        self.last_batch_size = 0
+        self.predictions = 0
+        self.batch_sizes = deque(maxlen=1000)
+        self.forward_times = deque(maxlen=1000)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.requests.put(None)
+        self.thread.join()
+
+    def predict(self, stroke):
+        '''
+        Returns label, confidence and batch size for stroke, blocks until its batch is predicted.
+        '''
+        pending = PendingPrediction(stroke)
+        self.requests.put(pending)
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        label, confidence = pending.result
+        return label, confidence, pending.batch_size
+
+    def collect(self, first):
+        '''
+        Returns first and the strokes waiting or arriving within the batch window.
+        '''
+        batch = [first]
+        # a single client would only wait, the window opens once strokes arrive concurrently
+        concurrent = self.last_batch_size > 1 or not self.requests.empty()
+        deadline = time.perf_counter() + (self.window if concurrent else 0)
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                # strokes that are already waiting join the batch even after the window
+                pending = self.requests.get(timeout=remaining) if remaining > 0 else \
+                    self.requests.get_nowait()
+            except queue.Empty:
+                break
+            if pending is None:
+                self.requests.put(None)
+                break
+            batch.append(pending)
+        return batch
+
+    def run(self):
+        while True:
+            first = self.requests.get()
+            if first is None:
+                break
+            batch = self.collect(first)
+            self.last_batch_size = len(batch)
+            start = time.perf_counter()
+            try:
+                probabilities = self.predict_batch([pending.stroke for pending in batch])
+            except Exception as error:
+                for pending in batch:
+                    pending.error = error
+                    pending.done.set()
+                continue
+            forward_time = time.perf_counter() - start
+
+            indices = np.argmax(probabilities, axis=1)
+            for pending, index, row in zip(batch, indices, probabilities):
+                pending.result = (str(self.classes[index]), float(row[index]))
+                pending.batch_size = len(batch)
+                pending.done.set()
+            with self.lock:
+                self.batches += 1
+                self.predictions += len(batch)
+                self.batch_sizes.append(len(batch))
+                self.forward_times.append(forward_time)
+
+    def statistics(self):
+        '''
+        Returns counters, batch sizes and forward pass times in milliseconds of the last batches.
+        '''
+        with self.lock:
+            batch_sizes = np.array(self.batch_sizes or [0])
+            forward_times = np.array(self.forward_times or [0.0]) * 1000
+            return {
+                'batches': self.batches,
+                'predictions': self.predictions,
+                'mean_batch_size': float(batch_sizes.mean()),
+                'max_batch_size': int(batch_sizes.max()),
+                'p50_forward_ms': float(np.percentile(forward_times, 50)),
+                'p95_forward_ms': float(np.percentile(forward_times, 95)),
+                'window_ms': self.window * 1000,
+            }
+
+
+class PredictionHandler(BaseHTTPRequestHandler):
+    # connections stay open, so that clients do not connect again for every stroke
+    protocol_version = 'HTTP/1.1'
+    # headers and body are written separately, with Nagle's algorithm the body would wait for
+    # the delayed ACK of the client
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        if self.path == '/stats':
+            self.send_json(200, self.server.batcher.statistics())
+        else:
+            self.send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        if self.path != '/predict':
+            self.send_json(404, {'error': 'not found'})
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            stroke = np.asarray(body['points'], dtype=float)
+        except (ValueError, KeyError, TypeError):
+            self.send_json(400, {'error': 'expected JSON object with points [[x, y], ...]'})
+            return
+        if stroke.ndim != 2 or stroke.shape[1] != 2 or len(stroke) < 2:
+            self.send_json(400, {'error': 'points need at least two [x, y] pairs'})
+            return
+        try:
+            label, confidence, batch_size = self.server.batcher.predict(stroke)
+        except Exception as error:
+            self.send_json(500, {'error': repr(error)})
+            return
+        self.send_json(200, {'label': label, 'confidence': confidence, 'batch_size': batch_size})
+
+    def send_json(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # one line per stroke would cost more than the prediction
+        pass
+
+
+class InferenceServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # many clients connect at once when the server starts
+    request_queue_size = 128
+
+    def __init__(self, batcher, host=None, port=None) -> None:
+        super().__init__((host or config.SERVER_HOST,
+                          port if port is not None else config.SERVER_PORT), PredictionHandler)
+        self.batcher = batcher
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('model', help='directory written by cli.py train')
+    # defaults of config.py are read after --set, by MicroBatcher and InferenceServer
+    parser.add_argument('--host', help='SERVER_HOST by default')
+    parser.add_argument('--port', type=int, help='SERVER_PORT by default')
+    parser.add_argument('--window-ms', type=float,
+                        help='time to wait for further strokes after the first one of a batch '
+                             '(SERVER_BATCH_WINDOW_MS by default)')
+    parser.add_argument('--max-batch-size', type=int,
+                        help='1 predicts every stroke on its own '
+                             '(SERVER_MAX_BATCH_SIZE by default)')
+    parser.add_argument('--set', action='append', default=[], metavar='KEY=VALUE',
+                        help='override a constant of config.py')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    from cli import apply_overrides
+
+    args = parse_args(argv)
+    apply_overrides(args.set)
+    predict_batch, classes = load_predictor(args.model)
+    batcher = MicroBatcher(predict_batch, classes, args.window_ms, args.max_batch_size)
+    batcher.start()
+    server = InferenceServer(batcher, args.host, args.port)
+    print(f'Serving {args.model} ({config.PREDICTION_BACKEND}, {len(classes)} classes) on '
+          f'http://{server.server_address[0]}:{server.server_port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        batcher.stop()
+        print(batcher.statistics())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
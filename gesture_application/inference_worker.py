@@ -0,0 +1,111 @@
+'''
+This module runs gesture predictions off the GUI thread.
+
+Strokes are handed over through a single slot: a stroke that is still waiting when a newer one arrives
+is dropped (latest wins), and results of outdated strokes are not reported.
+'''
+import threading
+import time
+from collections import deque
+
+import numpy as np
+from PyQt5.QtCore import QObject, pyqtSignal
+
+
+class InferenceWorker(QObject):
+    '''
+    This class inherites from PyQt QObject to run in a QThread, submit may be called from any thread.
+    '''
+    result = pyqtSignal(float, str)
+    # a failed prediction is reported instead of a result, the worker keeps running
+    error = pyqtSignal(str)
+    finished = pyqtSignal()
+
+    def __init__(self, predictor):
+        super().__init__()
+
+        self.predictor = predictor
+        self.condition = threading.Condition()
+        self.pending = None
+        self.running = True
+        self.latest_request = 0
+        self.in_flight = False
+        self.submitted = 0
+        self.completed = 0
+        self.dropped = 0
+        self.failed = 0
+        self.latencies = deque(maxlen=100)
+
+    def submit(self, stroke):
+        '''
+        Queues stroke for prediction and replaces a stroke that has not been started yet.
+        '''
+        with self.condition:
+            if self.pending is not None:
+                self.dropped += 1
+            self.submitted += 1
+            self.latest_request = self.submitted
+            self.pending = (self.latest_request, np.asarray(stroke), time.perf_counter())
+            self.condition.notify()
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+
+    def run(self):
+        '''
+        Predicts pending strokes until stopped.
+        '''
+        while True:
+            with self.condition:
+                while self.pending is None and self.running:
+                    self.condition.wait()
+                if not self.running:
+                    break
+                request, stroke, submitted_at = self.pending
+                self.pending = None
+                self.in_flight = True
+
+            try:
+                confidence, label = self.predictor.predict_gesture(stroke)
+            except Exception as error:
+                with self.condition:
+                    self.in_flight = False
+                    self.failed += 1
+                self.error.emit(repr(error))
+                continue
+
+            with self.condition:
+                self.in_flight = False
+                self.completed += 1
+                self.latencies.append(time.perf_counter() - submitted_at)
+                outdated = request != self.latest_request
+                if outdated:
+                    self.dropped += 1
+            if not outdated:
+                self.result.emit(float(confidence), '' if label is None else str(label))
+        self.finished.emit()
+
+    def queue_depth(self):
+        '''
+        Returns number of strokes waiting or being predicted.
+        '''
+        with self.condition:
+            return int(self.pending is not None) + int(self.in_flight)
+
+    def statistics(self):
+        '''
+        Returns counters and latency (submit to result, in milliseconds) for monitoring.
+        '''
+        with self.condition:
+            latencies = np.array(self.latencies) * 1000
+            return {
+                'queue_depth': int(self.pending is not None) + int(self.in_flight),
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'dropped': self.dropped,
+                'failed': self.failed,
+                'mean_latency_ms': float(latencies.mean()) if len(latencies) else 0.0,
+                'p95_latency_ms': float(np.percentile(latencies, 95)) if len(latencies) else 0.0,
+            }
@@ -2,9 +2,10 @@
 This module contains PyQt UI elements for the initial gesture input.
 '''
 import config as config
-import numpy as np
+from canvas_widget import StrokeCanvas
 from PyQt5 import QtGui, QtWidgets
 from PyQt5.QtCore import Qt
+from template_store import TemplateStore
 
 
 class InputWidget(QtWidgets.QWidget):
@@ -14,8 +15,23 @@ class InputWidget(QtWidgets.QWidget):
         self.setup_UI()
 
         self.gestures = []
-        self.line = []
-        self.last_x, self.last_y = None, None
+
+        self.template_store = TemplateStore(config.TEMPLATE_DIR)
+        self.template_ids = []
+        self.load_gestures()
+
+    def load_gestures(self):
+        '''
+        Loads gestures recorded in previous sessions from template store.
+        '''
+        for template_id, label, points in self.template_store.load():
+            self.template_ids.append(template_id)
+            self.gestures.append([label, points])
+        self.update_gesture_list()
+
+    @property
+    def line(self):
+        return self.canvas.stroke.points
 
     def setup_UI(self):
         '''
@@ -27,11 +43,7 @@ class InputWidget(QtWidgets.QWidget):
         self.gesture_name_input = QtWidgets.QLineEdit()
         self.input_label.setBuddy(self.gesture_name_input)
 
-        self.canvas_wrapper = QtWidgets.QLabel()
-        self.canvas = QtGui.QPixmap(800, 800)
-        self.canvas.fill(Qt.white)
-        self.canvas_wrapper.setPixmap(self.canvas)
-        self.canvas_wrapper.mouseMoveEvent = self.draw
+        self.canvas = StrokeCanvas()
 
         self.confirm_button = QtWidgets.QToolButton()
         confirm_icon = QtGui.QIcon()
@@ -53,6 +65,17 @@ class InputWidget(QtWidgets.QWidget):
             self.combo_box.addItem(chain.value)
         self.combo_box_label.setBuddy(self.combo_box)
 
+        self.engine_combo_box_label = QtWidgets.QLabel("Recognizer:")
+        self.engine_combo_box = QtWidgets.QComboBox()
+        for engine in config.RecognitionEngines:
+            self.engine_combo_box.addItem(engine.value)
+        self.engine_combo_box.setCurrentText(config.RECOGNITION_ENGINE)
+        self.engine_combo_box_label.setBuddy(self.engine_combo_box)
+        # template matching uses the recorded gestures as they are
+        self.engine_combo_box.currentTextChanged.connect(
+            lambda engine: self.combo_box.setEnabled(engine == config.RecognitionEngines.RNN.value))
+        self.combo_box.setEnabled(config.RECOGNITION_ENGINE == config.RecognitionEngines.RNN.value)
+
         self.start_button = QtWidgets.QPushButton(text='Start')
 
         self.gesture_list_view = QtWidgets.QListWidget()
@@ -67,12 +90,14 @@ class InputWidget(QtWidgets.QWidget):
         layout.addWidget(self.gesture_name_input, 0, 1)
         layout.addWidget(self.confirm_button, 0, 2)
         layout.addWidget(self.undo_button, 0, 3)
-        layout.addWidget(self.canvas_wrapper, 1, 0, 1, 4)
+        layout.addWidget(self.canvas, 1, 0, 1, 4)
         layout.addWidget(self.combo_box_label, 2, 0)
         layout.addWidget(self.combo_box, 2, 1)
         layout.addWidget(self.start_button, 2, 3, alignment=Qt.AlignLeft)
-        layout.addWidget(self.gesture_list_view, 3, 1)
-        layout.addWidget(self.delete_button, 3, 0,
+        layout.addWidget(self.engine_combo_box_label, 3, 0)
+        layout.addWidget(self.engine_combo_box, 3, 1)
+        layout.addWidget(self.gesture_list_view, 4, 1)
+        layout.addWidget(self.delete_button, 4, 0,
                          alignment=Qt.AlignRight | Qt.AlignTop)
 
         layout.setRowStretch(layout.rowCount(), 1)
@@ -85,8 +110,10 @@ class InputWidget(QtWidgets.QWidget):
         Stores gesture as label and list of points when confirm button is pressed.
         '''
         text = self.gesture_name_input.text()
-        if text and self.line:
-            self.gestures.append([text, np.array(self.line, dtype=float)])
+        if text and len(self.line):
+            points = self.line
+            self.template_ids.append(self.template_store.append(text, points))
+            self.gestures.append([text, points])
             self.clear_canvas()
             self.update_gesture_list()
 
@@ -106,45 +133,12 @@ class InputWidget(QtWidgets.QWidget):
         if self.gestures:
             selected_item = self.gesture_list_view.currentRow()
             del self.gestures[selected_item]
+            self.template_store.delete(self.template_ids.pop(selected_item))
             self.update_gesture_list()
 
     def clear_canvas(self):
         '''
         Resets canvas and saved lines.
         '''
-        self.canvas_wrapper.clear()
-        self.canvas_wrapper.setPixmap(self.canvas)
-        self.update()
-        self.line = []
-        self.last_x = None
-        self.last_y = None
+        self.canvas.clear()
         self.gesture_name_input.clear()
-
-    def draw(self, e):
-        '''
-        Connects points on canvas if mouse is dragged across it.
-        '''
-        if self.last_x is None:
-            self.last_x = e.x()
-            self.last_y = e.y()
-            return
-
-        self.painter = QtGui.QPainter(self.canvas_wrapper.pixmap())
-        p = self.painter.pen()
-        p.setWidth(4)
-        self.painter.setPen(p)
-        self.painter.drawLine(self.last_x, self.last_y, e.x(), e.y())
-        self.painter.end()
-        self.update()
-
-        self.line.append([e.x(), e.y()])
-
-        self.last_x = e.x()
-        self.last_y = e.y()
-
-    def mouseReleaseEvent(self, event):
-        '''
-        Ends drawn shape by resetting last points on mouse button release.
-        '''
-        self.last_x = None
-        self.last_y = None
@@ -0,0 +1,157 @@
+'''
+Load generator for inference_server.py: measures throughput and latency for a growing number of
+concurrent clients.
+
+    python3 gesture_application/load_generator.py [--url http://127.0.0.1:8765]
+        [--concurrency 1 2 4 8 16 32] [--seconds 5] [--gestures GESTURES ...]
+
+Every client is a thread with its own keep-alive connection that posts augmented variants of the
+gestures (synthetic ones from benchmark.py if --gestures is not given) one after another.
+For every concurrency level, requests per second, latency percentiles and the mean batch size
+reported by the server are printed.
+'''
+import argparse
+import http.client
+import json
+import sys
+import threading
+import time
+from urllib.parse import urlparse
+
+import config
+import numpy as np
+from augmentation_engine import augment_gestures
+
+
+class Client:
+
+    def __init__(self, url) -> None:
+        address = urlparse(url)
+        self.connection = http.client.HTTPConnection(address.hostname, address.port)
+
+    def request(self, method, path, data=None):
+        body = None if data is None else json.dumps(data)
+        headers = {} if data is None else {'Content-Type': 'application/json'}
+        self.connection.request(method, path, body, headers)
+        response = self.connection.getresponse()
+        data = response.read()
+        if response.status != 200:
+            # error pages of proxies or a crashed handler are not necessarily JSON
+            raise RuntimeError(f'{response.status}: {data[:200].decode(errors="replace")}')
+        return json.loads(data)
+
+    def predict(self, points):
+        return self.request('POST', '/predict', {'points': np.asarray(points).tolist()})
+
+    def statistics(self):
+        return self.request('GET', '/stats')
+
+    def close(self):
+        self.connection.close()
+
+
+def run_client(url, strokes, deadline, offset, latencies, errors):
+    '''
+    Posts strokes starting at offset until deadline and appends latencies in seconds.
+    '''
+    client = Client(url)
+    i = offset
+    try:
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                client.predict(strokes[i % len(strokes)])
+            except (OSError, RuntimeError, ValueError, http.client.HTTPException):
+                errors.append(i)
+                client.close()
+                client = Client(url)
+            else:
+                latencies.append(time.perf_counter() - start)
+            i += 1
+    finally:
+        client.close()
+
+
+def measure(url, strokes, concurrency, seconds):
+    '''
+    Runs concurrency clients for seconds and returns throughput, latency and batch statistics.
+    '''
+    monitor = Client(url)
+    before = monitor.statistics()
+    latencies, errors = [], []
+    deadline = time.perf_counter() + seconds
+    start = time.perf_counter()
+    threads = [threading.Thread(target=run_client,
+                                args=(url, strokes, deadline, i * 7, latencies, errors))
+               for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    after = monitor.statistics()
+    monitor.close()
+
+    requests = len(latencies)
+    latencies = np.array(latencies or [0.0]) * 1000
+    batches = after['batches'] - before['batches']
+    return {
+        'concurrency': concurrency,
+        'requests': requests,
+        'errors': len(errors),
+        'requests_per_second': requests / elapsed,
+        'latency_ms_p50': float(np.percentile(latencies, 50)),
+        'latency_ms_p95': float(np.percentile(latencies, 95)),
+        'latency_ms_p99': float(np.percentile(latencies, 99)),
+        'mean_batch_size': (after['predictions'] - before['predictions']) / max(batches, 1),
+    }
+
+
+def load_strokes(paths, variants, seed):
+    '''
+    Returns augmented variants of the gestures in paths or of synthetic gestures.
+    '''
+    if paths:
+        from cli import load_gestures
+        gestures = load_gestures(paths)
+    else:
+        from benchmark import synthetic_gestures
+        gestures = synthetic_gestures(12, 64)
+    samples = augment_gestures(gestures, config.AugmentationPipelines.AVC.value,
+                               n_samples=variants, seed=seed, workers=1)
+    return [points for _, points in samples]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--url', default=f'http://{config.SERVER_HOST}:{config.SERVER_PORT}')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument('--seconds', type=float, default=5.0, help='duration of every level')
+    parser.add_argument('--gestures', nargs='+', help='gesture files, synthetic ones by default')
+    parser.add_argument('--variants', type=int, default=20, help='augmented strokes per gesture')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write report to this JSON file')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    strokes = load_strokes(args.gestures, args.variants, args.seed)
+    results = []
+    print(f'{"clients":>8}{"req/s":>10}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}'
+          f'{"batch":>8}{"errors":>8}')
+    for concurrency in args.concurrency:
+        result = measure(args.url, strokes, concurrency, args.seconds)
+        results.append(result)
+        print(f'{concurrency:>8}{result["requests_per_second"]:>10.0f}'
+              f'{result["latency_ms_p50"]:>10.2f}{result["latency_ms_p95"]:>10.2f}'
+              f'{result["latency_ms_p99"]:>10.2f}{result["mean_batch_size"]:>8.1f}'
+              f'{result["errors"]:>8}')
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'url': args.url, 'seconds': args.seconds, 'results': results}, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
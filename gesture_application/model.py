@@ -1,20 +1,10 @@
 '''
-This module trains the RNN model and predicts new gestures.
+This module runs training of recognizer.Recognizer in a PyQt QThread.
 '''
-import os
-
-import config as config
-import numpy as np
-from keras.callbacks import Callback, EarlyStopping, ReduceLROnPlateau
-from keras.layers import GRU, LSTM, BatchNormalization, Dense, Dropout, Input
-from keras.metrics import categorical_crossentropy
-from keras.models import Sequential
-from keras.utils import pad_sequences, to_categorical
+import config
+from progress_channel import Cancelled, ProgressChannel
 from PyQt5.QtCore import QObject, pyqtSignal
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import LabelEncoder
-
-os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
+from recognizer import Recognizer, release_memory, warm_up  # noqa: F401
 
 
 class Model(QObject):
@@ -22,108 +12,50 @@ class Model(QObject):
     This class inherites from PyQt QObject to implement thread functionalities.
     '''
     finished = pyqtSignal()
-    progress = pyqtSignal(int)
+    cancelled = pyqtSignal()
+    # finished epochs, epochs per second, seconds left
+    progress = pyqtSignal(int, float, float)
 
-    def __init__(self, training_set):
+    def __init__(self, training_set=None, gestures=None, augmentation_chain=None,
+                 recognizer=None):
         super().__init__()
 
-        self.labels = []
-        self.training_set = training_set
+        if recognizer is None:
+            recognizer = Recognizer(training_set, gestures, augmentation_chain)
+        self.recognizer = recognizer
+        self.channel = ProgressChannel(self.progress.emit)
 
-    def load_data(self):
+    @property
+    def numpy_predictor(self):
+        return self.recognizer.numpy_predictor
+
+    def cancel(self):
         '''
-        Encodes augmented gesture set and splits it into training and test data.
+        Stops training after the current batch, may be called from any thread.
         '''
-        self.labels = [sample[0] for sample in self.training_set]
-        print(set(self.labels))
-
-        self.encoder = LabelEncoder()
-        labels_encoded = self.encoder.fit_transform(self.labels)
-
-        print(set(labels_encoded))
-        y = to_categorical(labels_encoded)
-        print(len(y[0]))
-
-        sequences = [sample[1] for sample in self.training_set]
-        sequences = pad_sequences(
-            sequences, padding="pre", dtype='float32'
-        )
-        X = np.array(sequences)
-        X_train, X_test, y_train, y_test = train_test_split(
-            X, y, test_size=0.2, random_state=42)
-        print(X_train.shape, X_test.shape, y_train.shape, y_test.shape)
-
-        return X_train, X_test, y_train, y_test
+        self.channel.cancel()
 
     def run(self):
         '''
-        Sets up RNN and handles PyQt QThread callbacks.
+        Trains the recognizer and handles PyQt QThread callbacks.
         '''
-        self.X_train, self.X_test, self.y_train, self.y_test = self.load_data()
-        # Define the model
-        model = Sequential()
-
-        # add LSTM layer
-        # input shape is (length of an individual sample, dimensions of the sample)
-        # in our case: two dimensions, as we have X and Y coordinates
-        model.add(LSTM(96))
-
-        # add dense layer to do machine learning magic
-        # model.add(BatchNormalization())
-        model.add(Dense(64, activation='relu'))
-        model.add(Dense(32, activation='relu'))
-        # here, you can add more layers and maybe a dropout for better performance
-
-        # softmax layer for classification
-        model.add(Dense(len(set(self.labels)), activation='softmax'))
-
-        # Compile the model
-        model.compile(loss='categorical_crossentropy',
-                      optimizer='adam', metrics=['accuracy'])
-
-        reduce_lr = ReduceLROnPlateau(
-            monitor='val_loss', factor=0.2, patience=2, min_lr=0.001)
-        stop_early = EarlyStopping(monitor='val_loss', patience=3)
-
-        # Train the model
-        history = model.fit(
-            self.X_train,
-            self.y_train,
-            epochs=config.MAX_EPOCHS,
-            batch_size=512,
-            validation_data=(self.X_test, self.y_test),
-            verbose=1,
-            callbacks=[reduce_lr, stop_early,
-                       TrainingCallback(progress=self.progress)]
-        )
-
+        self.channel.start(config.MAX_EPOCHS)
+        try:
+            self.recognizer.train(progress=self.channel.update, cancel=self.channel.cancel_event)
+        except Cancelled:
+            self.cancelled.emit()
+            return
         self.finished.emit()
 
-        self.model = model
-
-    def predict_gesture(self, gesture):
-        '''
-        Predicts input gesture and returns label and confidence.
-        '''
-        prediction = self.model.predict(np.array([gesture]))
-        prediction_index = np.argmax(prediction)
-        prediction_label = self.encoder.inverse_transform(
-            np.array([prediction_index]))[0]
-        confidence = prediction[0][prediction_index]
-        return confidence, prediction_label
-
+    def save(self, directory):
+        self.recognizer.save(directory)
 
-class TrainingCallback(Callback):
-    '''
-    Helper class to merge custom keras callback and PyQt QThread callback.
-    '''
+    @classmethod
+    def load(cls, directory):
+        return cls(recognizer=Recognizer.load(directory))
 
-    def __init__(self, progress):
-        super().__init__()
-        self.progress = progress
+    def export(self, path):
+        self.recognizer.export(path)
 
-    def on_epoch_end(self, epoch, logs=None):
-        '''
-        Sends QThread progress signal whenever epoch in training is passed.
-        '''
-        self.progress.emit(epoch+1)
+    def predict_gesture(self, gesture):
+        return self.recognizer.predict_gesture(gesture)
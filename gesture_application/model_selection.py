@@ -0,0 +1,164 @@
+'''
+This module trains several candidate RNN architectures in parallel processes and selects one.
+
+Every candidate is trained on the same data in its own process with a capped number of threads.
+The candidate with the best validation accuracy within config.LATENCY_BUDGET_MS wins.
+'''
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import config
+import numpy as np
+from progress_channel import raise_if_cancelled
+
+# set in worker processes by the parent to stop training of all candidates
+cancel_event = None
+
+
+def init_worker(threads, settings, cancel=None):
+    '''
+    Applies config of the parent process and caps thread pools of BLAS and TensorFlow.
+
+    Runs once per worker process before TensorFlow is imported.
+    '''
+    global cancel_event
+    cancel_event = cancel
+    for key, value in settings.items():
+        setattr(config, key, value)
+    limit_threads(threads)
+
+
+def limit_threads(threads):
+    '''
+    Caps thread pools of BLAS and TensorFlow, must run before TensorFlow executes anything.
+    '''
+    for variable in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+        os.environ[variable] = str(threads)
+    os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+
+def median_latency_ms(predict, x, repeats=None):
+    '''
+    Returns median wall time of predict(x) in milliseconds over repeats calls, by default
+    config.LATENCY_REPEATS.
+    '''
+    predict(x)
+    timings = []
+    for _ in range(repeats or config.LATENCY_REPEATS):
+        start = time.perf_counter()
+        predict(x)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings) * 1000)
+
+
+def train_candidate(task):
+    '''
+    Trains one architecture, saves it and returns its measurements. Runs in a worker process.
+    '''
+    from recognizer import TrainingCallback, build_model, training_callbacks
+    from numpy_inference import NumpyPredictor, export_weights
+
+    architecture, X_train, y_train, X_test, y_test, classes, path = task
+    raise_if_cancelled(cancel_event)
+    model = build_model(len(classes), architecture)
+    start = time.perf_counter()
+    history = model.fit(X_train, y_train, epochs=config.MAX_EPOCHS, batch_size=config.BATCH_SIZE,
+                        validation_data=(X_test, y_test), verbose=0,
+                        callbacks=[*training_callbacks(), TrainingCallback(cancel=cancel_event)])
+    training_seconds = time.perf_counter() - start
+    _, accuracy = model.evaluate(X_test, y_test, batch_size=config.BATCH_SIZE, verbose=0)
+    model.save(path)
+
+    single_gesture = X_test[:1]
+    numpy_predictor = NumpyPredictor(export_weights(model, classes))
+    keras_latency = median_latency_ms(lambda x: model(x, training=False), single_gesture)
+    numpy_latency = median_latency_ms(numpy_predictor.forward, single_gesture)
+    return {
+        'architecture': architecture,
+        'val_accuracy': float(accuracy),
+        'training_seconds': training_seconds,
+        'epochs': len(history.history['loss']),
+        'parameters': int(model.count_params()),
+        'keras_latency_ms': keras_latency,
+        'numpy_latency_ms': numpy_latency,
+        'latency_ms': numpy_latency if config.PREDICTION_BACKEND == 'numpy' else keras_latency,
+        'path': path,
+        'history': {key: [float(v) for v in values] for key, values in history.history.items()},
+    }
+
+
+def choose(results, latency_budget_ms):
+    '''
+    Returns most accurate result within latency budget, the fastest result if none fits.
+    '''
+    within_budget = [r for r in results if r['latency_ms'] <= latency_budget_ms]
+    if not within_budget:
+        return min(results, key=lambda r: r['latency_ms'])
+    return max(within_budget, key=lambda r: (r['val_accuracy'], -r['latency_ms']))
+
+
+def select_model(X_train, y_train, X_test, y_test, classes, directory, architectures=None,
+                 workers=None, threads=None, latency_budget_ms=None, results_path=None,
+                 progress=None, cancel=None):
+    '''
+    Trains all architectures, saves them to directory and returns the chosen result and all results.
+
+    Arguments that are None are read from config when called, so that overrides apply.
+    Results are written to results_path sorted by latency, an empty path writes no file.
+    progress is called with (finished candidates, all candidates).
+    Setting the threading.Event cancel stops all candidates and raises progress_channel.Cancelled.
+    '''
+    if architectures is None:
+        architectures = config.CANDIDATE_ARCHITECTURES
+    workers = workers or config.MODEL_SELECTION_WORKERS
+    threads = threads or config.MODEL_SELECTION_THREADS
+    if latency_budget_ms is None:
+        latency_budget_ms = config.LATENCY_BUDGET_MS
+    if results_path is None:
+        results_path = config.MODEL_SELECTION_RESULTS
+    tasks = [(architecture, X_train, y_train, X_test, y_test, classes,
+              os.path.join(directory, f'{architecture}.keras'))
+             for architecture in architectures]
+    # spawned workers import config from scratch, changes made at runtime are passed on explicitly
+    settings = {key: getattr(config, key) for key in dir(config) if key.isupper()}
+    context = multiprocessing.get_context('spawn')
+    worker_cancel = context.Event()
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_worker,
+                             initargs=(threads, settings, worker_cancel)) as executor:
+        pending = {executor.submit(train_candidate, task) for task in tasks}
+        try:
+            while pending:
+                done, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+                if cancel is not None and cancel.is_set():
+                    worker_cancel.set()
+                for future in done:
+                    results.append(future.result())
+                    if progress is not None:
+                        progress(len(results), len(tasks))
+        except BaseException:
+            worker_cancel.set()
+            executor.shutdown(cancel_futures=True)
+            raise
+
+    results.sort(key=lambda r: r['latency_ms'])
+    best = choose(results, latency_budget_ms)
+
+    print(f'{"architecture":<18}{"accuracy":>10}{"train s":>10}{"latency ms":>12}')
+    for r in results:
+        marker = ' *' if r is best else ''
+        print(f'{r["architecture"]:<18}{r["val_accuracy"]:>10.3f}{r["training_seconds"]:>10.1f}'
+              f'{r["latency_ms"]:>12.3f}{marker}')
+
+    if results_path:
+        with open(results_path, 'w') as f:
+            json.dump({'latency_budget_ms': latency_budget_ms, 'selected': best['architecture'],
+                       'results': [{key: value for key, value in r.items() if key != 'path'}
+                                   for r in results]}, f, indent=2)
+    return best, results
@@ -0,0 +1,248 @@
+'''
+This module runs the trained RNN forward pass with NumPy only, without importing TensorFlow.
+
+export_weights collects the weights of the Sequential models built in recognizer.py
+(Masking, LSTM, GRU, Dense, BatchNormalization and Dropout layers),
+NumpyPredictor reproduces their output from them.
+'''
+import json
+
+import numpy as np
+from features import to_batch
+from scipy.special import expit
+from tracing import span
+
+ACTIVATIONS = {
+    'linear': lambda x: x,
+    'relu': lambda x: np.maximum(x, 0),
+    'tanh': np.tanh,
+    'sigmoid': expit,
+    'softmax': lambda x: softmax(x),
+}
+
+
+def softmax(x):
+    e = np.exp(x - x.max(axis=-1, keepdims=True))
+    return e / e.sum(axis=-1, keepdims=True)
+
+
+def export_weights(keras_model, classes):
+    '''
+    Returns dictionary of float32 arrays describing the layers of keras_model and the label classes.
+    '''
+    arrays = {'classes': np.asarray(classes)}
+    layers = []
+    for i, layer in enumerate(keras_model.layers):
+        layer_type = type(layer).__name__
+        layer_config = layer.get_config()
+        weights = [np.asarray(w, dtype='float32') for w in layer.get_weights()]
+        if layer_type == 'Masking':
+            layers.append({'type': 'masking', 'mask_value': float(layer_config['mask_value'])})
+        elif layer_type == 'LSTM':
+            if layer_config['activation'] != 'tanh' or layer_config['recurrent_activation'] != 'sigmoid':
+                raise ValueError(f'Unsupported LSTM activation in layer {layer.name}')
+            arrays[f'{i}_kernel'], arrays[f'{i}_recurrent_kernel'], arrays[f'{i}_bias'] = weights
+            layers.append({'type': 'lstm', 'index': i, 'units': int(layer_config['units'])})
+        elif layer_type == 'GRU':
+            if (layer_config['activation'] != 'tanh' or layer_config['recurrent_activation'] != 'sigmoid'
+                    or not layer_config['reset_after']):
+                raise ValueError(f'Unsupported GRU configuration in layer {layer.name}')
+            arrays[f'{i}_kernel'], arrays[f'{i}_recurrent_kernel'], arrays[f'{i}_bias'] = weights
+            layers.append({'type': 'gru', 'index': i, 'units': int(layer_config['units'])})
+        elif layer_type == 'Dense':
+            arrays[f'{i}_kernel'], arrays[f'{i}_bias'] = weights
+            layers.append({'type': 'dense', 'index': i, 'activation': layer_config['activation']})
+        elif layer_type == 'BatchNormalization':
+            gamma, beta, mean, variance = weights
+            # inference only uses the moving statistics, so the layer is one scale and shift
+            scale = gamma / np.sqrt(variance + layer_config['epsilon'])
+            arrays[f'{i}_scale'], arrays[f'{i}_shift'] = scale, beta - mean * scale
+            layers.append({'type': 'batch_normalization', 'index': i})
+        elif layer_type == 'Dropout':
+            continue
+        else:
+            raise ValueError(f'Layer {layer_type} is not supported by NumpyPredictor')
+    arrays['layers'] = np.array(json.dumps(layers))
+    return arrays
+
+
+def export_model(keras_model, classes, path):
+    '''
+    Saves weights of keras_model and label classes to compressed .npz file.
+    '''
+    np.savez_compressed(path, **export_weights(keras_model, classes))
+
+
+class NumpyPredictor:
+    '''
+    Forward pass of the exported RNN in NumPy.
+    '''
+
+    def __init__(self, arrays) -> None:
+        self.classes = np.asarray(arrays['classes'])
+        self.layers = json.loads(str(arrays['layers']))
+        self.weights = {key: np.asarray(value) for key, value in arrays.items()
+                        if key not in ('classes', 'layers')}
+        self.recurrent_weights = {layer['index']: self.fold_sigmoid(layer)
+                                  for layer in self.layers if layer['type'] in ('lstm', 'gru')}
+
+    def fold_sigmoid(self, layer):
+        '''
+        Scales weights of sigmoid gates by 0.5, so that all gates need only one tanh per step.
+
+        sigmoid(z) = 0.5 * tanh(0.5 * z) + 0.5, np.tanh is much faster than scipy's expit.
+        Candidate columns (third block for LSTM and GRU) keep their weights.
+        '''
+        i, units = layer['index'], layer['units']
+        n_blocks = 4 if layer['type'] == 'lstm' else 3
+        scale = np.full(n_blocks * units, 0.5, dtype='float32')
+        scale[2 * units:3 * units] = 1
+        return (self.weights[f'{i}_kernel'] * scale,
+                self.weights[f'{i}_recurrent_kernel'] * scale,
+                self.weights[f'{i}_bias'] * scale)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as arrays:
+            return cls(dict(arrays))
+
+    def forward(self, X, n_layers=None):
+        '''
+        Returns class probabilities for batch X of shape (batch, steps, 2).
+
+        With n_layers, returns the output of the first n_layers layers instead.
+        '''
+        x = np.asarray(X, dtype='float32')
+        mask = None
+        for layer in self.layers[:n_layers]:
+            if layer['type'] == 'masking':
+                mask = np.any(x != layer['mask_value'], axis=-1)
+            elif layer['type'] == 'lstm':
+                x = self.lstm(x, layer, mask)
+            elif layer['type'] == 'gru':
+                x = self.gru(x, layer, mask)
+            else:
+                x = self.apply(layer, x)
+        return x
+
+    def embed(self, X):
+        '''
+        Returns activations of the layers before the softmax layer for batch X.
+        '''
+        return self.forward(X, n_layers=-1)
+
+    def apply(self, layer, x):
+        '''
+        Applies Dense or BatchNormalization layer to x.
+        '''
+        i = layer['index']
+        if layer['type'] == 'dense':
+            return ACTIVATIONS[layer['activation']](
+                x @ self.weights[f'{i}_kernel'] + self.weights[f'{i}_bias'])
+        return x * self.weights[f'{i}_scale'] + self.weights[f'{i}_shift']
+
+    def recurrent_layer(self):
+        '''
+        Returns position of the recurrent layer in self.layers.
+        '''
+        return next(position for position, layer in enumerate(self.layers)
+                    if layer['type'] in ('lstm', 'gru'))
+
+    def initial_state(self):
+        '''
+        Returns zero state of the recurrent layer for step.
+        '''
+        layer = self.layers[self.recurrent_layer()]
+        n_states = 2 if layer['type'] == 'lstm' else 1
+        return tuple(np.zeros(layer['units'], dtype='float32') for _ in range(n_states))
+
+    def step(self, point, state):
+        '''
+        Advances recurrent state by one point and returns class probabilities and the new state.
+
+        Costs one recurrent step and the dense layers, independent of the number of previous points.
+        '''
+        x = np.asarray(point, dtype='float32')
+        position = self.recurrent_layer()
+        layer = self.layers[position]
+        masked = any(previous['type'] == 'masking' and np.all(x == previous['mask_value'])
+                     for previous in self.layers[:position])
+        if not masked:
+            kernel, recurrent_kernel, bias = self.recurrent_weights[layer['index']]
+            if layer['type'] == 'lstm':
+                state = self.lstm_cell(x @ kernel + bias, *state, recurrent_kernel, layer['units'])
+            else:
+                state = (self.gru_cell(x @ kernel + bias[0], state[0], recurrent_kernel, bias[1],
+                                       layer['units']),)
+        x = state[0]
+        for layer in self.layers[position + 1:]:
+            x = self.apply(layer, x)
+        return x, state
+
+    def lstm(self, x, layer, mask=None):
+        '''
+        Runs LSTM over all steps and returns the last hidden state (Keras gate order i, f, c, o).
+        '''
+        units = layer['units']
+        kernel, recurrent_kernel, bias = self.recurrent_weights[layer['index']]
+        # input projection of all steps at once, only the recurrent part stays in the loop
+        projected = x @ kernel + bias
+        h = np.zeros((x.shape[0], units), dtype='float32')
+        c = np.zeros((x.shape[0], units), dtype='float32')
+        for t in range(x.shape[1]):
+            h_new, c_new = self.lstm_cell(projected[:, t], h, c, recurrent_kernel, units)
+            if mask is None:
+                h, c = h_new, c_new
+            else:
+                step_mask = mask[:, t, np.newaxis]
+                h = np.where(step_mask, h_new, h)
+                c = np.where(step_mask, c_new, c)
+        return h
+
+    @staticmethod
+    def lstm_cell(projected, h, c, recurrent_kernel, units):
+        '''
+        One LSTM step for already projected input and weights prepared by fold_sigmoid.
+        '''
+        z = np.tanh(projected + h @ recurrent_kernel)
+        candidate = z[..., 2 * units:3 * units]
+        gates = z * 0.5 + 0.5
+        c = gates[..., units:2 * units] * c + gates[..., :units] * candidate
+        h = gates[..., 3 * units:] * np.tanh(c)
+        return h, c
+
+    def gru(self, x, layer, mask=None):
+        '''
+        Runs GRU (reset_after, Keras gate order z, r, h) over all steps and returns the last hidden state.
+        '''
+        units = layer['units']
+        kernel, recurrent_kernel, bias = self.recurrent_weights[layer['index']]
+        projected = x @ kernel + bias[0]
+        h = np.zeros((x.shape[0], units), dtype='float32')
+        for t in range(x.shape[1]):
+            h_new = self.gru_cell(projected[:, t], h, recurrent_kernel, bias[1], units)
+            if mask is None:
+                h = h_new
+            else:
+                h = np.where(mask[:, t, np.newaxis], h_new, h)
+        return h
+
+    @staticmethod
+    def gru_cell(projected, h, recurrent_kernel, recurrent_bias, units):
+        '''
+        One GRU step for already projected input and weights prepared by fold_sigmoid.
+        '''
+        inner = h @ recurrent_kernel + recurrent_bias
+        gates = np.tanh(projected[..., :2 * units] + inner[..., :2 * units]) * 0.5 + 0.5
+        update, reset = gates[..., :units], gates[..., units:]
+        candidate = np.tanh(projected[..., 2 * units:] + reset * inner[..., 2 * units:])
+        return update * h + (1 - update) * candidate
+
+    def predict_gesture(self, gesture):
+        '''
+        Predicts input gesture and returns label and confidence.
+        '''
+        with span('numpy', 'prediction'):
+            prediction = self.forward(to_batch([gesture]))
+        prediction_index = np.argmax(prediction)
+        return prediction[0][prediction_index], self.classes[prediction_index]
@@ -1,7 +1,8 @@
 '''
 This module contains PyQt UI elements for gesture prediction.
 '''
-from PyQt5 import QtGui, QtWidgets
+from canvas_widget import StrokeCanvas
+from PyQt5 import QtWidgets
 from PyQt5.QtCore import Qt
 
 
@@ -11,8 +12,9 @@ class PredictionWidget(QtWidgets.QWidget):
         super().__init__()
         self.setup_UI()
 
-        self.line = []
-        self.last_x, self.last_y = None, None
+    @property
+    def line(self):
+        return self.canvas.stroke.points
 
     def setup_UI(self):
         '''
@@ -23,14 +25,10 @@ class PredictionWidget(QtWidgets.QWidget):
         self.prediction_label = QtWidgets.QLabel()
         self.prediction_label.setAlignment(Qt.AlignCenter)
 
-        self.canvas_wrapper = QtWidgets.QLabel()
-        self.canvas = QtGui.QPixmap(800, 800)
-        self.canvas.fill(Qt.white)
-        self.canvas_wrapper.setPixmap(self.canvas)
-        self.canvas_wrapper.mouseMoveEvent = self.draw
+        self.canvas = StrokeCanvas()
 
         layout.addWidget(self.prediction_label)
-        layout.addWidget(self.canvas_wrapper)
+        layout.addWidget(self.canvas)
         layout.addStretch(1)
 
         self.setLayout(layout)
@@ -39,41 +37,28 @@ class PredictionWidget(QtWidgets.QWidget):
         '''
         Resets canvas and saved lines.
         '''
-        self.canvas_wrapper.clear()
-        self.canvas_wrapper.setPixmap(self.canvas)
-        self.update()
-        self.line = []
-        self.last_x = None
-        self.last_y = None
+        self.canvas.clear()
 
     def show_prediction(self, gesture, confidence):
         '''
         Displays predicted label for input gesture.
 
-        Prediction display is managed by application.py
+        Prediction display is managed by application.py, an empty gesture means no prediction.
         '''
-        self.prediction_label.setText(
-            f'Gesture is {gesture} ({round(confidence, 2)}%)')
+        if gesture is None or gesture == '':
+            self.prediction_label.setText('No gesture recognized')
+        else:
+            self.prediction_label.setText(
+                f'Gesture is {gesture} ({round(confidence, 2)}%)')
         self.update()
 
-    def draw(self, e):
+    def show_live_prediction(self, candidates, committed, latency_ms):
         '''
-        Connects points on canvas if mouse is dragged across it.
+        Displays top candidates while the gesture is drawn.
         '''
-        if self.last_x is None:
-            self.last_x = e.x()
-            self.last_y = e.y()
-            return
-
-        self.painter = QtGui.QPainter(self.canvas_wrapper.pixmap())
-        p = self.painter.pen()
-        p.setWidth(4)
-        self.painter.setPen(p)
-        self.painter.drawLine(self.last_x, self.last_y, e.x(), e.y())
-        self.painter.end()
+        text = ', '.join(f'{label} ({round(probability * 100)}%)'
+                         for label, probability in candidates)
+        if committed is not None:
+            text = f'Gesture is {committed} - {text}'
+        self.prediction_label.setText(f'{text} [{latency_ms:.2f} ms/point]')
         self.update()
-
-        self.line.append([e.x(), e.y()])
-
-        self.last_x = e.x()
-        self.last_y = e.y()
@@ -0,0 +1,66 @@
+'''
+This module reports progress of long running work at a limited rate and carries cancellation requests.
+
+Workers call update with the amount of finished work. The callback runs at most
+config.PROGRESS_REFRESH_HZ times per second (and once the work is complete) with the throughput
+and the estimated remaining time, so a fast worker cannot flood the UI thread with signals.
+cancel can be called from any thread, the worker stops at its next check of cancel_event.
+'''
+import math
+import threading
+import time
+
+import config
+
+
+class Cancelled(Exception):
+    '''
+    Raised by workers that stopped because their work was cancelled.
+    '''
+
+
+def raise_if_cancelled(cancel_event):
+    if cancel_event is not None and cancel_event.is_set():
+        raise Cancelled()
+
+
+class ProgressChannel:
+
+    def __init__(self, callback=None, refresh_hz=None) -> None:
+        '''
+        callback is called with (done, units per second, estimated seconds left).
+        '''
+        self.callback = callback
+        if refresh_hz is None:
+            refresh_hz = config.PROGRESS_REFRESH_HZ
+        self.interval = 1 / refresh_hz if refresh_hz else 0
+        self.cancel_event = threading.Event()
+        self.start(0)
+
+    def start(self, total):
+        '''
+        Starts measuring new work of total units.
+        '''
+        self.total = total
+        self.start_time = time.perf_counter()
+        self.last_report = -math.inf
+
+    def update(self, done):
+        '''
+        Reports done units, unless the last report is more recent than the refresh interval.
+        '''
+        now = time.perf_counter()
+        if self.callback is None or (now - self.last_report < self.interval and done < self.total):
+            return
+        self.last_report = now
+        elapsed = now - self.start_time
+        per_second = done / elapsed if elapsed > 0 else 0.0
+        seconds_left = (self.total - done) / per_second if per_second > 0 else math.inf
+        self.callback(done, per_second, seconds_left)
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
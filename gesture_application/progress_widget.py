@@ -1,10 +1,19 @@
 '''
 This module contains PyQt UI elements to display the progress of data augmentation and RNN training.
 '''
+import math
+
 import config
 from PyQt5 import QtCore, QtWidgets
 
 
+def format_seconds(seconds):
+    if not math.isfinite(seconds):
+        return '--'
+    minutes, seconds = divmod(round(seconds), 60)
+    return f'{minutes}:{seconds:02d}'
+
+
 class ProgressWidget(QtWidgets.QWidget):
     def __init__(self,) -> None:
         super().__init__()
@@ -21,26 +30,42 @@ class ProgressWidget(QtWidgets.QWidget):
         self.progress_label.setAlignment(QtCore.Qt.AlignCenter)
         self.progress_bar = QtWidgets.QProgressBar()
         self.progress_bar.setAlignment(QtCore.Qt.AlignCenter)
+        self.rate_label = QtWidgets.QLabel()
+        self.rate_label.setAlignment(QtCore.Qt.AlignCenter)
+        self.cancel_button = QtWidgets.QPushButton(text='Cancel')
+        self.breakdown_label = QtWidgets.QLabel()
+        self.breakdown_label.setAlignment(QtCore.Qt.AlignCenter)
+        self.breakdown_label.setStyleSheet('font-family: monospace')
+        self.breakdown_label.setVisible(config.TRACING_ENABLED)
 
         layout.addWidget(self.progress_label)
         layout.addWidget(self.progress_bar)
+        layout.addWidget(self.rate_label)
+        layout.addWidget(self.cancel_button, alignment=QtCore.Qt.AlignCenter)
+        layout.addWidget(self.breakdown_label)
         layout.addStretch(1)
 
         self.setLayout(layout)
 
-    def update_training_progress(self, n):
+    def update_training_progress(self, n, epochs_per_second, seconds_left):
         '''
         Updates progress bar whenever RNN training progresses.
         '''
         self.progress_label.setText(f'Epoch {n} of {config.MAX_EPOCHS}')
         self.progress_bar.setValue(n)
+        if epochs_per_second > 0:
+            # early stopping usually ends training before the last epoch
+            self.rate_label.setText(f'{1 / epochs_per_second:.1f} s per epoch, '
+                                    f'at most {format_seconds(seconds_left)} left')
         self.update()
 
-    def update_augmentation_progress(self, n):
+    def update_augmentation_progress(self, n, samples_per_second, seconds_left):
         '''
         Updates progress bar whenever data augmentation progresses.
         '''
         self.progress_bar.setValue(n)
+        self.rate_label.setText(f'{samples_per_second:.0f} samples/s, '
+                                f'{format_seconds(seconds_left)} left')
         self.update()
 
     def init_progress_bar(self, upper_bound):
@@ -49,3 +74,14 @@ class ProgressWidget(QtWidgets.QWidget):
         '''
         self.progress_label.setText('Generating training set...')
         self.progress_bar.setRange(0, upper_bound)
+        self.progress_bar.setValue(0)
+        self.rate_label.clear()
+        self.cancel_button.setEnabled(True)
+
+    def update_breakdown(self, totals):
+        '''
+        Shows total time, count and mean time of the recorded spans, totals as returned by Tracer.totals.
+        '''
+        lines = [f'{name:<28}{seconds:>8.2f}s{count:>8}x{1000 * seconds / count:>9.2f}ms'
+                 for name, (count, seconds) in totals.items()]
+        self.breakdown_label.setText('\n'.join(lines))
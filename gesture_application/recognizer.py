@@ -0,0 +1,481 @@
+'''
+This module trains the RNN model and predicts new gestures, without depending on PyQt.
+
+Recognizer reports training progress through a plain callback, so it also runs headless
+(see cli.py). model.Model runs it in a PyQt QThread for the application.
+'''
+import gc
+import json
+import os
+import tempfile
+import time
+
+import config as config
+import numpy as np
+from dataset import AugmentationStream, BucketedBatches, MappedBatches, stratified_split
+from dataset_cache import MappedDataset
+from features import PADDING_VALUE, bucketed_batching, to_batch
+from keras.backend import clear_session
+from keras.callbacks import Callback, EarlyStopping, ReduceLROnPlateau
+from keras.layers import (GRU, LSTM, BatchNormalization, Dense, Dropout, Input,
+                          Masking)
+from keras.models import Sequential, load_model
+from model_selection import select_model
+from numpy_inference import NumpyPredictor, export_model, export_weights
+from progress_channel import raise_if_cancelled
+from sklearn.preprocessing import LabelEncoder
+from tflite_backend import TFLitePredictor, export as export_tflite, print_report
+from tracing import PeakMemory, span, tracer
+
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
+
+
+class Recognizer:
+
+    def __init__(self, training_set=None, gestures=None, augmentation_chain=None) -> None:
+        '''
+        Trains on materialized training_set or, if it is None, on batches augmented on the fly from gestures.
+
+        training_set is a list of [label, sequence] samples or a dataset_cache.MappedDataset.
+        '''
+        self.labels = []
+        self.dataset = training_set if isinstance(training_set, MappedDataset) else None
+        self.training_set = None if self.dataset is not None else training_set
+        self.gestures = gestures
+        self.augmentation_chain = augmentation_chain
+        self.stream = None
+        self.model = None
+        self.numpy_predictor = None
+        self.tflite_predictor = None
+        self.tflite_report = None
+        self.dataset_peak_bytes = None
+
+    def load_data(self):
+        '''
+        Encodes augmented gesture set and splits it into training and test data.
+
+        X is one float32 array with the training samples first, the splits are views of it.
+        y holds int32 class indices.
+        '''
+        if self.dataset is not None:
+            return self.load_mapped()
+        with span('load_data', 'dataset', samples=len(self.training_set)), \
+                PeakMemory() as memory:
+            self.labels = [sample[0] for sample in self.training_set]
+            print(set(self.labels))
+
+            self.encoder = LabelEncoder()
+            y = self.encoder.fit_transform(self.labels).astype('int32')
+            print(len(self.encoder.classes_))
+
+            order, n_train = stratified_split(y, config.VALIDATION_SPLIT, seed=42)
+            X = to_batch([self.training_set[i][1] for i in order])
+            y = y[order]
+            X_train, X_test, y_train, y_test = X[:n_train], X[n_train:], y[:n_train], y[n_train:]
+            print(X_train.shape, X_test.shape, y_train.shape, y_test.shape)
+
+        self.report_dataset_memory(memory, X.nbytes + y.nbytes)
+        return X_train, X_test, y_train, y_test
+
+    def load_mapped(self):
+        '''
+        Returns training and test split of the memory-mapped dataset, X stays on disk.
+        '''
+        self.encoder = LabelEncoder()
+        self.encoder.classes_ = self.dataset.classes
+        self.labels = list(self.dataset.classes)
+        print(f'Dataset: {self.dataset.X.nbytes / 2**20:.1f}MB memory-mapped from '
+              f'{self.dataset.directory}')
+        return self.dataset.split()
+
+    def load_buckets(self):
+        '''
+        Encodes augmented gesture set and splits it into length-bucketed training and test batches.
+        '''
+        with span('load_buckets', 'dataset', samples=len(self.training_set)), \
+                PeakMemory() as memory:
+            self.labels = [sample[0] for sample in self.training_set]
+            self.encoder = LabelEncoder()
+            y = self.encoder.fit_transform(self.labels).astype('int32')
+
+            order, n_train = stratified_split(y, config.VALIDATION_SPLIT, seed=42)
+            sequences = [self.training_set[i][1] for i in order]
+            y = y[order]
+            train_batches = BucketedBatches(sequences[:n_train], y[:n_train], seed=42)
+            test_batches = BucketedBatches(sequences[n_train:], y[n_train:], shuffle=False)
+
+            bucketed, pad_to_longest = train_batches.padding_stats()
+            print(f'Padding: {bucketed} steps with bucketing, {pad_to_longest} steps padded to longest '
+                  f'({100 * (1 - bucketed / max(pad_to_longest, 1)):.1f}% saved)')
+
+        self.report_dataset_memory(memory, y.nbytes)
+        return train_batches, test_batches
+
+    def report_dataset_memory(self, memory, dataset_bytes):
+        self.dataset_peak_bytes = memory.peak_bytes
+        print(f'Dataset: {dataset_bytes / 2**20:.1f}MB, peak {memory.peak_bytes / 2**20:.1f}MB '
+              f'allocated while building it')
+
+    def load_stream(self):
+        '''
+        Encodes gesture labels and sets up on-the-fly augmentation of training batches.
+        '''
+        self.labels = [gesture[0] for gesture in self.gestures]
+        self.encoder = LabelEncoder()
+        self.encoder.fit(self.labels)
+        return AugmentationStream(
+            self.gestures, self.augmentation_chain, self.encoder, config.AUGMENTATION_SEED)
+
+    def train(self, progress=None, cancel=None):
+        '''
+        Sets up and trains RNN, progress is called with the number of finished epochs.
+
+        Setting the threading.Event cancel raises progress_channel.Cancelled after the current batch.
+        '''
+        if config.MODEL_SELECTION and (self.training_set is not None or self.dataset is not None):
+            self.run_model_selection(progress, cancel)
+            return
+
+        if self.dataset is not None:
+            self.X_train, self.X_test, self.y_train, self.y_test = self.load_mapped()
+            # batches are copied out of the mapped pages, fit would copy the whole arrays
+            train_batches = MappedBatches(self.X_train, self.y_train, seed=42)
+            test_batches = MappedBatches(self.X_test, self.y_test, shuffle=False)
+            samples_per_epoch = len(self.X_train)
+            training_data = dict(x=iter(train_batches), steps_per_epoch=len(train_batches),
+                                 validation_data=iter(test_batches),
+                                 validation_steps=len(test_batches))
+        elif self.training_set is not None and bucketed_batching():
+            self.train_batches, self.test_batches = self.load_buckets()
+            samples_per_epoch = len(self.train_batches.sequences)
+            training_data = dict(x=iter(self.train_batches),
+                                 steps_per_epoch=len(self.train_batches),
+                                 validation_data=iter(self.test_batches),
+                                 validation_steps=len(self.test_batches))
+        elif self.training_set is not None:
+            self.X_train, self.X_test, self.y_train, self.y_test = self.load_data()
+            samples_per_epoch = len(self.X_train)
+            training_data = dict(x=self.X_train, y=self.y_train,
+                                 batch_size=config.BATCH_SIZE,
+                                 validation_data=(self.X_test, self.y_test))
+        else:
+            self.stream = self.load_stream()
+            samples_per_epoch = self.stream.steps_per_epoch * self.stream.batch_size
+            self.X_test, self.y_test = self.stream.validation_data()
+            training_data = dict(x=iter(self.stream),
+                                 steps_per_epoch=self.stream.steps_per_epoch,
+                                 validation_data=(self.X_test, self.y_test))
+            self.stream.start()
+
+        # Train the model
+        start = time.perf_counter()
+        try:
+            raise_if_cancelled(cancel)
+            model = build_model(len(set(self.labels)))
+            reduce_lr, stop_early = training_callbacks()
+            history = model.fit(
+                epochs=config.MAX_EPOCHS,
+                verbose=1,
+                callbacks=[reduce_lr, stop_early, EpochTimer(samples_per_epoch),
+                           TrainingCallback(progress=progress, cancel=cancel)],
+                **training_data
+            )
+        finally:
+            if self.stream is not None:
+                self.stream.stop()
+
+        self.finish_training(model, history.history, time.perf_counter() - start)
+
+    def run_model_selection(self, progress=None, cancel=None):
+        '''
+        Trains all candidate architectures in parallel processes and keeps the best one.
+        '''
+        self.X_train, self.X_test, self.y_train, self.y_test = self.load_data()
+        start = time.perf_counter()
+        with tempfile.TemporaryDirectory() as directory:
+            best, _ = select_model(
+                self.X_train, self.y_train, self.X_test, self.y_test, self.encoder.classes_,
+                directory, progress=None if progress is None else lambda done, total: progress(
+                    round(done / total * config.MAX_EPOCHS)), cancel=cancel)
+            model = load_model(best['path'])
+        self.finish_training(model, best['history'], time.perf_counter() - start)
+
+    def finish_training(self, model, history, training_seconds):
+        '''
+        Stores trained model and prepares prediction backend.
+        '''
+        self.training_seconds = training_seconds
+        self.history = history
+        self.model = model
+        if config.PREDICTION_BACKEND == 'numpy':
+            self.numpy_predictor = NumpyPredictor(
+                export_weights(model, self.encoder.classes_))
+        elif config.PREDICTION_BACKEND == 'tflite':
+            self.tflite_predictor, self.tflite_report = export_tflite(
+                model, self.encoder.classes_, calibration=self.calibration_data(),
+                test_data=self.held_out_data())
+            print_report(self.tflite_report)
+
+    def calibration_data(self):
+        '''
+        Returns at most config.TFLITE_CALIBRATION_SAMPLES augmented training samples.
+
+        Streamed batches are gone after training, the fixed validation set is used instead.
+        '''
+        if hasattr(self, 'X_train'):
+            return np.asarray(self.X_train[:config.TFLITE_CALIBRATION_SAMPLES])
+        if hasattr(self, 'train_batches'):
+            return to_batch(self.train_batches.sequences[:config.TFLITE_CALIBRATION_SAMPLES])
+        X_test = getattr(self, 'X_test', None)
+        return None if X_test is None else np.asarray(X_test[:config.TFLITE_CALIBRATION_SAMPLES])
+
+    def held_out_data(self):
+        '''
+        Returns (X, y) of the validation split, unless it is bucketed.
+        '''
+        if hasattr(self, 'X_test'):
+            return self.X_test, self.y_test
+        return None
+
+    def save(self, directory):
+        '''
+        Saves trained model, label classes, NumPy weights and training metadata into directory.
+        '''
+        self.model.save(os.path.join(directory, 'model.keras'))
+        np.save(os.path.join(directory, 'classes.npy'), self.encoder.classes_)
+        self.export(os.path.join(directory, 'weights.npz'))
+        if self.tflite_predictor is not None:
+            self.tflite_predictor.save(os.path.join(directory, 'model.tflite'))
+        metadata = {
+            'labels': [str(label) for label in self.encoder.classes_],
+            'augmentation_chain': self.augmentation_chain,
+            'training_seconds': self.training_seconds,
+            'history': {key: [float(v) for v in values] for key, values in self.history.items()},
+        }
+        if self.tflite_report is not None:
+            metadata['tflite'] = self.tflite_report
+        with open(os.path.join(directory, 'metadata.json'), 'w') as f:
+            json.dump(metadata, f, indent=2)
+
+    @classmethod
+    def load(cls, directory):
+        '''
+        Creates Recognizer from directory written by save.
+
+        The Keras model is only loaded if predictions do not run in NumPy or TFLite.
+        '''
+        predictor = cls()
+        predictor.encoder = LabelEncoder()
+        predictor.encoder.classes_ = np.load(os.path.join(directory, 'classes.npy'))
+        predictor.labels = list(predictor.encoder.classes_)
+        tflite_path = os.path.join(directory, 'model.tflite')
+        if config.PREDICTION_BACKEND == 'numpy':
+            predictor.numpy_predictor = NumpyPredictor.load(
+                os.path.join(directory, 'weights.npz'))
+        elif config.PREDICTION_BACKEND == 'tflite' and os.path.exists(tflite_path):
+            predictor.tflite_predictor = TFLitePredictor.load(
+                tflite_path, predictor.encoder.classes_)
+        else:
+            predictor.model = load_model(os.path.join(directory, 'model.keras'))
+        return predictor
+
+    def export(self, path):
+        '''
+        Saves weights and labels of trained model to .npz file for NumPy-only inference.
+        '''
+        export_model(self.model, self.encoder.classes_, path)
+
+    def predict_batch(self, sequences):
+        '''
+        Returns class probabilities for list of sequences, in the order of self.encoder.classes_.
+        '''
+        X = to_batch(sequences)
+        if self.numpy_predictor is not None:
+            return self.numpy_predictor.forward(X)
+        if self.tflite_predictor is not None:
+            return self.tflite_predictor.forward(X)
+        return self.model.predict(X, batch_size=config.BATCH_SIZE, verbose=0)
+
+    def predict_gesture(self, gesture):
+        '''
+        Predicts input gesture and returns label and confidence.
+        '''
+        if self.numpy_predictor is not None:
+            return self.numpy_predictor.predict_gesture(gesture)
+        if self.tflite_predictor is not None:
+            return self.tflite_predictor.predict_gesture(gesture)
+        with span('keras', 'prediction'):
+            prediction = self.model.predict(to_batch([gesture]), verbose=0)
+        prediction_index = np.argmax(prediction)
+        prediction_label = self.encoder.inverse_transform(
+            np.array([prediction_index]))[0]
+        confidence = prediction[0][prediction_index]
+        return confidence, prediction_label
+
+
+def lstm96(n_classes):
+    '''
+    LSTM(96) -> Dense(64) -> Dense(32) -> softmax, the model of the application.
+    '''
+    # add LSTM layer
+    # input shape is (length of an individual sample, dimensions of the sample)
+    # in our case: two dimensions, as we have X and Y coordinates
+    return [LSTM(96),
+            # add dense layer to do machine learning magic
+            Dense(64, activation='relu'),
+            Dense(32, activation='relu'),
+            # softmax layer for classification
+            Dense(n_classes, activation='softmax')]
+
+
+def lstm64(n_classes):
+    '''
+    Smaller and faster variant of lstm96.
+    '''
+    return [LSTM(64),
+            Dense(32, activation='relu'),
+            Dense(n_classes, activation='softmax')]
+
+
+def lstm96_dropout(n_classes):
+    '''
+    lstm96 with dropout against overfitting to the augmented templates.
+    '''
+    return [LSTM(96),
+            Dropout(.3),
+            Dense(64, activation='relu'),
+            Dense(32, activation='relu'),
+            Dense(n_classes, activation='softmax')]
+
+
+def gru96(n_classes):
+    '''
+    lstm96 with GRU instead of LSTM layer.
+    '''
+    return [GRU(96),
+            Dense(64, activation='relu'),
+            Dense(32, activation='relu'),
+            Dense(n_classes, activation='softmax')]
+
+
+def gru96_batchnorm(n_classes):
+    '''
+    Model proposed in Maslych et al.(2023), see model_demo.ipynb.
+    '''
+    return [GRU(96, dropout=0.03),
+            BatchNormalization(),
+            Dropout(.3),
+            Dense(64),
+            BatchNormalization(),
+            Dropout(.3),
+            Dense(32),
+            BatchNormalization(),
+            Dropout(.25),
+            Dense(n_classes, activation='softmax')]
+
+
+ARCHITECTURES = {
+    'lstm96': lstm96,
+    'lstm64': lstm64,
+    'lstm96_dropout': lstm96_dropout,
+    'gru96': gru96,
+    'gru96_batchnorm': gru96_batchnorm,
+}
+
+
+def build_model(n_classes, architecture=None):
+    '''
+    Creates and compiles Sequential model with the layers of architecture, which defaults to
+    config.MODEL_ARCHITECTURE.
+    '''
+    architecture = architecture or config.MODEL_ARCHITECTURE
+    model = Sequential()
+
+    # resampled sequences have a static shape, so the model is built for it right away
+    if config.FIXED_LENGTH_FEATURES:
+        model.add(Input(shape=(config.SEQUENCE_LENGTH, 2)))
+
+    # padded time steps are skipped by the RNN, zero would also skip drawn points at the origin
+    if bucketed_batching():
+        model.add(Masking(mask_value=PADDING_VALUE))
+
+    for layer in ARCHITECTURES[architecture](n_classes):
+        model.add(layer)
+
+    # Compile the model, labels are class indices
+    model.compile(loss='sparse_categorical_crossentropy',
+                  optimizer='adam', metrics=['accuracy'])
+    return model
+
+
+def training_callbacks():
+    '''
+    Returns learning rate reduction and early stopping callbacks.
+    '''
+    reduce_lr = ReduceLROnPlateau(
+        monitor='val_loss', factor=0.2, patience=2, min_lr=0.001)
+    stop_early = EarlyStopping(monitor='val_loss', patience=3)
+    return reduce_lr, stop_early
+
+
+def release_memory():
+    '''
+    Frees models and data of a cancelled training.
+    '''
+    clear_session()
+    gc.collect()
+
+
+def warm_up():
+    '''
+    Runs a tiny LSTM once, so that TensorFlow initializes its runtime before the first training.
+    '''
+    model = Sequential([Input(shape=(2, 2)), LSTM(4), Dense(2, activation='softmax')])
+    model.compile(loss='sparse_categorical_crossentropy', optimizer='adam')
+    model.predict(np.zeros((1, 2, 2), dtype='float32'), verbose=0)
+
+
+class TrainingCallback(Callback):
+    '''
+    Helper class to report training progress to a plain callback and to stop cancelled training.
+    '''
+
+    def __init__(self, progress=None, cancel=None):
+        super().__init__()
+        self.progress = progress
+        self.cancel = cancel
+
+    def on_train_batch_end(self, batch, logs=None):
+        # raising stops fit right away, setting model.stop_training would still run validation
+        raise_if_cancelled(self.cancel)
+
+    def on_test_batch_end(self, batch, logs=None):
+        raise_if_cancelled(self.cancel)
+
+    def on_epoch_end(self, epoch, logs=None):
+        '''
+        Calls progress whenever epoch in training is passed.
+        '''
+        if self.progress is not None:
+            self.progress(epoch+1)
+
+
+class EpochTimer(Callback):
+    '''
+    Prints wall time of every training epoch and records it as span.
+    '''
+
+    def __init__(self, samples_per_epoch) -> None:
+        super().__init__()
+        self.samples_per_epoch = samples_per_epoch
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.start = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        end = time.perf_counter()
+        samples_per_second = self.samples_per_epoch / (end - self.start)
+        print(f'Epoch {epoch + 1} took {end - self.start:.2f}s ({samples_per_second:.0f} samples/s)')
+        if config.TRACING_ENABLED:
+            tracer.record('epoch', 'training', self.start, end,
+                          {'epoch': epoch + 1, 'samples_per_second': samples_per_second})
@@ -0,0 +1,138 @@
+'''
+This module stores drawn points and their timestamps in growable float32 arrays.
+
+Mouse and pen devices report points at their polling rate, 100 to 1000 times per second. A point
+closer than config.STROKE_MIN_DISTANCE to the last kept point is dropped as it arrives, so the
+number of stored points depends on the length of the gesture, not on the device. With
+config.STROKE_SIMPLIFY_TOLERANCE, a finished stroke is further simplified with Douglas-Peucker,
+which removes points on nearly straight parts of it. Points kept while drawing are never removed
+before the stroke ends, so they can be handed on as they arrive.
+
+points and timestamps are views of the arrays, they are handed on without copying.
+'''
+import time
+
+import config
+import numpy as np
+
+
+def douglas_peucker(points, tolerance):
+    '''
+    Returns boolean mask of the points Douglas-Peucker keeps with tolerance, end points included.
+    '''
+    keep = np.zeros(len(points), dtype=bool)
+    keep[[0, -1]] = True
+    ranges = [(0, len(points) - 1)]
+    while ranges:
+        first, last = ranges.pop()
+        if last - first < 2:
+            continue
+        start = points[first]
+        chord = points[last] - start
+        offsets = points[first + 1:last] - start
+        length = np.hypot(*chord)
+        if length > 0:
+            distances = np.abs(chord[0] * offsets[:, 1] - chord[1] * offsets[:, 0]) / length
+        else:
+            distances = np.hypot(offsets[:, 0], offsets[:, 1])
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            index = first + 1 + farthest
+            keep[index] = True
+            ranges.extend([(first, index), (index, last)])
+    return keep
+
+
+class StrokeBuffer:
+
+    def __init__(self, min_distance=None, simplify_tolerance=None, capacity=256) -> None:
+        self.min_distance = config.STROKE_MIN_DISTANCE if min_distance is None else min_distance
+        self.simplify_tolerance = config.STROKE_SIMPLIFY_TOLERANCE \
+            if simplify_tolerance is None else simplify_tolerance
+        self.xy = np.empty((capacity, 2), dtype='float32')
+        # seconds since the first point, float32 stays below a millisecond for the first hour
+        self.t = np.empty(capacity, dtype='float32')
+        self.size = 0
+        self.start_time = None
+        # index of the first point of the current stroke
+        self.stroke_start = 0
+        self.last_dropped = None
+        self.received = 0
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def points(self):
+        return self.xy[:self.size]
+
+    @property
+    def timestamps(self):
+        return self.t[:self.size]
+
+    def grow(self):
+        capacity = 2 * len(self.xy)
+        xy = np.empty((capacity, 2), dtype='float32')
+        t = np.empty(capacity, dtype='float32')
+        xy[:self.size] = self.xy[:self.size]
+        t[:self.size] = self.t[:self.size]
+        self.xy, self.t = xy, t
+
+    def append(self, x, y, timestamp=None):
+        '''
+        Adds point drawn at timestamp (time.perf_counter seconds) and returns whether it was kept.
+
+        A kept point stays in the buffer until end_stroke simplifies the stroke.
+        '''
+        if timestamp is None:
+            timestamp = time.perf_counter()
+        if self.start_time is None:
+            self.start_time = timestamp
+        self.received += 1
+        if self.size > self.stroke_start and self.min_distance > 0:
+            last_x, last_y = self.xy[self.size - 1]
+            if (x - last_x) ** 2 + (y - last_y) ** 2 < self.min_distance ** 2:
+                self.last_dropped = (x, y, timestamp)
+                return False
+
+        self.store(x, y, timestamp)
+        return True
+
+    def store(self, x, y, timestamp):
+        if self.size == len(self.xy):
+            self.grow()
+        self.xy[self.size] = x, y
+        self.t[self.size] = timestamp - self.start_time
+        self.size += 1
+        self.last_dropped = None
+
+    def simplify(self):
+        '''
+        Runs Douglas-Peucker over the points of the current stroke and compacts them.
+        '''
+        first = self.stroke_start
+        keep = douglas_peucker(self.xy[first:self.size], self.simplify_tolerance)
+        n_kept = int(keep.sum())
+        self.xy[first:first + n_kept] = self.xy[first:self.size][keep]
+        self.t[first:first + n_kept] = self.t[first:self.size][keep]
+        self.size = first + n_kept
+
+    def end_stroke(self):
+        '''
+        Keeps the end point of a stroke and simplifies it, the next point starts a new stroke.
+        '''
+        if self.last_dropped is not None:
+            self.store(*self.last_dropped)
+        if self.simplify_tolerance > 0 and self.size - self.stroke_start > 2:
+            self.simplify()
+        self.stroke_start = self.size
+
+    def statistics(self):
+        '''
+        Returns number of received and kept points and the duration in seconds.
+        '''
+        return {
+            'received': self.received,
+            'kept': self.size,
+            'seconds': float(self.t[self.size - 1]) if self.size else 0.0,
+        }
@@ -0,0 +1,264 @@
+'''
+This module replicates the augmentation experiments of Maslych et al.(2023) over chains, numbers of
+augmented samples and seeds.
+
+Every combination is one job: the training templates are augmented, a model is trained and its
+accuracy and single gesture latency are measured on held-out gestures. Jobs run in a spawned
+process pool with a capped number of threads each (model_selection.init_worker). Every finished job
+is stored in an SQLite database right away, keyed by the experiment (gestures and training config)
+and its parameters, so that an interrupted sweep skips finished jobs when it is started again.
+
+Like in the paper, the seed also chooses which samples of every gesture are training templates,
+the remaining ones are the test set. If no samples are left, augmented variants of the templates
+with a different seed are the test set instead.
+'''
+import contextlib
+import io
+import multiprocessing
+import sqlite3
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import config
+import numpy as np
+from augmentation_engine import augment_gestures
+from cache import TRAINING_CONFIG, fingerprint
+from model_selection import init_worker, median_latency_ms
+
+# config constants of an experiment, samples and seed are parameters of its jobs
+EXPERIMENT_CONFIG = tuple(key for key in TRAINING_CONFIG
+                          if key not in ('NUMBER_OF_SAMPLES', 'AUGMENTATION_SEED')) + \
+    ('PREDICTION_BACKEND',)
+
+
+def split_templates(gestures, templates, seed, test_chain, test_samples):
+    '''
+    Returns templates per label chosen by seed and the test set of [label, points] gestures.
+    '''
+    rng = np.random.default_rng(seed)
+    train, test = [], []
+    for label in dict.fromkeys(label for label, _ in gestures):
+        samples = [gesture for gesture in gestures if gesture[0] == label]
+        chosen = set(rng.permutation(len(samples))[:templates].tolist())
+        train += [samples[i] for i in sorted(chosen)]
+        test += [samples[i] for i in range(len(samples)) if i not in chosen]
+    if not test:
+        # a seed no job trains with
+        test = augment_gestures(train, test_chain, n_samples=test_samples, seed=seed + 10**6,
+                                workers=1)
+    return train, test
+
+
+def run_job(task):
+    '''
+    Augments templates, trains a model and returns its measurements. Runs in a worker process.
+    '''
+    import tensorflow as tf
+    from recognizer import Recognizer
+
+    chain, n_samples, seed, train_gestures, test_set = task
+    # a job is already one process of the pool
+    config.MODEL_SELECTION = False
+    # the seed also initializes the weights, so that a job gives the same result when it runs again
+    tf.keras.utils.set_random_seed(seed)
+    start = time.perf_counter()
+    training_set = augment_gestures(train_gestures, chain, n_samples=n_samples, seed=seed,
+                                    workers=1)
+    augmentation_seconds = time.perf_counter() - start
+
+    recognizer = Recognizer(training_set=training_set, augmentation_chain=chain)
+    # the progress bars of parallel jobs would interleave
+    with contextlib.redirect_stdout(io.StringIO()):
+        recognizer.train()
+
+    labels = np.array([str(label) for label, _ in test_set])
+    sequences = [sequence for _, sequence in test_set]
+    probabilities = recognizer.predict_batch(sequences)
+    predicted = np.asarray(recognizer.encoder.classes_)[np.argmax(probabilities, axis=1)]
+    return {
+        'accuracy': float(np.mean(predicted.astype(str) == labels)),
+        'test_samples': len(test_set),
+        'augmentation_seconds': augmentation_seconds,
+        'training_seconds': recognizer.training_seconds,
+        'epochs': len(recognizer.history['loss']),
+        'latency_ms': median_latency_ms(recognizer.predict_gesture, sequences[0]),
+    }
+
+
+class ResultStore:
+    '''
+    SQLite table of finished jobs.
+    '''
+    PARAMETERS = ('chain', 'samples', 'seed', 'templates')
+    MEASUREMENTS = ('accuracy', 'test_samples', 'augmentation_seconds', 'training_seconds',
+                    'epochs', 'latency_ms')
+
+    def __init__(self, path) -> None:
+        self.connection = sqlite3.connect(path)
+        with self.connection:
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS results (experiment TEXT, chain TEXT, samples INTEGER, '
+                'seed INTEGER, templates INTEGER, accuracy REAL, test_samples INTEGER, '
+                'augmentation_seconds REAL, training_seconds REAL, epochs INTEGER, '
+                'latency_ms REAL, finished REAL, '
+                'PRIMARY KEY (experiment, chain, samples, seed, templates))')
+
+    def finished(self, experiment):
+        '''
+        Returns set of (chain, samples, seed, templates) of the finished jobs of experiment.
+        '''
+        rows = self.connection.execute(
+            'SELECT chain, samples, seed, templates FROM results WHERE experiment = ?',
+            (experiment,))
+        return set(rows)
+
+    def add(self, experiment, parameters, result):
+        columns = ('experiment', *self.PARAMETERS, *self.MEASUREMENTS, 'finished')
+        values = (experiment, *parameters, *(result[key] for key in self.MEASUREMENTS),
+                  time.time())
+        with self.connection:
+            self.connection.execute(
+                f'INSERT OR REPLACE INTO results ({", ".join(columns)}) '
+                f'VALUES ({", ".join("?" * len(columns))})', values)
+
+    def results(self, experiment, templates):
+        '''
+        Returns finished jobs of experiment with templates per gesture as list of dicts.
+        '''
+        columns = (*self.PARAMETERS, *self.MEASUREMENTS)
+        rows = self.connection.execute(
+            f'SELECT {", ".join(columns)} FROM results WHERE experiment = ? AND templates = ? '
+            f'ORDER BY chain, samples, seed', (experiment, templates))
+        return [dict(zip(columns, row)) for row in rows]
+
+    def close(self):
+        self.connection.close()
+
+
+def run_sweep(gestures, chains, samples, seeds, database=None, templates=None, workers=None,
+              threads=None, test_chain=config.AugmentationPipelines.AVC.value, test_samples=None):
+    '''
+    Runs all jobs of chains x samples x seeds that are not in database yet.
+
+    Returns the experiment key and all of its results with the same number of templates.
+    The other arguments default to the SWEEP_ constants of config.py.
+    '''
+    database = database or config.SWEEP_DATABASE
+    templates = templates or config.SWEEP_TEMPLATES
+    workers = workers or config.SWEEP_WORKERS
+    threads = threads or config.SWEEP_THREADS
+    test_samples = test_samples or config.SWEEP_TEST_SAMPLES
+    experiment = fingerprint(gestures, 'sweep', EXPERIMENT_CONFIG)
+    store = ResultStore(database)
+    finished = store.finished(experiment)
+    jobs = [(chain, n_samples, seed, templates)
+            for chain in chains for n_samples in samples for seed in seeds
+            if (chain, n_samples, seed, templates) not in finished]
+    print(f'Experiment {experiment[:12]}: {len(finished)} jobs finished before, '
+          f'{len(jobs)} to run')
+
+    # spawned workers import config from scratch, changes made at runtime are passed on explicitly
+    settings = {key: getattr(config, key) for key in dir(config) if key.isupper()}
+    context = multiprocessing.get_context('spawn')
+    failed = 0
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_worker,
+                                 initargs=(threads, settings)) as executor:
+            pending = {}
+            for job in jobs:
+                chain, n_samples, seed, _ = job
+                train, test = split_templates(gestures, templates, seed, test_chain, test_samples)
+                pending[executor.submit(run_job, (chain, n_samples, seed, train, test))] = job
+            try:
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        job = pending.pop(future)
+                        try:
+                            result = future.result()
+                        except Exception as error:
+                            failed += 1
+                            print(f'{format_job(job)} failed: {error!r}')
+                            continue
+                        store.add(experiment, job, result)
+                        print(f'[{len(jobs) - len(pending)}/{len(jobs)}] {format_job(job)}: '
+                              f'accuracy {result["accuracy"]:.3f}, '
+                              f'trained in {result["training_seconds"]:.1f}s')
+            except BaseException:
+                # jobs that finished before the interrupt or while running jobs are waited for
+                # are stored too, so that resuming skips them
+                store_finished(store, experiment, pending)
+                started = sum(future.running() for future in pending)
+                print(f'Waiting for {started} jobs that already started')
+                executor.shutdown(cancel_futures=True)
+                store_finished(store, experiment, pending)
+                raise
+        if failed:
+            print(f'{failed} jobs failed, they run again when the sweep is resumed')
+        return experiment, store.results(experiment, templates)
+    finally:
+        store.close()
+
+
+def store_finished(store, experiment, pending):
+    '''
+    Stores results of the successful futures of pending and removes all finished ones from it.
+    '''
+    for future in [future for future in pending if future.done()]:
+        job = pending.pop(future)
+        if not future.cancelled() and future.exception() is None:
+            store.add(experiment, job, future.result())
+
+
+def format_job(job):
+    chain, n_samples, seed, templates = job
+    return f'{chain} {n_samples} samples seed {seed} ({templates} templates)'
+
+
+def summarize(results):
+    '''
+    Returns one row per chain and number of samples with mean and standard deviation over seeds.
+    '''
+    groups = {}
+    for result in results:
+        groups.setdefault((result['chain'], result['samples'], result['templates']), []) \
+            .append(result)
+    rows = []
+    for (chain, n_samples, templates), group in groups.items():
+        accuracy = np.array([result['accuracy'] for result in group])
+        rows.append({
+            'chain': chain,
+            'samples': n_samples,
+            'templates': templates,
+            'runs': len(group),
+            'accuracy_mean': float(accuracy.mean()),
+            'accuracy_std': float(accuracy.std()),
+            'training_seconds': float(np.mean([result['training_seconds'] for result in group])),
+            'latency_ms': float(np.median([result['latency_ms'] for result in group])),
+        })
+    return rows
+
+
+def print_summary(rows):
+    '''
+    Prints accuracy in percent per chain (rows) and number of samples (columns) like the paper,
+    followed by training time and latency of every cell.
+    '''
+    chains = list(dict.fromkeys(row['chain'] for row in rows))
+    samples = sorted({row['samples'] for row in rows})
+    cells = {(row['chain'], row['samples']): row for row in rows}
+
+    print(f'{"accuracy %":<16}' + ''.join(f'{n_samples:>14}' for n_samples in samples))
+    for chain in chains:
+        line = f'{chain:<16}'
+        for n_samples in samples:
+            row = cells.get((chain, n_samples))
+            line += f'{"-":>14}' if row is None else \
+                f'{100 * row["accuracy_mean"]:>8.1f} ±{100 * row["accuracy_std"]:>4.1f}'
+        print(line)
+
+    print()
+    print(f'{"chain":<16}{"samples":>8}{"runs":>6}{"train s":>10}{"latency ms":>12}')
+    for row in rows:
+        print(f'{row["chain"]:<16}{row["samples"]:>8}{row["runs"]:>6}'
+              f'{row["training_seconds"]:>10.1f}{row["latency_ms"]:>12.3f}')
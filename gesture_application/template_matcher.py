@@ -0,0 +1,110 @@
+'''
+This module recognizes gestures by comparing them with the recorded templates, without training.
+
+Every template and every drawn gesture is resampled to config.TEMPLATE_MATCHING_POINTS points,
+moved to its centroid and scaled to unit size (features.py), like in the $-family of recognizers.
+The distance between two gestures is the mean distance between their corresponding points.
+
+The distances to all templates are computed as one array operation. For large template sets,
+a lower bound of every distance follows from the triangle inequality and the precomputed
+distances to a few pivot templates:
+    |d(gesture, pivot) - d(template, pivot)| <= d(gesture, template)
+The templates with the smallest lower bounds are compared first, afterwards all templates whose
+lower bound exceeds the best distance found so far are skipped.
+'''
+import config
+import numpy as np
+from features import resample_and_normalize
+from tracing import span
+
+# half diagonal of the unit square, distances of this size count as no match at all
+MAX_DISTANCE = np.sqrt(2) / 2
+# template sets up to this size are compared completely, larger ones use the lower bounds first
+BLOCK_SIZE = 256
+
+
+def mean_point_distance(templates, gesture):
+    '''
+    Returns mean distance between corresponding points of every template and gesture.
+    '''
+    return np.sqrt(((templates - gesture) ** 2).sum(axis=-1)).mean(axis=-1)
+
+
+class TemplateMatcher:
+
+    def __init__(self, gestures=(), n_points=None, n_pivots=None) -> None:
+        self.n_points = n_points or config.TEMPLATE_MATCHING_POINTS
+        self.n_pivots = n_pivots if n_pivots is not None else config.TEMPLATE_MATCHING_PIVOTS
+        self.labels = []
+        self.templates = np.empty((0, self.n_points, 2), dtype='float32')
+        self.pivots = np.empty((0, self.n_points, 2), dtype='float32')
+        self.pivot_distances = np.empty((0, 0), dtype='float32')
+        self.compared = 0
+        self.add_all(gestures)
+
+    def add(self, label, points):
+        '''
+        Adds one template, no other template is processed again.
+        '''
+        self.add_all([(label, points)])
+
+    def add_all(self, gestures):
+        '''
+        Adds list of (label, points) templates.
+        '''
+        gestures = list(gestures)
+        if not gestures:
+            return
+        new_templates = resample_and_normalize([points for _, points in gestures], self.n_points)
+        self.labels.extend(label for label, _ in gestures)
+        self.templates = np.concatenate([self.templates, new_templates])
+
+        # the first templates become pivots, existing templates only need distances to new pivots
+        n_new_pivots = min(self.n_pivots - len(self.pivots), len(new_templates))
+        if n_new_pivots > 0:
+            new_pivots = new_templates[:n_new_pivots]
+            self.pivots = np.concatenate([self.pivots, new_pivots])
+            existing = mean_point_distance(
+                self.templates[:-len(new_templates), np.newaxis], new_pivots)
+            self.pivot_distances = np.concatenate([self.pivot_distances, existing], axis=1)
+        self.pivot_distances = np.concatenate([
+            self.pivot_distances,
+            mean_point_distance(new_templates[:, np.newaxis], self.pivots)])
+
+    def nearest(self, gesture):
+        '''
+        Returns index of and distance to the template nearest to gesture.
+        '''
+        query = resample_and_normalize([gesture], self.n_points)[0]
+        if len(self.templates) <= BLOCK_SIZE:
+            distances = mean_point_distance(self.templates, query)
+            self.compared = len(distances)
+            index = int(np.argmin(distances))
+            return index, float(distances[index])
+
+        lower_bounds = np.abs(
+            self.pivot_distances - mean_point_distance(self.pivots, query)).max(axis=1)
+        # compare the templates with the smallest lower bounds first to get a good best distance
+        first = np.argpartition(lower_bounds, BLOCK_SIZE)[:BLOCK_SIZE]
+        distances = mean_point_distance(self.templates[first], query)
+        i = int(np.argmin(distances))
+        best_index, best_distance = int(first[i]), float(distances[i])
+
+        # only templates whose lower bound is below it can be nearer
+        lower_bounds[first] = np.inf
+        remaining = np.flatnonzero(lower_bounds < best_distance)
+        self.compared = len(first) + len(remaining)
+        if len(remaining):
+            distances = mean_point_distance(self.templates[remaining], query)
+            i = int(np.argmin(distances))
+            if distances[i] < best_distance:
+                best_index, best_distance = int(remaining[i]), float(distances[i])
+        return best_index, best_distance
+
+    def predict_gesture(self, gesture):
+        '''
+        Predicts input gesture and returns label and confidence.
+        '''
+        with span('template_matching', 'prediction'):
+            index, distance = self.nearest(gesture)
+        return max(0.0, 1 - distance / MAX_DISTANCE), self.labels[index]
@@ -0,0 +1,118 @@
+'''
+This module persists recorded gesture templates in a compact append-only format.
+
+A store directory contains three files:
+- points.f32: the points of all templates as one concatenated float32 buffer
+- labels.utf8: the UTF-8 encoded labels of all templates, concatenated
+- index.i64: one (offset, length, deleted, label_offset, label_length) int64 record per template
+
+The index is written last and locates points and label of every template, so anything an
+interrupted append wrote before it is never read, labels may contain any character.
+Loading memory-maps the point buffer and returns views into it, so no points are copied.
+'''
+import os
+import tempfile
+
+import numpy as np
+
+INDEX_DTYPE = np.dtype([('offset', '<i8'), ('length', '<i8'), ('deleted', '<i8'),
+                        ('label_offset', '<i8'), ('label_length', '<i8')])
+
+
+class TemplateStore:
+
+    def __init__(self, directory) -> None:
+        self.directory = directory
+        self.points_path = os.path.join(directory, 'points.f32')
+        self.index_path = os.path.join(directory, 'index.i64')
+        self.labels_path = os.path.join(directory, 'labels.utf8')
+        os.makedirs(directory, exist_ok=True)
+        for path in (self.points_path, self.index_path, self.labels_path):
+            open(path, 'ab').close()
+
+    def read_index(self):
+        '''
+        Returns all complete index records, a record cut off by an interrupted append is ignored.
+        '''
+        count = os.path.getsize(self.index_path) // INDEX_DTYPE.itemsize
+        return np.fromfile(self.index_path, dtype=INDEX_DTYPE, count=count)
+
+    def read_labels(self, index):
+        with open(self.labels_path, 'rb') as f:
+            data = f.read()
+        return [data[offset:offset + length].decode('utf-8')
+                for offset, length in zip(index['label_offset'].tolist(),
+                                          index['label_length'].tolist())]
+
+    def load(self):
+        '''
+        Returns list of (template_id, label, points) for all templates that are not deleted.
+
+        Stores with more deleted than remaining templates are compacted first.
+        '''
+        index = self.read_index()
+        if index['deleted'].sum() > len(index) / 2:
+            self.compact()
+            index = self.read_index()
+        if len(index) == 0:
+            return []
+
+        labels = self.read_labels(index)
+        n_points = int((index['offset'] + index['length']).max())
+        points = np.memmap(self.points_path, dtype='float32', mode='r', shape=(n_points, 2))
+        # plain ndarray views on the mapping are much cheaper to slice than memmap objects
+        points = points.view(np.ndarray)
+        return [(template_id, labels[template_id], points[offset:offset + length])
+                for template_id, (offset, length, deleted, _, _) in enumerate(index.tolist())
+                if not deleted]
+
+    def append(self, label, points):
+        '''
+        Appends template and returns its id.
+        '''
+        points = np.ascontiguousarray(points, dtype='float32')
+        encoded = label.encode('utf-8')
+        template_id = os.path.getsize(self.index_path) // INDEX_DTYPE.itemsize
+        with open(self.points_path, 'ab') as f:
+            offset = f.tell() // (2 * 4)
+            # whole points only, an interrupted append may have left part of one
+            f.seek(offset * 2 * 4)
+            f.truncate()
+            f.write(points.tobytes())
+        with open(self.labels_path, 'ab') as f:
+            label_offset = f.tell()
+            f.write(encoded)
+        with open(self.index_path, 'r+b') as f:
+            f.truncate(template_id * INDEX_DTYPE.itemsize)
+            f.seek(0, os.SEEK_END)
+            f.write(np.array([(offset, len(points), 0, label_offset, len(encoded))],
+                             dtype=INDEX_DTYPE).tobytes())
+        return template_id
+
+    def delete(self, template_id):
+        '''
+        Marks template as deleted without rewriting the store.
+        '''
+        with open(self.index_path, 'r+b') as f:
+            f.seek(template_id * INDEX_DTYPE.itemsize + INDEX_DTYPE.fields['deleted'][1])
+            f.write(np.array(1, dtype='<i8').tobytes())
+
+    def compact(self):
+        '''
+        Rewrites store without deleted templates. Changes template ids.
+
+        The new files replace the old ones by rename, so existing memory maps stay valid.
+        '''
+        index = self.read_index()
+        labels = self.read_labels(index)
+        points = np.fromfile(self.points_path, dtype='float32')
+        points = points[:len(points) // 2 * 2].reshape(-1, 2)
+        kept = [(labels[i], points[offset:offset + length])
+                for i, (offset, length, deleted, _, _) in enumerate(index.tolist()) if not deleted]
+        compacted = TemplateStore(tempfile.mkdtemp(dir=self.directory))
+        for label, template_points in kept:
+            compacted.append(label, template_points)
+        os.replace(compacted.points_path, self.points_path)
+        os.replace(compacted.labels_path, self.labels_path)
+        os.replace(compacted.index_path, self.index_path)
+        os.rmdir(compacted.directory)
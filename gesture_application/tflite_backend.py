@@ -0,0 +1,163 @@
+'''
+This module converts trained Keras models to TensorFlow Lite and predicts with its interpreter.
+
+The model is converted for one gesture of config.SEQUENCE_LENGTH points, the static shape lets
+the converter fuse the recurrent layer into a single TFLite op. config.TFLITE_QUANTIZATION:
+    "none"     float32 weights
+    "dynamic"  int8 weights, activations are quantized on the fly
+    "int8"     int8 weights and activations, ranges calibrated on augmented training samples
+Inputs and outputs stay float32 in all cases. Prediction only needs the interpreter, which is
+taken from the small tflite_runtime package if it is installed.
+'''
+import time
+
+import config
+import numpy as np
+from features import to_batch
+from model_selection import median_latency_ms
+from tracing import span
+
+try:
+    from tflite_runtime.interpreter import Interpreter
+except ImportError:
+    Interpreter = None
+
+
+def convert(keras_model, quantization=None, calibration=None):
+    '''
+    Returns keras_model as TFLite flatbuffer, calibration is a batch of training samples for "int8".
+
+    quantization defaults to config.TFLITE_QUANTIZATION.
+    '''
+    import tensorflow as tf
+
+    quantization = quantization or config.TFLITE_QUANTIZATION
+
+    if not config.FIXED_LENGTH_FEATURES:
+        raise ValueError('TFLite export needs FIXED_LENGTH_FEATURES')
+
+    @tf.function(input_signature=[tf.TensorSpec([1, config.SEQUENCE_LENGTH, 2], tf.float32)])
+    def predict(x):
+        return keras_model(x, training=False)
+
+    converter = tf.lite.TFLiteConverter.from_concrete_functions(
+        [predict.get_concrete_function()], keras_model)
+    if quantization == 'dynamic':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        # the newer quantizer keeps the small input kernels of LSTM layers in float32,
+        # which the fused LSTM op rejects next to int8 recurrent kernels
+        converter.experimental_new_dynamic_range_quantizer = False
+    elif quantization == 'int8':
+        if calibration is None or len(calibration) == 0:
+            raise ValueError('int8 quantization needs calibration samples')
+        samples = np.asarray(calibration[:config.TFLITE_CALIBRATION_SAMPLES], dtype='float32')
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = lambda: ([sample[np.newaxis]] for sample in samples)
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    elif quantization != 'none':
+        raise ValueError(f'Unknown TFLite quantization {quantization}')
+    with span('tflite_conversion', 'export', quantization=quantization):
+        return converter.convert()
+
+
+class TFLitePredictor:
+    '''
+    Predicts with a converted model in the TFLite interpreter.
+    '''
+
+    def __init__(self, model_content, classes, threads=None) -> None:
+        threads = threads or config.TFLITE_THREADS
+        self.model_content = model_content
+        self.classes = np.asarray(classes)
+        if Interpreter is None:
+            import tensorflow as tf
+            interpreter = tf.lite.Interpreter
+        else:
+            interpreter = Interpreter
+        self.interpreter = interpreter(model_content=model_content, num_threads=threads)
+        self.interpreter.allocate_tensors()
+        self.input_index = self.interpreter.get_input_details()[0]['index']
+        self.output_index = self.interpreter.get_output_details()[0]['index']
+
+    @classmethod
+    def load(cls, path, classes):
+        with open(path, 'rb') as f:
+            return cls(f.read(), classes)
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.model_content)
+
+    @property
+    def size_bytes(self):
+        return len(self.model_content)
+
+    def forward(self, X):
+        '''
+        Returns class probabilities for batch X of shape (batch, SEQUENCE_LENGTH, 2).
+
+        The converted model takes one gesture, so the batch is run gesture by gesture.
+        '''
+        X = np.asarray(X, dtype='float32')
+        probabilities = np.empty((len(X), len(self.classes)), dtype='float32')
+        for i in range(len(X)):
+            self.interpreter.set_tensor(self.input_index, X[i:i + 1])
+            self.interpreter.invoke()
+            probabilities[i] = self.interpreter.get_tensor(self.output_index)[0]
+        return probabilities
+
+    def predict_gesture(self, gesture):
+        '''
+        Predicts input gesture and returns label and confidence.
+        '''
+        with span('tflite', 'prediction'):
+            probabilities = self.forward(to_batch([gesture]))[0]
+        index = int(np.argmax(probabilities))
+        return probabilities[index], self.classes[index]
+
+
+def export(keras_model, classes, quantization=None, calibration=None, test_data=None):
+    '''
+    Converts keras_model with quantization (config.TFLITE_QUANTIZATION) and compares it with the
+    Keras model.
+
+    Returns the TFLitePredictor and a report of model size, accuracy on test_data (X, y) and
+    single gesture latency. y holds one-hot rows or class indices.
+    '''
+    quantization = quantization or config.TFLITE_QUANTIZATION
+    start = time.perf_counter()
+    predictor = TFLitePredictor(convert(keras_model, quantization, calibration), classes)
+    float32_bytes = sum(np.asarray(weights).size * 4 for weights in keras_model.get_weights())
+    report = {
+        'quantization': quantization,
+        'conversion_seconds': time.perf_counter() - start,
+        'tflite_bytes': predictor.size_bytes,
+        'float32_weight_bytes': float32_bytes,
+        'size_ratio': predictor.size_bytes / float32_bytes,
+    }
+    if test_data is None:
+        return predictor, report
+
+    X_test, y_test = test_data
+    expected = y_test if np.ndim(y_test) == 1 else np.argmax(y_test, axis=1)
+    keras_predictions = keras_model.predict(X_test, batch_size=config.BATCH_SIZE, verbose=0)
+    report['keras_accuracy'] = float(np.mean(np.argmax(keras_predictions, axis=1) == expected))
+    tflite_predictions = predictor.forward(X_test)
+    report['tflite_accuracy'] = float(np.mean(np.argmax(tflite_predictions, axis=1) == expected))
+    report['accuracy_delta'] = report['tflite_accuracy'] - report['keras_accuracy']
+
+    single_gesture = np.asarray(X_test[:1], dtype='float32')
+    report['keras_latency_ms'] = median_latency_ms(
+        lambda x: keras_model(x, training=False), single_gesture)
+    report['tflite_latency_ms'] = median_latency_ms(predictor.forward, single_gesture)
+    report['speedup'] = report['keras_latency_ms'] / report['tflite_latency_ms']
+    return predictor, report
+
+
+def print_report(report):
+    print(f'TFLite ({report["quantization"]}): {report["tflite_bytes"] / 1024:.0f}KB, '
+          f'{100 * report["size_ratio"]:.0f}% of the float32 weights')
+    if 'accuracy_delta' in report:
+        print(f'Accuracy {report["tflite_accuracy"]:.3f} vs Keras {report["keras_accuracy"]:.3f} '
+              f'({report["accuracy_delta"]:+.3f}), latency {report["tflite_latency_ms"]:.2f}ms '
+              f'vs Keras {report["keras_latency_ms"]:.2f}ms ({report["speedup"]:.1f}x)')
@@ -0,0 +1,156 @@
+'''
+This module records timing spans of the hot paths and exports them in the Chrome trace format.
+
+Spans are only recorded with config.TRACING_ENABLED. Otherwise span returns one shared context
+manager that does nothing, so disabled tracing costs one flag check per span. Keyword arguments of
+span are still packed into a dict by the call, hot paths pass none. The latest
+config.TRACE_MAX_EVENTS spans are kept, older ones are dropped.
+Exported files can be opened with chrome://tracing or https://ui.perfetto.dev.
+PeakMemory measures the memory allocated by Python and NumPy inside a block with tracemalloc.
+'''
+import contextlib
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+
+import config
+
+NULL_SPAN = contextlib.nullcontext()
+
+
+class Tracer:
+    '''
+    Collects complete events (name, category, start, duration, process, thread, args).
+    '''
+
+    def __init__(self) -> None:
+        self.events = deque()
+        self.lock = threading.Lock()
+        self.dropped = 0
+
+    def record(self, name, category, start, end, args=None):
+        '''
+        Adds span from start to end in time.perf_counter seconds.
+        '''
+        event = (name, category, start, end - start, os.getpid(), threading.get_ident(), args)
+        with self.lock:
+            self.events.append(event)
+            self.drop_oldest()
+
+    def extend(self, events):
+        '''
+        Adds events recorded in another process, time.perf_counter is system-wide on Linux.
+        '''
+        with self.lock:
+            self.events.extend(events)
+            self.drop_oldest()
+
+    def drop_oldest(self):
+        # called with the lock held
+        while len(self.events) > config.TRACE_MAX_EVENTS:
+            self.events.popleft()
+            self.dropped += 1
+
+    def drain(self):
+        '''
+        Returns all events as list and removes them from the tracer.
+        '''
+        with self.lock:
+            events, self.events = self.events, deque()
+        return list(events)
+
+    def totals(self):
+        '''
+        Returns {'category/name': (count, seconds)} of the kept events sorted by seconds, highest
+        first.
+        '''
+        with self.lock:
+            events = list(self.events)
+        totals = {}
+        for name, category, _, duration, _, _, _ in events:
+            key = f'{category}/{name}'
+            count, seconds = totals.get(key, (0, 0.0))
+            totals[key] = (count + 1, seconds + duration)
+        return dict(sorted(totals.items(), key=lambda item: -item[1][1]))
+
+    def export(self, path):
+        '''
+        Writes all events as Chrome trace JSON with timestamps in microseconds.
+        '''
+        with self.lock:
+            events = list(self.events)
+        origin = min((event[2] for event in events), default=0)
+        trace_events = [{
+            'name': name, 'cat': category, 'ph': 'X',
+            'ts': (start - origin) * 1e6, 'dur': duration * 1e6,
+            'pid': pid, 'tid': tid, 'args': args or {},
+        } for name, category, start, duration, pid, tid, args in events]
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': trace_events, 'displayTimeUnit': 'ms'}, f)
+
+
+class Span:
+    __slots__ = ('name', 'category', 'args', 'start')
+
+    def __init__(self, name, category, args) -> None:
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        tracer.record(self.name, self.category, self.start, time.perf_counter(), self.args)
+
+
+class PeakMemory:
+    '''
+    Context manager that stores the peak of memory allocated inside it in peak_bytes.
+
+    It must not be nested: entering resets the peak of tracemalloc, which an enclosing PeakMemory
+    would then report too low.
+    '''
+
+    def __enter__(self):
+        self.started = not tracemalloc.is_tracing()
+        if self.started:
+            tracemalloc.start()
+        else:
+            tracemalloc.reset_peak()
+        self.baseline = tracemalloc.get_traced_memory()[0]
+        return self
+
+    def __exit__(self, *exc_info):
+        self.peak_bytes = tracemalloc.get_traced_memory()[1] - self.baseline
+        if self.started:
+            tracemalloc.stop()
+
+
+tracer = Tracer()
+
+
+def span(name, category, **args):
+    '''
+    Returns context manager that records its duration as span, if tracing is enabled.
+
+    Keyword arguments are stored with the span and shown by the trace viewer.
+    '''
+    if not config.TRACING_ENABLED:
+        return NULL_SPAN
+    return Span(name, category, args or None)
+
+
+def export(path=None):
+    '''
+    Writes recorded spans to path or config.TRACE_FILE, if tracing is enabled.
+    '''
+    if config.TRACING_ENABLED:
+        tracer.export(path or config.TRACE_FILE)
+        print(f'Trace written to {path or config.TRACE_FILE}')
+        if tracer.dropped:
+            print(f'{tracer.dropped} older spans were dropped (TRACE_MAX_EVENTS)')
@@ -0,0 +1,8 @@
+'''
+The application modules import each other by name, like when they are run from gesture_application.
+'''
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                'gesture_application'))
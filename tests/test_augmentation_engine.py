@@ -0,0 +1,106 @@
+'''
+The vectorized augmentation has to match transforming one sample at a time like the original
+augmentation.py did, and a seed has to give the same training set with any number of workers.
+'''
+import config
+import numpy as np
+import pytest
+from augmentation_engine import BatchAugmenter, augment_gestures
+from scipy.signal import resample
+from scipy.spatial.transform import Rotation as R
+
+AVC = config.AugmentationPipelines.AVC.value
+SIMPLE = config.AugmentationPipelines.SIMPLE.value
+GAUSSIAN = config.AugmentationPipelines.GAUSSIAN.value
+
+
+def spiral(n_points):
+    t = np.linspace(0, 4 * np.pi, n_points)
+    return np.stack([100 + t * 10 * np.cos(t), 80 + t * 10 * np.sin(t)], axis=1)
+
+
+def rotate(sequence, angle):
+    centroid = sequence.mean(axis=0)
+    matrix = R.from_euler('z', angle, degrees=True).as_matrix()
+    return np.array([(matrix @ np.append(point, 1))[:2] for point in sequence - centroid]) + \
+        centroid
+
+
+def scale(sequence, factors):
+    centroid = sequence.mean(axis=0)
+    return np.array([point * factors for point in sequence - centroid]) + centroid
+
+
+def perspective(sequence, angles):
+    centroid = sequence.mean(axis=0)
+    matrix = R.from_euler('yx', angles, degrees=True).as_matrix()
+    return np.array([(matrix @ np.append(point, 1))[:2] for point in sequence - centroid]) + \
+        centroid
+
+
+def skip(sequence, draws):
+    kept = [point for point, draw in zip(sequence, draws) if draw >= config.SKIP_FRAME_CHANCE]
+    return np.array(kept) if kept else sequence[:1]
+
+
+def reference(sequence, augmentation_chain, n_samples, rng):
+    '''
+    Augments sample by sample with the random numbers BatchAugmenter draws for the whole batch.
+    '''
+    samples = [sequence] * n_samples
+    shape = (n_samples, len(sequence))
+    if augmentation_chain == GAUSSIAN:
+        noise = rng.normal(0, config.GAUSSIAN_NOISE_SIGMA, shape + (2,))
+        return [sample + noise[i] for i, sample in enumerate(samples)]
+    if augmentation_chain == SIMPLE:
+        angles = rng.integers(config.ROTATION_MIN_ANGLE, config.ROTATION_MAX_ANGLE, n_samples)
+        factors = rng.uniform(config.SCALING_LOWER_BOUND, config.SCALING_UPPER_BOUND,
+                              (n_samples, 2))
+        noise = rng.normal(0, config.GAUSSIAN_NOISE_SIGMA, shape + (2,))
+        return [scale(rotate(sample, angles[i]), factors[i]) + noise[i]
+                for i, sample in enumerate(samples)]
+
+    noise = rng.normal(0, config.GAUSSIAN_NOISE_SIGMA, shape + (2,))
+    draws = rng.uniform(0, 1.0, shape)
+    samples = [skip(sample + noise[i], draws[i]) for i, sample in enumerate(samples)]
+    lengths = np.array([len(sample) for sample in samples])
+    new_lengths = rng.integers(config.SPATIAL_RESAMPLING_LOWER_BOUND,
+                               np.maximum(lengths * 2, config.SPATIAL_RESAMPLING_LOWER_BOUND + 1))
+    samples = [resample(sample, new_lengths[i]) for i, sample in enumerate(samples)]
+    perspective_angles = rng.integers(config.PERSPECTIVE_CHANGE_MIN_ANGLE,
+                                      config.PERSPECTIVE_CHANGE_MAX_ANGLE, (n_samples, 2))
+    rotation_angles = rng.integers(config.ROTATION_MIN_ANGLE, config.ROTATION_MAX_ANGLE,
+                                   n_samples)
+    factors = rng.uniform(config.SCALING_LOWER_BOUND, config.SCALING_UPPER_BOUND, (n_samples, 2))
+    return [scale(rotate(perspective(sample, perspective_angles[i]), rotation_angles[i]),
+                  factors[i])
+            for i, sample in enumerate(samples)]
+
+
+@pytest.mark.parametrize('augmentation_chain', [AVC, SIMPLE, GAUSSIAN])
+def test_batch_matches_sample_by_sample(augmentation_chain):
+    sequence = spiral(40)
+    batch, lengths = BatchAugmenter(augmentation_chain, np.random.default_rng(7)).augment(
+        sequence, 25)
+
+    expected = reference(sequence, augmentation_chain, 25, np.random.default_rng(7))
+
+    assert list(lengths) == [len(sample) for sample in expected]
+    for i, sample in enumerate(expected):
+        np.testing.assert_allclose(batch[i, :lengths[i]], sample, atol=1e-9)
+        assert not batch[i, lengths[i]:].any()
+
+
+def test_seed_gives_same_training_set_with_any_number_of_workers(monkeypatch):
+    monkeypatch.setattr(config, 'AUGMENTATION_CHUNK_SIZE', 7)
+    gestures = [['spiral', spiral(30)], ['line', np.stack([np.arange(20.0), np.zeros(20)], 1)]]
+
+    results = [augment_gestures(gestures, AVC, n_samples=20, seed=3, workers=workers)
+               for workers in (1, 2, 3)]
+
+    for result in results[1:]:
+        assert [label for label, _ in result] == [label for label, _ in results[0]]
+        for (_, sequence), (_, expected) in zip(result, results[0]):
+            np.testing.assert_array_equal(sequence, expected)
+    other_seed = augment_gestures(gestures, AVC, n_samples=20, seed=4, workers=1)
+    assert not all(np.array_equal(a, b) for (_, a), (_, b) in zip(other_seed, results[0]))
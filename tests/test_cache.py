@@ -0,0 +1,65 @@
+'''
+DiskCache has to evict the least recently used entries first, DatasetCache builds on it.
+'''
+import os
+
+import numpy as np
+from cache import DiskCache
+from dataset_cache import DatasetCache
+
+
+def write_bytes(n_bytes):
+    def write(directory):
+        with open(os.path.join(directory, 'data'), 'wb') as f:
+            f.write(b'\0' * n_bytes)
+    return write
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=250)
+    first = cache.put('first', write_bytes(100))
+    second = cache.put('second', write_bytes(100))
+    # written long ago, then the first entry is used again
+    os.utime(first, (1000, 1000))
+    os.utime(second, (2000, 2000))
+    assert cache.get('first') == first
+
+    cache.put('third', write_bytes(100))
+
+    assert cache.get('second') is None
+    assert cache.get('first') == first
+    assert cache.get('third') is not None
+
+
+def test_entry_larger_than_cache_is_evicted_right_away(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=50)
+
+    cache.put('large', write_bytes(100))
+
+    assert cache.get('large') is None
+    assert os.listdir(cache.directory) == []
+
+
+def test_dataset_cache_round_trip(tmp_path):
+    rng = np.random.default_rng(0)
+    training_set = [[label, rng.uniform(0, 100, (rng.integers(5, 30), 2))]
+                    for label in ['circle', 'line', 'zigzag'] * 20]
+    cache = DatasetCache(str(tmp_path), max_bytes=10 ** 8)
+
+    written = cache.put('key', training_set)
+    dataset = cache.get('key')
+
+    assert len(dataset) == len(written) == len(training_set)
+    assert list(dataset.classes) == ['circle', 'line', 'zigzag']
+    X_train, X_test, y_train, y_test = dataset.split()
+    assert len(X_train) + len(X_test) == len(training_set)
+    assert y_train.dtype == np.int32
+    np.testing.assert_array_equal(np.bincount(y_test), [4, 4, 4])
+
+
+def test_dataset_larger_than_cache_is_returned_unmapped(tmp_path):
+    training_set = [['line', np.ones((10, 2))]] * 10
+    cache = DatasetCache(str(tmp_path), max_bytes=1)
+
+    assert cache.put('key', training_set) is training_set
+    assert cache.get('key') is None
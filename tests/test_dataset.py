@@ -0,0 +1,29 @@
+'''
+stratified_split has to keep the class balance in both splits.
+'''
+import numpy as np
+import pytest
+from dataset import stratified_split
+
+
+@pytest.mark.parametrize('validation_split', [0.1, 0.2, 0.5])
+def test_stratified_split_keeps_class_balance(validation_split):
+    rng = np.random.default_rng(0)
+    y = rng.permutation(np.repeat(np.arange(5), [100, 40, 7, 300, 1]))
+
+    order, n_train = stratified_split(y, validation_split, seed=3)
+
+    assert sorted(order) == list(range(len(y)))
+    counts = np.bincount(y)
+    expected = np.round(counts * validation_split).astype(int)
+    np.testing.assert_array_equal(np.bincount(y[order[n_train:]], minlength=5), expected)
+    np.testing.assert_array_equal(np.bincount(y[order[:n_train]], minlength=5), counts - expected)
+
+
+def test_stratified_split_is_seeded():
+    y = np.repeat(np.arange(3), 20)
+
+    first, _ = stratified_split(y, 0.2, seed=1)
+
+    np.testing.assert_array_equal(first, stratified_split(y, 0.2, seed=1)[0])
+    assert not np.array_equal(first, stratified_split(y, 0.2, seed=2)[0])
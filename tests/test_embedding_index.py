@@ -0,0 +1,69 @@
+'''
+EmbeddingIndex has to return the registered variants nearest to a gesture in the embedding space
+of the classifier it was built from.
+'''
+import config
+import numpy as np
+from embedding_index import EmbeddingIndex
+from features import to_batch
+from numpy_inference import NumpyPredictor, export_weights
+from recognizer import build_model
+
+CLASSES = np.array(['circle', 'line', 'zigzag'])
+
+
+def keras_embeddings(model, X):
+    '''
+    Returns output of the layer before the softmax layer of the Keras model.
+    '''
+    x = X
+    for layer in model.layers[:-1]:
+        x = layer(x, training=False)
+    return x.numpy()
+
+
+def test_nearest_neighbours_match_classifier_embeddings(monkeypatch):
+    monkeypatch.setattr(config, 'FIXED_LENGTH_FEATURES', True)
+    rng = np.random.default_rng(0)
+    model = build_model(len(CLASSES), 'lstm96')
+    for layer in model.layers:
+        layer.set_weights([rng.normal(scale=0.3, size=w.shape).astype('float32')
+                           for w in layer.get_weights()])
+    index = EmbeddingIndex(NumpyPredictor(export_weights(model, CLASSES)), neighbours=7)
+    registered = {label: [rng.uniform(0, 200, (rng.integers(5, 60), 2)) for _ in range(10)]
+                  for label in CLASSES}
+    for label, sequences in registered.items():
+        index.add(label, sequences)
+    labels = np.repeat(CLASSES, 10)
+    embeddings = keras_embeddings(model, to_batch(sum(registered.values(), [])))
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+    for gesture in [rng.uniform(0, 200, (30, 2)) for _ in range(5)]:
+        query = keras_embeddings(model, to_batch([gesture]))[0]
+        similarities = embeddings @ (query / np.linalg.norm(query))
+        nearest = np.argsort(-similarities)[:7]
+
+        neighbours = index.lookup(gesture)
+
+        assert [label for label, _ in neighbours] == list(labels[nearest])
+        np.testing.assert_allclose([similarity for _, similarity in neighbours],
+                                   similarities[nearest], atol=1e-5)
+        votes = {label: [label for label, _ in neighbours].count(label) for label in CLASSES}
+        confidence, label = index.predict_gesture(gesture)
+        assert confidence == max(votes.values()) / 7
+        assert votes[label] == max(votes.values())
+
+
+def test_registered_gesture_is_its_own_nearest_neighbour(monkeypatch):
+    monkeypatch.setattr(config, 'FIXED_LENGTH_FEATURES', True)
+    rng = np.random.default_rng(1)
+    model = build_model(len(CLASSES), 'lstm96')
+    index = EmbeddingIndex(NumpyPredictor(export_weights(model, CLASSES)))
+    gestures = {label: rng.uniform(0, 200, (40, 2)) for label in CLASSES}
+    for label, gesture in gestures.items():
+        index.add(label, [gesture])
+
+    for label, gesture in gestures.items():
+        nearest_label, similarity = index.lookup(gesture, k=1)[0]
+        assert nearest_label == label
+        assert np.isclose(similarity, 1, atol=1e-5)
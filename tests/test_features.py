@@ -0,0 +1,47 @@
+'''
+Batched resampling has to give the same points as resampling every sequence on its own.
+'''
+import config
+import numpy as np
+import pytest
+from features import resample_and_normalize, resample_batch, resample_sequence, stack_sequences, \
+    to_batch
+
+
+def sequences(seed):
+    rng = np.random.default_rng(seed)
+    result = [rng.uniform(0, 300, (length, 2)) for length in rng.integers(2, 90, 40)]
+    # repeated points give segments of length zero
+    result[0][3:6] = result[0][2]
+    result.append(np.array([[5.0, 5.0], [5.0, 5.0], [5.0, 5.0]]))
+    return result
+
+
+@pytest.mark.parametrize('n_points', [8, 64])
+def test_resample_batch_matches_resample_sequence(n_points):
+    batch_sequences = sequences(0)
+    batch, lengths = stack_sequences(batch_sequences)
+
+    resampled = resample_batch(batch, lengths, n_points)
+
+    for i, sequence in enumerate(batch_sequences):
+        np.testing.assert_allclose(resampled[i], resample_sequence(sequence, n_points),
+                                   atol=1e-9)
+
+
+def test_single_and_batched_features_agree(monkeypatch):
+    monkeypatch.setattr(config, 'FIXED_LENGTH_FEATURES', True)
+    batch_sequences = sequences(1)
+
+    batched = resample_and_normalize(batch_sequences)
+
+    for i, sequence in enumerate(batch_sequences):
+        np.testing.assert_allclose(batched[i], resample_and_normalize([sequence])[0], atol=1e-6)
+
+
+def test_sequence_length_is_read_when_called(monkeypatch):
+    monkeypatch.setattr(config, 'FIXED_LENGTH_FEATURES', True)
+    monkeypatch.setattr(config, 'SEQUENCE_LENGTH', 32)
+    monkeypatch.setattr(config, 'FEATURE_CHUNK_SIZE', 16)
+
+    assert to_batch(sequences(2)).shape == (41, 32, 2)
@@ -0,0 +1,68 @@
+'''
+NumpyPredictor has to reproduce the Keras model it was exported from.
+'''
+import config
+import numpy as np
+import pytest
+from features import to_batch
+from keras.layers import BatchNormalization
+from numpy_inference import NumpyPredictor, export_weights
+from recognizer import ARCHITECTURES, build_model
+
+TOLERANCE = 1e-5
+CLASSES = np.array(['circle', 'line', 'spiral', 'zigzag'])
+
+
+def randomize(model, rng):
+    '''
+    Replaces the initial weights, so that biases and batch normalization statistics are not trivial.
+    '''
+    for layer in model.layers:
+        weights = [rng.normal(scale=0.3, size=w.shape).astype('float32')
+                   for w in layer.get_weights()]
+        if isinstance(layer, BatchNormalization):
+            weights[3] = np.abs(weights[3]) + 0.5
+        layer.set_weights(weights)
+
+
+def strokes(rng, n_strokes, max_length):
+    return [rng.uniform(0, 200, (rng.integers(3, max_length), 2)) for _ in range(n_strokes)]
+
+
+@pytest.mark.parametrize('architecture', ARCHITECTURES)
+def test_forward_matches_keras(monkeypatch, architecture):
+    monkeypatch.setattr(config, 'FIXED_LENGTH_FEATURES', True)
+    rng = np.random.default_rng(0)
+    model = build_model(len(CLASSES), architecture)
+    randomize(model, rng)
+    X = to_batch(strokes(rng, 16, 100))
+
+    predictor = NumpyPredictor(export_weights(model, CLASSES))
+
+    np.testing.assert_allclose(predictor.forward(X), model(X, training=False).numpy(),
+                               atol=TOLERANCE)
+
+
+@pytest.mark.parametrize('architecture', ['lstm96', 'gru96'])
+def test_masked_forward_matches_keras(monkeypatch, architecture):
+    monkeypatch.setattr(config, 'FIXED_LENGTH_FEATURES', False)
+    monkeypatch.setattr(config, 'BUCKETED_BATCHING', True)
+    rng = np.random.default_rng(1)
+    model = build_model(len(CLASSES), architecture)
+    sequences = strokes(rng, 8, 30)
+    # drawn points at the origin are no padding
+    sequences[0][:2] = 0
+    X = to_batch(sequences)
+    model(X)
+    randomize(model, rng)
+
+    predictor = NumpyPredictor(export_weights(model, CLASSES))
+
+    expected = model(X, training=False).numpy()
+    np.testing.assert_allclose(predictor.forward(X), expected, atol=TOLERANCE)
+    single = model(to_batch(sequences[:1]), training=False).numpy()
+    np.testing.assert_allclose(expected[0], single[0], atol=TOLERANCE)
+    state = predictor.initial_state()
+    for point in sequences[0]:
+        probabilities, state = predictor.step(point, state)
+    np.testing.assert_allclose(probabilities, expected[0], atol=TOLERANCE)
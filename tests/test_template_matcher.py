@@ -0,0 +1,52 @@
+'''
+Pruning with the pivot lower bounds must never skip the template nearest to a gesture.
+'''
+import numpy as np
+import pytest
+import template_matcher
+from features import resample_and_normalize
+from template_matcher import BLOCK_SIZE, TemplateMatcher, mean_point_distance
+
+
+def shapes(rng, n_shapes):
+    return [np.cumsum(rng.normal(0, 10, (rng.integers(10, 40), 2)), axis=0)
+            for _ in range(n_shapes)]
+
+
+def variants(rng, shapes, n_variants):
+    return [(f'shape{i % len(shapes)}',
+             shapes[i % len(shapes)] + rng.normal(0, 3, shapes[i % len(shapes)].shape))
+            for i in range(n_variants)]
+
+
+@pytest.mark.parametrize('n_templates, block_size', [
+    (BLOCK_SIZE // 2, BLOCK_SIZE),
+    (1800, BLOCK_SIZE),
+    # a small first block leaves more templates to the lower bounds
+    (1800, 16),
+])
+def test_nearest_template_matches_brute_force(monkeypatch, n_templates, block_size):
+    monkeypatch.setattr(template_matcher, 'BLOCK_SIZE', block_size)
+    rng = np.random.default_rng(0)
+    base = shapes(rng, 12)
+    templates = variants(rng, base, n_templates)
+    matcher = TemplateMatcher(n_points=32, n_pivots=8)
+    # templates added one by one and in blocks take both ways of updating the pivots
+    for label, points in templates[:5]:
+        matcher.add(label, points)
+    matcher.add_all(templates[5:n_templates // 2])
+    matcher.add_all(templates[n_templates // 2:])
+    resampled = resample_and_normalize([points for _, points in templates], 32)
+
+    compared = 0
+    for _, gesture in variants(rng, base, 200):
+        distances = mean_point_distance(resampled, resample_and_normalize([gesture], 32)[0])
+
+        index, distance = matcher.nearest(gesture)
+
+        assert np.isclose(distance, distances.min(), atol=1e-6)
+        assert np.isclose(distances[index], distances.min(), atol=1e-6)
+        compared += matcher.compared
+    if n_templates > block_size:
+        # the lower bounds have to skip templates, or the test checks nothing
+        assert compared < 200 * n_templates
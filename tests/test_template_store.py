@@ -0,0 +1,60 @@
+'''
+Templates have to come back from a TemplateStore unchanged, whatever their labels contain.
+'''
+import os
+
+import numpy as np
+from template_store import TemplateStore
+
+LABELS = ['circle', 'a\rb', 'line\nbreak', 'tab\x0bstop', 'sep\x1cfile', ' para', '', 'ü ✓']
+
+
+def templates():
+    return [(label, np.arange(2 * (i + 2), dtype='float32').reshape(-1, 2) + i)
+            for i, label in enumerate(LABELS)]
+
+
+def assert_loaded(store, expected):
+    loaded = store.load()
+    assert [label for _, label, _ in loaded] == [label for label, _ in expected]
+    for (_, _, points), (_, expected_points) in zip(loaded, expected):
+        np.testing.assert_array_equal(points, expected_points)
+
+
+def test_round_trip_with_odd_labels(tmp_path):
+    store = TemplateStore(str(tmp_path))
+    ids = [store.append(label, points) for label, points in templates()]
+
+    assert ids == list(range(len(LABELS)))
+    assert_loaded(TemplateStore(str(tmp_path)), templates())
+
+
+def test_delete_and_compact_keep_labels(tmp_path):
+    store = TemplateStore(str(tmp_path))
+    for label, points in templates():
+        store.append(label, points)
+    for template_id in range(0, len(LABELS), 2):
+        store.delete(template_id)
+
+    kept = templates()[1::2]
+    assert_loaded(store, kept)
+    store.compact()
+    assert_loaded(store, kept)
+
+
+def test_interrupted_append_is_ignored(tmp_path):
+    store = TemplateStore(str(tmp_path))
+    for label, points in templates()[:3]:
+        store.append(label, points)
+    # points and label of a fourth template were written, its index record only partly
+    with open(store.points_path, 'ab') as f:
+        f.write(b'\0' * 13)
+    with open(store.labels_path, 'ab') as f:
+        f.write('lost\n'.encode())
+    with open(store.index_path, 'ab') as f:
+        f.write(b'\0' * 11)
+
+    assert_loaded(store, templates()[:3])
+    assert store.append(*templates()[3]) == 3
+    assert_loaded(TemplateStore(str(tmp_path)), templates()[:4])
+